@@ -5,14 +5,25 @@ A professional GUI application for managing film collections
 """
 
 import sys
-import requests
+from urllib.parse import urlencode
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QLineEdit, QPushButton, QComboBox, QTableWidget, QTableWidgetItem,
-    QDialog, QMessageBox, QHeaderView, QMenu
+    QLabel, QLineEdit, QPushButton, QComboBox, QTableView, QAbstractItemView,
+    QDialog, QMessageBox, QHeaderView, QMenu, QCompleter
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QStringListModel
 from PyQt6.QtGui import QFont
+from client_network import RequestDispatcher, RequestBatcher, EventListener
+from client_models import FilmTableModel, FilmProxyModel, FilmRole, SortRole, RuntimeRole
+
+# Films fetched per request; further pages are fetched as the table is scrolled
+PAGE_SIZE = 500
+
+# Milliseconds typing must pause before search suggestions are requested
+SUGGEST_DELAY = 200
+
+# Suggestions shown under the search box
+SUGGEST_COUNT = 10
 
 
 class FilmDialog(QDialog):
@@ -97,7 +108,19 @@ class FilmCinemaxApp(QMainWindow):
         self.base_url = "http://localhost:5000/api"
         self.selected_film_id = None
         self.selected_film_data = None  # Store selected film data
-        self.all_films = []  # Store all films
+        self.listing_endpoint = None  # Listing the table shows; its further pages load on scroll
+        self.full_listing = False  # Whether that listing is the whole catalogue
+        self.listing_category = None  # Category that listing is limited to, if any
+        # Catalogue version the table reflects, for fetching only what changed since
+        self.catalogue_version = None
+        self.catalogue_epoch = None
+        # HTTP runs on a thread pool; results come back to the GUI thread as signals
+        self.network = RequestDispatcher(self.base_url, self)
+        # Adds and deletes made in quick succession go to the server as one batch
+        self.batch = RequestBatcher(self.network, parent=self)
+        # Changes made by anyone arrive as server-sent events and are patched into the table
+        self.events = EventListener(f"{self.base_url}/media/events", self)
+        self.events.received.connect(self.on_catalogue_event)
         self.retry_count = 0
         self.init_ui()
         
@@ -135,6 +158,20 @@ class FilmCinemaxApp(QMainWindow):
         self.search_input.returnPressed.connect(self.search_films)
         control_layout.addWidget(self.search_input)
         
+        # Names and directors are suggested while typing, once the user pauses
+        self.suggestion_model = QStringListModel(self)
+        completer = QCompleter(self.suggestion_model, self)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        # The server also matches later words, so let the popup show those too
+        completer.setFilterMode(Qt.MatchFlag.MatchContains)
+        completer.activated.connect(self.on_suggestion_chosen)
+        self.search_input.setCompleter(completer)
+        self.suggest_timer = QTimer(self)
+        self.suggest_timer.setSingleShot(True)
+        self.suggest_timer.setInterval(SUGGEST_DELAY)
+        self.suggest_timer.timeout.connect(self.request_suggestions)
+        self.search_input.textEdited.connect(lambda text: self.suggest_timer.start())
+        
         search_btn = QPushButton("Search")
         search_btn.clicked.connect(self.search_films)
         control_layout.addWidget(search_btn)
@@ -155,13 +192,19 @@ class FilmCinemaxApp(QMainWindow):
         
         main_layout.addLayout(control_layout)
         
-        # Films table
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Film Name", "Director", "Year", "Category"])
+        # Films table: the view only asks the model for the rows on screen
+        self.film_model = FilmTableModel(self)
+        self.film_model.fetch_page = self.load_next_page
+        self.film_proxy = FilmProxyModel(self)
+        self.film_proxy.setSourceModel(self.film_model)
+        self.table = QTableView()
+        self.table.setModel(self.film_proxy)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
-        self.table.itemSelectionChanged.connect(self.on_film_select)
+        self.table.selectionModel().currentRowChanged.connect(lambda current, previous: self.on_film_select())
         main_layout.addWidget(self.table)
         
         # Hidden description panel - only shows when a film is selected
@@ -187,108 +230,185 @@ class FilmCinemaxApp(QMainWindow):
         
         central_widget.setLayout(main_layout)
     
-    def make_request(self, method, endpoint, **kwargs):
-        """Make HTTP request to backend"""
-        try:
-            url = f"{self.base_url}{endpoint}"
-            response = requests.request(method, url, timeout=10, **kwargs)
-            if response.status_code == 200 or response.status_code == 201:
-                data = response.json()
-                # Extract the 'data' field if the response has it
-                if isinstance(data, dict) and 'data' in data:
-                    return data['data']
-                return data
-            else:
-                self.status_label.setText(f"Server error: {response.status_code}")
-                return None
-        except requests.exceptions.Timeout:
-            self.status_label.setText("Connection timeout - Flask might still be starting")
-            return None
-        except requests.exceptions.ConnectionError:
-            self.status_label.setText("Cannot connect to Flask on localhost:5000")
-            return None
-        except Exception as e:
-            self.status_label.setText(f"Error: {str(e)}")
-            return None
+    def make_request(self, method, endpoint, on_success, on_error=None, channel=None, **kwargs):
+        """Send an HTTP request to the backend without blocking the window
+
+        on_success(data) runs on the GUI thread. Errors are shown in the status
+        bar and then passed to on_error(message). Requests sharing a channel
+        supersede each other, so only the newest one's result is delivered.
+        """
+        def failed(message):
+            self.status_label.setText(message)
+            if on_error is not None:
+                on_error(message)
+        return self.network.request(method, endpoint, on_success, failed, channel=channel, **kwargs)
+    
+    def load_listing(self, endpoint, on_loaded, on_error, full_listing=False, category=None):
+        """Fetch the first page of a listing into the table; later pages load as the user scrolls"""
+        def loaded(envelope):
+            self.listing_endpoint = endpoint
+            self.full_listing = full_listing
+            self.listing_category = category
+            self.catalogue_version = envelope.get('version')
+            self.catalogue_epoch = envelope.get('epoch')
+            self.display_films(envelope['data'], envelope.get('next_cursor'))
+            if self.catalogue_version is not None:
+                # Follow changes from this listing's version on; a later listing keeps the same stream
+                self.events.start(f"{self.catalogue_epoch}-{self.catalogue_version}")
+            on_loaded(envelope['data'])
+        
+        # A new listing makes any page still coming for the old one irrelevant
+        self.network.cancel('page')
+        self.make_request('GET', f'{endpoint}?limit={PAGE_SIZE}', loaded, on_error,
+                          channel='listing', unwrap=False)
+    
+    def load_next_page(self, cursor):
+        """Fetch the page after cursor and append it to the table"""
+        def loaded(envelope):
+            self.film_model.append_films(envelope['data'], envelope.get('next_cursor'))
+            self.status_label.setText(f"Loaded {self.film_model.rowCount()} films")
+        
+        self.make_request('GET', f'{self.listing_endpoint}?limit={PAGE_SIZE}&cursor={cursor}', loaded,
+                          lambda message: self.film_model.page_failed(), channel='page', unwrap=False)
     
     def load_all_films(self):
         """Load all films from backend"""
-        response = self.make_request('GET', '/media')
-        if response:
-            self.display_films(response)
-            self.status_label.setText(f"Loaded {len(response)} films")
-        else:
-            self.status_label.setText("Failed to load films")
+        self.load_listing('/media',
+                          lambda films: self.status_label.setText(f"Loaded {len(films)} films"),
+                          lambda message: self.status_label.setText("Failed to load films"),
+                          full_listing=True)
     
     def load_all_films_with_retry(self):
         """Load films with automatic retry"""
-        response = self.make_request('GET', '/media')
-        if response:
-            self.display_films(response)
-            self.status_label.setText(f"✓ Loaded {len(response)} films")
+        def loaded(films):
+            self.status_label.setText(f"✓ Loaded {len(films)} films")
             self.retry_count = 0
             # Clear status message after 5 seconds
             QTimer.singleShot(5000, lambda: self.status_label.setText(""))
-        else:
+        
+        def failed(message):
             self.retry_count += 1
             if self.retry_count < 5:
                 self.status_label.setText(f"Retrying... (attempt {self.retry_count}/5)")
                 QTimer.singleShot(2000, self.load_all_films_with_retry)
             else:
                 self.status_label.setText("Failed to connect to Flask backend")
+        
+        self.load_listing('/media', loaded, failed, full_listing=True)
     
     def load_by_category(self):
         """Load films by category"""
         category = self.category_combo.currentText()
-        if category == "All":
+        if self.full_listing and self.film_model.next_cursor is None:
+            # The whole catalogue is already here, so filter it in place
+            self.film_proxy.set_category(None if category == "All" else category)
+            shown = self.film_proxy.rowCount()
+            self.status_label.setText(f"Showing {shown} films" + ("" if category == "All" else f" in {category}"))
+        elif category == "All":
             self.load_all_films()
         else:
-            response = self.make_request('GET', f'/media/category/{category}')
-            if response:
-                self.display_films(response)
-                self.status_label.setText(f"Loaded {len(response)} films in {category}")
-            else:
-                self.status_label.setText(f"Failed to load {category}")
+            self.load_listing(f'/media/category/{category}',
+                              lambda films: self.status_label.setText(f"Loaded {len(films)} films in {category}"),
+                              lambda message: self.status_label.setText(f"Failed to load {category}"),
+                              category=category)
+    
+    def request_suggestions(self):
+        """Fetch suggestions for the search box; each request replaces any still in flight"""
+        prefix = self.search_input.text().strip()
+        if not prefix:
+            self.network.cancel('suggest')
+            self.suggestion_model.setStringList([])
+            return
+        
+        def suggested(suggestions):
+            self.suggestion_model.setStringList(list(dict.fromkeys(s['text'] for s in suggestions)))
+            if suggestions and self.search_input.hasFocus():
+                self.search_input.completer().complete()
+        
+        # Failures are not worth reporting; the next keystroke simply asks again
+        query = urlencode({'prefix': prefix, 'limit': SUGGEST_COUNT})
+        # Each prefix is a new URL, so its response is not worth keeping for revalidation
+        self.network.request('GET', f'/media/suggest?{query}', suggested, channel='suggest', conditional=False)
+    
+    def on_suggestion_chosen(self, text):
+        """Search for the suggestion picked from the list"""
+        self.search_input.setText(text)
+        self.search_films()
     
     def search_films(self):
         """Search films"""
+        # Suggestions for what was typed are no longer wanted
+        self.suggest_timer.stop()
+        self.network.cancel('suggest')
         query = self.search_input.text().strip()
         if not query:
             QMessageBox.warning(self, "Input Required", "Please enter a film name or director")
             return
         
-        response = self.make_request('GET', f'/films?search={query}')
-        if response:
-            self.display_films(response)
-            self.status_label.setText(f"Found {len(response)} match(es)")
-        else:
-            self.status_label.setText("No results found")
+        def found(response):
+            self.listing_endpoint = None
+            self.full_listing = False
+            self.catalogue_version = None
+            if response:
+                self.display_films(response)
+                self.status_label.setText(f"Found {len(response)} match(es)")
+            else:
+                self.status_label.setText("No results found")
+        
+        self.network.cancel('page')
+        self.make_request('GET', f'/films?search={query}', found,
+                          lambda message: self.status_label.setText("No results found"),
+                          channel='listing')
     
-    def display_films(self, films):
+    def sync_changes(self):
+        """Bring the table up to date with the server by applying only what changed"""
+        if self.catalogue_version is None:
+            # Search results cannot be patched, so show the catalogue again
+            self.load_all_films()
+            return
+        
+        def received(changes):
+            if changes['resync']:
+                # The server no longer has every change since our version
+                self.load_all_films()
+            else:
+                self.apply_catalogue_changes(changes['changes'], changes['version'])
+        
+        self.make_request('GET', f'/media/changes?since={self.catalogue_version}&epoch={self.catalogue_epoch}',
+                          received, lambda message: self.load_all_films(), channel='changes')
+    
+    def apply_catalogue_changes(self, changes, version):
+        """Patch the table with /media/changes deltas that bring it up to version"""
+        if self.catalogue_version is None:
+            return
+        category = self.listing_category.casefold() if self.listing_category else None
+        keep = None if category is None else (
+            lambda film: str(film.get('category', '')).casefold() == category)
+        self.film_model.apply_changes(changes, keep)
+        self.catalogue_version = max(self.catalogue_version, version)
+    
+    def on_catalogue_event(self, event, data):
+        """Apply a change pushed by the server, or reload if it could not send every change"""
+        if self.catalogue_version is None:
+            # Search results are left as they are until the next listing
+            return
+        if event == 'changes':
+            self.apply_catalogue_changes(data['changes'], data['version'])
+            self.status_label.setText(f"Catalogue updated ({self.film_model.rowCount()} films)")
+        elif event == 'resync':
+            self.load_all_films()
+    
+    def display_films(self, films, next_cursor=None):
         """Display films in table"""
-        self.all_films = films  # Store all films for later reference
-        self.table.setRowCount(0)
-        for i, film in enumerate(films):
-            self.table.insertRow(i)
-            self.table.setItem(i, 0, QTableWidgetItem(film['name']))
-            # Use 'author' if 'director' doesn't exist (backend uses 'author')
-            director = film.get('director') or film.get('author', 'N/A')
-            self.table.setItem(i, 1, QTableWidgetItem(director))
-            # Use 'publication_date' if 'year' doesn't exist
-            year = film.get('year') or film.get('publication_date', 'N/A')
-            self.table.setItem(i, 2, QTableWidgetItem(str(year)))
-            self.table.setItem(i, 3, QTableWidgetItem(film.get('category', 'Film')))
-            # Store film data in first column item
-            self.table.item(i, 0).film_id = str(film['id'])
-            self.table.item(i, 0).film_data = film
+        self.film_proxy.set_category(None)
+        self.film_model.set_films(films, next_cursor)
     
     def on_film_select(self):
         """Handle film selection and display description"""
-        current_row = self.table.currentRow()
-        if current_row >= 0:
-            item = self.table.item(current_row, 0)
-            self.selected_film_id = item.film_id
-            self.selected_film_data = item.film_data
+        current = self.table.currentIndex()
+        if current.isValid():
+            self.selected_film_data = current.data(FilmRole)
+            self.selected_film_id = str(self.selected_film_data['id'])
             
             # Display the description with runtime
             description = self.selected_film_data.get('description', 'No description available')
@@ -316,36 +436,61 @@ class FilmCinemaxApp(QMainWindow):
                 QMessageBox.warning(self, "Incomplete", "Please fill all fields")
                 return
             
-            response = self.make_request('POST', '/films', json=data)
-            if response:
+            def added(response):
                 QMessageBox.information(self, "Success", "Film added successfully")
-                self.load_all_films()
-            else:
-                QMessageBox.critical(self, "Error", "Failed to add film")
+                self.sync_changes()
+            
+            self.batch.create(data, added,
+                              lambda message: QMessageBox.critical(self, "Error", "Failed to add film"))
     
     def delete_film(self):
-        """Delete selected film"""
-        if not self.selected_film_id:
+        """Delete the selected films, in one batch"""
+        films = [index.data(FilmRole) for index in self.table.selectionModel().selectedRows()]
+        if not films:
             QMessageBox.warning(self, "No Selection", "Please select a film to delete")
             return
         
-        current_row = self.table.currentRow()
-        film_name = self.table.item(current_row, 0).text()
-        
+        if len(films) == 1:
+            question = f"Are you sure you want to delete '{films[0].get('name', '')}'?"
+        else:
+            question = f"Are you sure you want to delete these {len(films)} films?"
         reply = QMessageBox.question(
             self,
             "Confirm Delete",
-            f"Are you sure you want to delete '{film_name}'?",
+            question,
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            response = self.make_request('DELETE', f'/films/{self.selected_film_id}')
-            if response:
-                QMessageBox.information(self, "Success", "Film deleted successfully")
-                self.load_all_films()
-            else:
-                QMessageBox.critical(self, "Error", "Failed to delete film")
+            pending = {film['id'] for film in films}
+            failed = []
+            
+            def finished(film_id, error=None):
+                pending.discard(film_id)
+                if error is not None:
+                    failed.append(error)
+                if pending:
+                    return
+                # Every result is in; report once for the whole batch
+                if failed:
+                    QMessageBox.critical(self, "Error", f"Failed to delete {len(failed)} of {len(films)} films")
+                else:
+                    QMessageBox.information(self, "Success", "Film deleted successfully" if len(films) == 1
+                                            else f"{len(films)} films deleted successfully")
+                self.sync_changes()
+            
+            for film in films:
+                self.batch.delete(film['id'],
+                                  lambda response, film_id=film['id']: finished(film_id),
+                                  lambda message, film_id=film['id']: finished(film_id, message))
+    
+    def closeEvent(self, event):
+        """Drop pending requests and let running ones finish before the window goes"""
+        self.batch.flush()
+        self.network.cancel_all()
+        self.events.stop()
+        self.network.pool.waitForDone(2000)
+        super().closeEvent(event)
     
     def show_sort_menu(self):
         """Show dropdown menu with sort options"""
@@ -359,27 +504,21 @@ class FilmCinemaxApp(QMainWindow):
 
     def sort_by_year(self):
         """Sort films by year"""
-        self.table.sortItems(2, Qt.SortOrder.DescendingOrder)
+        self.film_proxy.setSortRole(SortRole)
+        self.film_proxy.sort(2, Qt.SortOrder.DescendingOrder)
         self.status_label.setText("Sorted by year (newest first)")
 
     def sort_by_runtime(self):
         """Sort films by runtime"""
-        if not hasattr(self, 'all_films') or not self.all_films:
-            return
-        
-        # Sort by runtime in descending order
-        sorted_films = sorted(self.all_films, key=lambda x: x.get('runtime', 0), reverse=True)
-        self.display_films(sorted_films)
+        # Runtime has no column, so sort on its role instead
+        self.film_proxy.setSortRole(RuntimeRole)
+        self.film_proxy.sort(0, Qt.SortOrder.DescendingOrder)
         self.status_label.setText("Sorted by runtime (longest first)")
 
     def sort_alphabetically(self):
         """Sort films alphabetically by name"""
-        if not hasattr(self, 'all_films') or not self.all_films:
-            return
-        
-        # Sort alphabetically by name
-        sorted_films = sorted(self.all_films, key=lambda x: x.get('name', '').lower())
-        self.display_films(sorted_films)
+        self.film_proxy.setSortRole(SortRole)
+        self.film_proxy.sort(0, Qt.SortOrder.AscendingOrder)
         self.status_label.setText("Sorted alphabetically (A-Z)")
 
 
@@ -1,43 +1,220 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from functools import partial, wraps
+import gzip
+import hashlib
 import json
 import os
+import zlib
 from datetime import datetime
+from media_store import get_repository
+from media_query import CatalogueQuery, RANGE_FIELDS
+from media_stats import StatsIndex, FILTER_FIELDS
+from media_suggest import PrefixIndex
+from media_search import FuzzyNameIndex
+from media_columnar import ColumnarView
+from media_changes import ChangeLog
+from media_events import CatalogueEvents
+from media_record import json_default
+from media_json import envelope, record_json
+from media_compress import CompressedResponses, negotiate_encoding
 
 app = Flask(__name__)
+# Film records become dicts only when a response is serialized
+app.json.default = partial(json_default, fallback=app.json.default)
 
 DATA_FILE = 'films.json'
 
+# 'json' rewrites films.json on every change, 'journal' appends to films.json.journal,
+# 'sqlite' stores the catalogue in films.db (migrated once from films.json)
+STORAGE_MODE = os.environ.get('FILM_STORAGE', 'json')
+
+repository = get_repository(DATA_FILE, STORAGE_MODE)
+catalogue_query = CatalogueQuery(repository)
+catalogue_stats = repository.attach(StatsIndex())
+catalogue_prefixes = repository.attach(PrefixIndex())
+catalogue_fuzzy = repository.attach(FuzzyNameIndex())
+catalogue_columns = ColumnarView(repository)
+# Recent changes, so clients can catch up with /api/media/changes instead of reloading
+catalogue_changes = repository.keep_change_log(ChangeLog())
+# Pushes those changes to subscribers of /api/media/events
+catalogue_events = CatalogueEvents(repository, catalogue_changes, lambda: ETAG_EPOCH)
+
 def load_media():
-    """Load media data from JSON file"""
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return []
-    return []
+    """Load media data from the in-memory repository"""
+    return list(repository.records())
 
 def save_media(media_list):
     """Save media data to JSON file"""
     try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(media_list, f, indent=4, ensure_ascii=False)
-        return True
+        return repository.replace_all(media_list)
+    except Exception as e:
+        print(f"Error saving media: {e}")
+        return False
+
+REQUIRED_FIELDS = ['name', 'category']
+
+def validate_media(data):
+    """Return an error message if data cannot become a media item, else None"""
+    if not isinstance(data, dict):
+        return 'Media item must be a JSON object'
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            return f'Missing required field: {field}'
+    return None
+
+def build_media(data, new_id):
+    """Build a stored media item from request data"""
+    return {
+        'id': new_id,
+        'name': data['name'],
+        'year': data.get('year') or data.get('publication_date', ''),
+        'director': data.get('director') or data.get('author', ''),
+        'category': data['category'],
+        'runtime': data.get('runtime', ''),
+        'description': data.get('description', ''),
+        'created_at': datetime.now().isoformat()
+    }
+
+def add_media(data):
+    """Create a media item with the next free ID; returns it, or None if saving failed"""
+    try:
+        return repository.create(partial(build_media, data))
+    except Exception as e:
+        print(f"Error saving media: {e}")
+        return None
+
+def remove_media(media_id):
+    """Remove a media item through the repository"""
+    try:
+        return repository.delete(media_id)
     except Exception as e:
         print(f"Error saving media: {e}")
         return False
 
+# Distinguishes ETags and change-feed versions of this run from those of an earlier one
+# (media_prefork's workers inherit it, and the version, from the parent)
+ETAG_EPOCH = os.urandom(4).hex()
+
+def conditional(view):
+    """Add ETag/Last-Modified headers and answer If-None-Match with 304 when unchanged"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified_at = repository.version_info()
+        query = hashlib.blake2b(request.full_path.encode('utf-8'), digest_size=6).hexdigest()
+        encoding = negotiate_encoding()
+        # Each content encoding is a separate representation with its own ETag
+        etag = f'{ETAG_EPOCH}-{version}-{query}' + (f'-{encoding}' if encoding else '')
+        if request.if_none_match.contains(etag):
+            # Nothing changed since the client's copy, so skip serializing entirely
+            response = Response(status=304)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.last_modified = modified_at
+        return response
+    return wrapper
+
+# Compressed read responses, cached per (path and query, catalogue version, encoding)
+compressed = CompressedResponses(lambda: repository.version_info()[0])
+
+# Largest page a client may ask for with ?limit=
+MAX_PAGE_SIZE = 1000
+
+# Records serialized per chunk when a listing is streamed
+STREAM_CHUNK_SIZE = 100
+
+def get_page_args():
+    """Read limit/cursor query parameters; limit is None when not paginating"""
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+    try:
+        limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE), cursor
+
+def json_response(data, status=200, **fields):
+    """Return a success envelope built from cached per-record JSON fragments"""
+    return Response(envelope(data, success=True, **fields), status=status, mimetype='application/json')
+
+def stream_media(media_list, extra):
+    """Yield a JSON envelope piece by piece so the whole body is never held in memory"""
+    yield b'{"success":true,"data":['
+    for start in range(0, len(media_list), STREAM_CHUNK_SIZE):
+        chunk = b','.join(record_json(m) for m in media_list[start:start + STREAM_CHUNK_SIZE])
+        yield (b',' if start else b'') + chunk
+    yield b'],' + app.json.dumps({'count': len(media_list), **extra})[1:].encode('utf-8')
+
+def media_list_response(media_list, **extra):
+    """Build the list envelope, streamed when the client asks with ?stream=1"""
+    if request.args.get('stream') in ('1', 'true'):
+        return Response(stream_media(media_list, extra), mimetype='application/json'), 200
+    return json_response(media_list, count=len(media_list), **extra)
+
+def get_query_args():
+    """Read year/runtime range and sort parameters; returns None if none were given"""
+    ranges = {}
+    for field in RANGE_FIELDS:
+        bounds = []
+        for suffix in ('min', 'max'):
+            value = request.args.get(f'{field}_{suffix}')
+            try:
+                bounds.append(int(value) if value is not None else None)
+            except ValueError:
+                raise ValueError(f'{field}_{suffix} must be an integer')
+        ranges[field] = tuple(bounds)
+    sort = request.args.get('sort')
+    if sort is None and all(bound == (None, None) for bound in ranges.values()):
+        return None
+    field, _, direction = (sort or 'id').partition(':')
+    if direction not in ('', 'asc', 'desc'):
+        raise ValueError('sort direction must be asc or desc')
+    return ranges, field, direction == 'desc'
+
+def list_media(category=None):
+    """Return the list envelope for all media or one category, paginated if requested"""
+    try:
+        # Read first: the listing is at least this new, so replaying changes from it is safe
+        version = repository.version_info()[0]
+        limit, cursor = get_page_args()
+        if category is None:
+            category = request.args.get('category')
+        query = get_query_args()
+        if query is not None:
+            ranges, sort, descending = query
+            media_list, next_cursor = catalogue_query.run(
+                category, ranges, sort, descending, limit, cursor)
+        elif limit is not None:
+            media_list, next_cursor = repository.page(limit, cursor, category)
+        elif category is not None:
+            media_list = repository.by_category(category)
+        else:
+            media_list = repository.records()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    extra = {'category': category} if category is not None else {}
+    if limit is not None:
+        extra['next_cursor'] = next_cursor
+    extra.update(version=version, epoch=ETAG_EPOCH)
+    return media_list_response(media_list, **extra)
+
 @app.route('/api/films', methods=['GET'])
 @app.route('/api/media', methods=['GET'])
+@conditional
+@compressed
 def get_all_media():
     """Endpoint 1: List of all available media items"""
     try:
-        media_list = load_media()
-        return jsonify({
-            'success': True,
-            'data': media_list,
-            'count': len(media_list)
-        }), 200
+        return list_media()
     except Exception as e:
         return jsonify({
             'success': False,
@@ -45,26 +222,29 @@ def get_all_media():
         }), 500
 
 @app.route('/api/media/category/<category>', methods=['GET'])
+@conditional
+@compressed
 def get_media_by_category(category):
     """Endpoint 2: List of media items in a specific category"""
     try:
-        media_list = load_media()
-        filtered_media = [m for m in media_list if m.get('category', '').lower() == category.lower()]
-        return jsonify({
-            'success': True,
-            'data': filtered_media,
-            'count': len(filtered_media),
-            'category': category
-        }), 200
+        return list_media(category)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+# Edits and results allowed by /api/media/search?fuzzy=1 unless ?max_distance= / ?limit= say otherwise
+FUZZY_MAX_DISTANCE = 2
+MAX_FUZZY_DISTANCE = 4
+FUZZY_LIMIT = 10
+MAX_FUZZY_LIMIT = 100
+
 @app.route('/api/media/search', methods=['GET'])
+@conditional
+@compressed
 def search_media():
-    """Endpoint 3: Search for media items with a specific name (exact match)"""
+    """Endpoint 3: Search for media items with a specific name (exact match, or closest names with ?fuzzy=1)"""
     try:
         name = request.args.get('name', '')
         if not name:
@@ -73,14 +253,56 @@ def search_media():
                 'error': 'Name parameter is required'
             }), 400
         
-        media_list = load_media()
-        found_media = [m for m in media_list if m.get('name', '').lower() == name.lower()]
+        if request.args.get('fuzzy') in ('1', 'true'):
+            max_distance = get_int_arg('max_distance', FUZZY_MAX_DISTANCE)
+            limit = get_int_arg('limit', FUZZY_LIMIT)
+            if max_distance < 0:
+                raise ValueError('max_distance must not be negative')
+            if limit < 1:
+                raise ValueError('limit must be positive')
+            # Short names allow fewer edits than asked for; the distance used is sent back
+            max_distance = catalogue_fuzzy.allowed_distance(name, min(max_distance, MAX_FUZZY_DISTANCE))
+            with repository.reading():
+                matches = catalogue_fuzzy.search(name, max_distance, min(limit, MAX_FUZZY_LIMIT))
+            return json_response([record for record, _ in matches], count=len(matches),
+                                 distances=[distance for _, distance in matches], max_distance=max_distance)
+        
+        found_media = repository.by_name(name)
         
+        return json_response(found_media, count=len(found_media))
+    except ValueError as e:
         return jsonify({
-            'success': True,
-            'data': found_media,
-            'count': len(found_media)
-        }), 200
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Suggestions returned by /api/media/suggest unless ?limit= asks for fewer or more
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+
+@app.route('/api/media/suggest', methods=['GET'])
+@conditional
+@compressed
+def suggest_media():
+    """Names and directors starting with ?prefix= (or with a later word that does), for autocomplete"""
+    try:
+        limit = get_int_arg('limit', SUGGEST_LIMIT)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        with repository.reading():
+            suggestions = catalogue_prefixes.suggest(request.args.get('prefix', ''),
+                                                     min(limit, MAX_SUGGEST_LIMIT))
+        return json_response(suggestions, count=len(suggestions))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -88,17 +310,15 @@ def search_media():
         }), 500
 
 @app.route('/api/media/<int:media_id>', methods=['GET'])
+@conditional
+@compressed
 def get_media_details(media_id):
     """Endpoint 4: Display the metadata of a specific media item"""
     try:
-        media_list = load_media()
-        media = next((m for m in media_list if m.get('id') == media_id), None)
+        media = repository.get(media_id)
         
         if media:
-            return jsonify({
-                'success': True,
-                'data': media
-            }), 200
+            return json_response(media)
         else:
             return jsonify({
                 'success': False,
@@ -118,33 +338,16 @@ def create_media():
         data = request.get_json()
         
         # Validate required fields
-        required_fields = ['name', 'category']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing required field: {field}'
-                }), 400
-        
-        media_list = load_media()
-        
-        # Generate new ID (as integer)
-        new_id = max([int(m.get('id', 0)) if isinstance(m.get('id'), (int, str)) else 0 for m in media_list], default=0) + 1
-        
-        new_media = {
-            'id': new_id,
-            'name': data['name'],
-            'year': data.get('year') or data.get('publication_date', ''),
-            'director': data.get('director') or data.get('author', ''),
-            'category': data['category'],
-            'runtime': data.get('runtime', ''),
-            'description': data.get('description', ''),
-            'created_at': datetime.now().isoformat()
-        }
+        error = validate_media(data)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
         
-        media_list.append(new_media)
+        new_media = add_media(data)
         
-        if save_media(media_list):
+        if new_media:
             return jsonify({
                 'success': True,
                 'data': new_media,
@@ -162,14 +365,178 @@ def create_media():
             'error': str(e)
         }), 500
 
+# Rows committed together by POST /api/media/bulk unless ?batch_size= says otherwise
+BULK_BATCH_SIZE = 1000
+
+# Per-line errors reported by a bulk import before the rest are only counted
+MAX_BULK_ERRORS = 1000
+
+class InvalidBody(Exception):
+    """A request body that cannot be decoded (a client error, unlike a failed save)"""
+
+def gunzip_lines(stream):
+    """Yield the lines of a gzip-compressed stream, raising InvalidBody if it is not valid gzip"""
+    try:
+        yield from gzip.GzipFile(fileobj=stream)
+    except (OSError, EOFError, zlib.error) as e:
+        raise InvalidBody(f'Invalid gzip body: {e}') from e
+
+@app.route('/api/media/bulk', methods=['POST'])
+def bulk_create_media():
+    """Create media items from a streamed NDJSON body (optionally gzip-compressed)"""
+    created = 0
+    try:
+        batch_size = get_int_arg('batch_size', BULK_BATCH_SIZE)
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    try:
+        stream = request.stream
+        if request.headers.get('Content-Encoding') == 'gzip' or request.mimetype == 'application/gzip':
+            stream = gunzip_lines(stream)
+        
+        errors = []
+        error_count = 0
+        batch = []
+        
+        def report(line_number, message):
+            nonlocal error_count
+            error_count += 1
+            if len(errors) < MAX_BULK_ERRORS:
+                errors.append({'line': line_number, 'error': message})
+        
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                report(line_number, f'Invalid JSON: {e}')
+                continue
+            error = validate_media(data)
+            if error:
+                report(line_number, error)
+                continue
+            batch.append(partial(build_media, data))
+            if len(batch) >= batch_size:
+                repository.create_many(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            repository.create_many(batch)
+            created += len(batch)
+        
+        status = 201 if created else (400 if error_count else 200)
+        return jsonify({
+            'success': error_count == 0,
+            'created': created,
+            'error_count': error_count,
+            'errors': errors
+        }), status
+    except InvalidBody as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'created': created
+        }), 400
+    except Exception as e:
+        # Batches committed before the failure stay committed
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'created': created
+        }), 500
+
+# Operations accepted in one POST /api/media/batch
+MAX_BATCH_OPERATIONS = 1000
+
+def batch_error(status, error):
+    return {'success': False, 'status': status, 'error': error}
+
+@app.route('/api/media/batch', methods=['POST'])
+def batch_media():
+    """Run several gets, creates and deletes in one request, committing the writes together
+
+    The body is {"operations": [{"op": "get", "id": 1}, {"op": "create", "data": {...}},
+    {"op": "delete", "id": 2}, ...]}. Every create and delete is committed at
+    once, and the gets are answered afterwards, so they see the batch's own
+    changes. data has one result per operation, in order, carrying the status
+    the single-item endpoint would have returned.
+    """
+    try:
+        body = request.get_json(silent=True)
+        operations = body.get('operations') if isinstance(body, dict) else None
+        if not isinstance(operations, list):
+            return jsonify({
+                'success': False,
+                'error': 'operations must be a list'
+            }), 400
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return jsonify({
+                'success': False,
+                'error': f'A batch may hold at most {MAX_BATCH_OPERATIONS} operations'
+            }), 400
+        
+        results = [None] * len(operations)
+        gets, creates, deletes = [], [], []  # (position, id or data)
+        for position, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            if op == 'create':
+                error = validate_media(operation.get('data'))
+                if error:
+                    results[position] = batch_error(400, error)
+                else:
+                    creates.append((position, operation['data']))
+            elif op in ('get', 'delete'):
+                if 'id' not in operation:
+                    results[position] = batch_error(400, 'Missing required field: id')
+                else:
+                    (gets if op == 'get' else deletes).append((position, operation['id']))
+            else:
+                results[position] = batch_error(400, 'op must be get, create or delete')
+        
+        created, removed = repository.change_many([partial(build_media, data) for _, data in creates],
+                                                  [media_id for _, media_id in deletes])
+        for (position, _), media in zip(creates, created):
+            results[position] = {'success': True, 'status': 201, 'data': media}
+        for (position, _), media in zip(deletes, removed):
+            results[position] = ({'success': True, 'status': 200, 'data': media} if media is not None
+                                 else batch_error(404, 'Media not found'))
+        for position, media_id in gets:
+            media = repository.get(media_id)
+            results[position] = ({'success': True, 'status': 200, 'data': media} if media is not None
+                                 else batch_error(404, 'Media not found'))
+        return json_response(results, count=len(results))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/media/export', methods=['GET'])
+@conditional
+@compressed
+def export_media():
+    """Stream every media item as NDJSON, one record per line"""
+    media_list = repository.records()
+    
+    def generate():
+        for start in range(0, len(media_list), STREAM_CHUNK_SIZE):
+            yield b''.join(record_json(m) + b'\n' for m in media_list[start:start + STREAM_CHUNK_SIZE])
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/films/<film_id>', methods=['DELETE'])
 @app.route('/api/media/<film_id>', methods=['DELETE'])
 def delete_media(film_id):
     """Endpoint 6: Delete a specific media item"""
     try:
-        media_list = load_media()
-        # Convert to string since IDs in JSON are strings
-        media = next((m for m in media_list if str(m.get('id')) == str(film_id)), None)
+        media = repository.get(film_id)
         
         if not media:
             return jsonify({
@@ -177,9 +544,7 @@ def delete_media(film_id):
                 'error': 'Media not found'
             }), 404
         
-        media_list = [m for m in media_list if str(m.get('id')) != str(film_id)]
-        
-        if save_media(media_list):
+        if remove_media(film_id):
             return jsonify({
                 'success': True,
                 'message': 'Media deleted successfully',
@@ -197,6 +562,155 @@ def delete_media(film_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/media/stats', methods=['GET'])
+@conditional
+@compressed
+def get_media_stats():
+    """Counts per category/year/decade and runtime aggregates per director"""
+    try:
+        filters = {}
+        for field in FILTER_FIELDS:
+            value = request.args.get(field)
+            if value is not None and field == 'decade':
+                try:
+                    value = int(value)
+                except ValueError:
+                    raise ValueError('decade must be an integer, e.g. 1990')
+            if value is not None:
+                filters[field] = value
+        with repository.reading():
+            stats = catalogue_stats.summary(request.args.get('group_by'), filters)
+        return jsonify({
+            'success': True,
+            'data': stats
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def get_int_arg(name, default=None):
+    """Read an integer query parameter, raising ValueError if it is malformed"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+@app.route('/api/media/analytics/<kind>', methods=['GET'])
+@conditional
+@compressed
+def get_media_analytics(kind):
+    """Histogram, percentile and top-N queries answered from the columnar snapshot"""
+    if not catalogue_columns.available:
+        return jsonify({
+            'success': False,
+            'error': 'Analytics require NumPy, which is not installed'
+        }), 501
+    try:
+        snapshot = catalogue_columns.snapshot()
+        selected = snapshot.mask(category=request.args.get('category'),
+                                 director=request.args.get('director'),
+                                 year_min=get_int_arg('year_min'),
+                                 year_max=get_int_arg('year_max'))
+        field = request.args.get('field', 'runtime')
+        if kind == 'histogram':
+            data = snapshot.histogram(field, get_int_arg('bin_width', 10), selected)
+        elif kind == 'percentiles':
+            try:
+                points = [float(p) for p in request.args.get('p', '25,50,75,90').split(',')]
+            except ValueError:
+                raise ValueError('p must be a comma-separated list of numbers')
+            if any(p < 0 or p > 100 for p in points):
+                raise ValueError('percentiles must be between 0 and 100')
+            data = snapshot.percentiles(field, points, selected, request.args.get('group_by'))
+        elif kind == 'top':
+            n = get_int_arg('n', 10)
+            if n < 1:
+                raise ValueError('n must be positive')
+            data = snapshot.top(field, n, selected)
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Analytics query must be histogram, percentiles or top'
+            }), 404
+        return jsonify({
+            'success': True,
+            'data': data,
+            'field': field,
+            'count': int(selected.sum())
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/media/changes', methods=['GET'])
+@conditional
+@compressed
+def get_media_changes():
+    """Inserts and deletes after catalogue version ?since=, or resync: true if they are no longer known"""
+    try:
+        since = get_int_arg('since')
+        if since is None:
+            return jsonify({
+                'success': False,
+                'error': 'since parameter is required'
+            }), 400
+        version, changes = repository.changes_since(since)
+        # Versions are counted per server run (shared by media_prefork's workers); one from another is meaningless here
+        epoch = request.args.get('epoch')
+        if epoch is not None and epoch != ETAG_EPOCH:
+            changes = None
+        return json_response({
+            'version': version,
+            'epoch': ETAG_EPOCH,
+            'resync': changes is None,
+            'changes': [{'op': 'put', 'record': value} if op == 'put' else {'op': 'delete', 'id': value}
+                        for op, value in changes or ()]
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/media/events', methods=['GET'])
+def get_media_events():
+    """Server-Sent Events stream of catalogue changes, resumable with Last-Event-ID"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # Passed through untouched, so an async server can iterate the stream on its event loop
+    return Response(catalogue_events.stream(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+                    direct_passthrough=True)
+
+@app.route('/api/media/cache', methods=['GET'])
+def get_cache_info():
+    """Report repository cache hit/miss/reload counters"""
+    return jsonify({
+        'success': True,
+        'data': {**repository.cache_info(), 'compressed_responses': compressed.cache_info()}
+    }), 200
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Film Cinemax Memory Benchmark
+Compares resident bytes per film for plain dicts and Film records
+
+Usage: python bench_memory.py [count]
+"""
+
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from media_record import Film
+
+CATEGORIES = ['Drama', 'Crime', 'Action', 'Sci-Fi', 'Comedy', 'Horror', 'Romance', 'Animation']
+
+
+def catalogue_text(count):
+    """Return a films.json-style document with a mix of current and legacy rows"""
+    rng = random.Random(42)
+    directors = [f'Director {i}' for i in range(max(count // 20, 1))]
+    start = datetime(2024, 1, 1)
+    films = []
+    for i in range(1, count + 1):
+        film = {'id': i, 'name': f'Film {i}', 'category': rng.choice(CATEGORIES),
+                'runtime': rng.randint(80, 180), 'description': f'Description of film {i}.',
+                'created_at': (start + timedelta(seconds=i, microseconds=i % 1000 + 1)).isoformat()}
+        director, year = rng.choice(directors), rng.randint(1920, 2024)
+        if i % 3 == 0:
+            # Legacy rows carry both spellings
+            film.update(author=director, director=director, publication_date=str(year), year=year)
+        else:
+            film.update(director=director, year=year)
+        films.append(film)
+    return json.dumps(films)
+
+
+def measure(build):
+    """Return the bytes still allocated by build()'s result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    text = catalogue_text(count)
+    as_dicts = measure(lambda: json.loads(text))
+    as_films = measure(lambda: [Film(record) for record in json.loads(text)])
+    print(f'{count} films')
+    print(f'  dict records: {as_dicts / count:8.1f} bytes/film')
+    print(f'  Film records: {as_films / count:8.1f} bytes/film ({as_films / as_dicts:.0%} of dicts)')
+
+
+if __name__ == '__main__':
+    main()
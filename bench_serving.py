@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Film Cinemax Serving Benchmark
+Latency and throughput of the threaded Flask server against the asyncio server
+
+Both servers run the same backend.app in their own process and are driven by
+the same number of concurrent clients, each reusing its connection whenever
+the server allows keep-alive.
+
+Usage: python bench_serving.py [connections] [seconds] [path]
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+def serve_flask(port):
+    """Run backend.app on Werkzeug's threaded server, with HTTP/1.1 keep-alive"""
+    from werkzeug.serving import WSGIRequestHandler
+    from backend import app
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    app.run(port=port, threaded=True)
+
+
+def serve_async(port):
+    """Run backend.app on the asyncio server"""
+    from backend import app
+    from media_async import serve
+    asyncio.run(serve(app, port=port))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def client(port, path, deadline, latencies):
+    """Send requests back to back until the deadline, reusing the connection when allowed
+
+    A server that answers Connection: close costs a reconnect per request,
+    which is counted in that request's latency.
+    """
+    request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode('ascii')
+    writer = None
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            length, close = 0, False
+            for line in head.lower().split(b'\r\n'):
+                if line.startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+                elif line.startswith(b'connection:'):
+                    close = b'close' in line
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if close:
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def drive(port, connections, seconds, path):
+    latencies = []
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(*(client(port, path, deadline, latencies) for _ in range(connections)))
+    return latencies
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(mode, connections, seconds, path):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, __file__, mode, str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        wait_for_port(port)
+        asyncio.run(drive(port, 1, 1, path))  # warm up the catalogue and caches
+        latencies = sorted(asyncio.run(drive(port, connections, seconds, path)))
+    finally:
+        server.terminate()
+        server.wait()
+    ms = [value * 1000 for value in latencies]
+    print(f'{mode:12} {len(ms) / seconds:9.0f} req/s   p50 {percentile(ms, 50):7.2f} ms'
+          f'   p95 {percentile(ms, 95):7.2f} ms   p99 {percentile(ms, 99):7.2f} ms')
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    path = sys.argv[3] if len(sys.argv) > 3 else '/api/media?limit=20'
+    print(f'{connections} concurrent clients for {seconds:g}s against GET {path}')
+    for mode in ('serve-flask', 'serve-async'):
+        run(mode, connections, seconds, path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] in ('serve-flask', 'serve-async'):
+        (serve_flask if sys.argv[1] == 'serve-flask' else serve_async)(int(sys.argv[2]))
+    else:
+        main()
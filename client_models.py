@@ -0,0 +1,186 @@
+"""
+Film Cinemax Client Models
+Table model over the downloaded film list, with a proxy for sorting and filtering
+"""
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt
+
+COLUMNS = ["Film Name", "Director", "Year", "Category"]
+
+# The film dict behind a row
+FilmRole = Qt.ItemDataRole.UserRole
+# Comparable key for the row's value in a column
+SortRole = Qt.ItemDataRole.UserRole + 1
+# Comparable key for the film's runtime, which has no column of its own
+RuntimeRole = Qt.ItemDataRole.UserRole + 2
+
+
+def film_director(film):
+    # Use 'author' if 'director' doesn't exist (backend uses 'author')
+    return film.get('director') or film.get('author', 'N/A')
+
+
+def film_year(film):
+    # Use 'publication_date' if 'year' doesn't exist
+    return film.get('year') or film.get('publication_date', 'N/A')
+
+
+def number_key(value):
+    """Sort numbers by value, with missing or non-numeric values lowest"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return float('-inf')
+
+
+class FilmTableModel(QAbstractTableModel):
+    """Rows for a list of film dicts; the view asks only for the rows it shows
+
+    When next_cursor is set, more pages exist on the server: the view calls
+    fetchMore() as the user scrolls to the end, which hands the cursor to
+    fetch_page, and the page arrives later through append_films().
+
+    Changes made on the server since the rows were fetched are applied in
+    place with apply_changes(), rather than by fetching the rows again.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.films = []
+        self.next_cursor = None
+        self.fetch_page = None
+        self._fetching = False
+        self._rows = {}  # film id -> row
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.films)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        film = self.films[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return film.get('name', '')
+            if column == 1:
+                return film_director(film)
+            if column == 2:
+                return str(film_year(film))
+            return film.get('category', 'Film')
+        if role == FilmRole:
+            return film
+        if role == SortRole:
+            if column == 2:
+                return number_key(film_year(film))
+            return str(self.data(index)).casefold()
+        if role == RuntimeRole:
+            return number_key(film.get('runtime'))
+        return None
+
+    def set_films(self, films, next_cursor=None):
+        """Replace the rows"""
+        self.beginResetModel()
+        self.films = list(films)
+        self.next_cursor = next_cursor
+        self._fetching = False
+        self._index_rows()
+        self.endResetModel()
+
+    def _index_rows(self):
+        self._rows = {film.get('id'): row for row, film in enumerate(self.films)}
+
+    def append_films(self, films, next_cursor=None):
+        """Add a page of rows at the end"""
+        self._fetching = False
+        self.next_cursor = next_cursor
+        # A film added since the listing began may already be here from apply_changes()
+        films = [film for film in films if film.get('id') not in self._rows]
+        if films:
+            first = len(self.films)
+            self.beginInsertRows(QModelIndex(), first, first + len(films) - 1)
+            for row, film in enumerate(films, first):
+                self._rows[film.get('id')] = row
+            self.films.extend(films)
+            self.endInsertRows()
+
+    def apply_changes(self, changes, keep=None):
+        """Apply /media/changes deltas: 'put' replaces or adds a film, 'delete' removes one
+
+        A put film for which keep(film) is false (e.g. it left the category
+        being shown) is removed instead.
+        """
+        final = {}
+        for change in changes:
+            if change['op'] == 'put':
+                film = change['record']
+                final[film.get('id')] = film if keep is None or keep(film) else None
+            else:
+                final[change['id']] = None
+        removed = []
+        for film_id, film in final.items():
+            row = self._rows.get(film_id)
+            if film is None:
+                if row is not None:
+                    removed.append(row)
+            elif row is not None:
+                self.films[row] = film
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+            else:
+                row = len(self.films)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.films.append(film)
+                self._rows[film_id] = row
+                self.endInsertRows()
+        if removed:
+            # From the bottom up, so earlier removals do not shift later rows
+            for row in sorted(removed, reverse=True):
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.films[row]
+                self.endRemoveRows()
+            self._index_rows()
+
+    def page_failed(self):
+        """Allow the page to be requested again"""
+        self._fetching = False
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return (not parent.isValid() and self.next_cursor is not None
+                and self.fetch_page is not None and not self._fetching)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._fetching = True
+            self.fetch_page(self.next_cursor)
+
+
+class FilmProxyModel(QSortFilterProxyModel):
+    """Sorts rows by SortRole/RuntimeRole keys and filters them by category"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.category = None
+        self.setSortRole(SortRole)
+
+    def set_category(self, category):
+        """Show only films in category (case-insensitive), or every film for None"""
+        self.category = category.casefold() if category else None
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.category is None:
+            return True
+        film = self.sourceModel().films[source_row]
+        return str(film.get('category', '')).casefold() == self.category
+
+    def lessThan(self, left, right):
+        source = self.sourceModel()
+        return source.data(left, self.sortRole()) < source.data(right, self.sortRole())
@@ -0,0 +1,353 @@
+"""
+Film Cinemax Client Networking
+Runs the desktop client's HTTP requests on a thread pool and delivers results through signals
+"""
+
+import http.client
+import itertools
+import json
+import socket
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+REQUEST_TIMEOUT = 10
+
+# Milliseconds a RequestBatcher waits for more operations before sending a batch
+BATCH_WINDOW = 50
+
+# Operations sent in one batch at most; the server accepts up to 1000
+MAX_BATCH_SIZE = 200
+
+# Seconds without a byte (heartbeats included) before an event stream is presumed dead
+EVENT_READ_TIMEOUT = 45
+
+# Seconds to wait before reconnecting an event stream, until the server suggests otherwise
+EVENT_RECONNECT_DELAY = 2.0
+
+# GET responses kept for revalidation with their ETags
+ETAG_CACHE_SIZE = 64
+
+
+def make_session(pool_size):
+    """Return a Session that keeps up to pool_size connections to the server alive for reuse"""
+    session = requests.Session()
+    # Every request goes to one host, so one connection pool sized to the worker threads suffices
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class ETagCache(OrderedDict):
+    """url -> (ETag, payload) for conditional GETs, keeping only the most recently used entries"""
+
+    def __init__(self, max_entries=ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        super().__init__()
+
+    def get(self, url, default=None):
+        if url not in self:
+            return default
+        self.move_to_end(url)
+        return self[url]
+
+    def __setitem__(self, url, value):
+        super().__setitem__(url, value)
+        self.move_to_end(url)
+        while len(self) > self.max_entries:
+            self.popitem(last=False)
+
+
+def perform_request(method, url, etag_cache, etag_lock, unwrap=True, session=requests, conditional=True,
+                    **kwargs):
+    """Send one request (on a worker thread); returns (data, None) or (None, error message)
+
+    GET responses are revalidated with their cached ETag, and a 304 returns the
+    cached payload, unless conditional is False (for URLs seldom fetched twice,
+    such as search-as-you-type suggestions). The 'data' field of an envelope
+    is unwrapped unless unwrap is False (e.g. to read a page's next_cursor).
+    """
+    def result(data):
+        # Extract the 'data' field if the response has it
+        if unwrap and isinstance(data, dict) and 'data' in data:
+            data = data['data']
+        return data, None
+
+    try:
+        with etag_lock:
+            cached = etag_cache.get(url) if method == 'GET' and conditional else None
+        headers = kwargs.setdefault('headers', {})
+        # Listings are mostly repeated description text, so they compress well
+        headers.setdefault('Accept-Encoding', 'gzip, deflate')
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        response = session.request(method, url, timeout=REQUEST_TIMEOUT, **kwargs)
+        if response.status_code == 304 and cached:
+            # Catalogue unchanged since the last fetch of this URL
+            return result(cached[1])
+        if response.status_code == 200 or response.status_code == 201:
+            data = response.json()
+            if method == 'GET' and conditional and response.headers.get('ETag'):
+                with etag_lock:
+                    etag_cache[url] = (response.headers['ETag'], data)
+            return result(data)
+        return None, f"Server error: {response.status_code}"
+    except requests.exceptions.Timeout:
+        return None, "Connection timeout - Flask might still be starting"
+    except requests.exceptions.ConnectionError:
+        return None, "Cannot connect to Flask on localhost:5000"
+    except Exception as e:
+        return None, f"Error: {str(e)}"
+
+
+class RequestSignals(QObject):
+    """Signals a RequestTask emits back to the GUI thread"""
+
+    finished = pyqtSignal(int, object, object)
+
+
+class RequestTask(QRunnable):
+    """One HTTP request run on the thread pool"""
+
+    def __init__(self, request_id, signals, call):
+        super().__init__()
+        self.request_id = request_id
+        self.signals = signals
+        self.call = call
+        self.cancelled = False
+
+    def run(self):
+        # Always report back, so the dispatcher can release the task
+        data, error = (None, None) if self.cancelled else self.call()
+        self.signals.finished.emit(self.request_id, data, error)
+
+
+class RequestDispatcher(QObject):
+    """Issues requests off the GUI thread and calls back on it
+
+    Requests may name a channel (e.g. 'listing'): a new request on a channel
+    supersedes the previous one, which is taken off the pool queue if it has
+    not started, and whose response is dropped if it has. A stale response
+    can therefore never overwrite a newer one.
+
+    Requests share one keep-alive session, so they reuse open connections
+    rather than connecting afresh each time.
+    """
+
+    def __init__(self, base_url, parent=None, max_threads=4):
+        super().__init__(parent)
+        self.base_url = base_url
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.session = make_session(max_threads)
+        self.etag_cache = ETagCache()
+        self.etag_lock = threading.Lock()
+        self.signals = RequestSignals(self)
+        self.signals.finished.connect(self._deliver)
+        self._ids = itertools.count(1)
+        self._callbacks = {}  # request id -> (channel, on_success, on_error)
+        self._tasks = {}  # request id -> RequestTask
+        self._latest = {}  # channel -> newest request id
+
+    def request(self, method, endpoint, on_success, on_error=None, channel=None, **kwargs):
+        """Queue a request; on_success(data) or on_error(message) runs on the GUI thread"""
+        if channel is not None:
+            self.cancel(channel)
+        request_id = next(self._ids)
+        url = f"{self.base_url}{endpoint}"
+        task = RequestTask(request_id, self.signals, lambda: perform_request(
+            method, url, self.etag_cache, self.etag_lock, session=self.session, **kwargs))
+        task.setAutoDelete(False)
+        self._callbacks[request_id] = (channel, on_success, on_error)
+        self._tasks[request_id] = task
+        if channel is not None:
+            self._latest[channel] = request_id
+        self.pool.start(task)
+        return request_id
+
+    def cancel(self, channel):
+        """Cancel the request in flight on a channel, if any"""
+        request_id = self._latest.pop(channel, None)
+        task = self._tasks.get(request_id)
+        if task is not None:
+            task.cancelled = True
+            self._callbacks.pop(request_id, None)
+            if self.pool.tryTake(task):
+                # Never started; a running task is released when it reports back
+                del self._tasks[request_id]
+
+    def cancel_all(self):
+        for channel in list(self._latest):
+            self.cancel(channel)
+
+    def _deliver(self, request_id, data, error):
+        self._tasks.pop(request_id, None)
+        callback = self._callbacks.pop(request_id, None)
+        if callback is None:
+            return
+        channel, on_success, on_error = callback
+        if channel is not None:
+            if self._latest.get(channel) != request_id:
+                return
+            del self._latest[channel]
+        if error is None:
+            on_success(data)
+        elif on_error is not None:
+            on_error(error)
+
+
+class RequestBatcher(QObject):
+    """Coalesces gets, creates and deletes into POST /media/batch requests
+
+    Operations queued within BATCH_WINDOW milliseconds of each other go out
+    together, and the server commits their writes at once. Each operation's
+    on_success(data) or on_error(message) is called on the GUI thread when
+    its batch returns.
+    """
+
+    def __init__(self, dispatcher, endpoint='/media/batch', window=BATCH_WINDOW, parent=None):
+        super().__init__(parent)
+        self.dispatcher = dispatcher
+        self.endpoint = endpoint
+        self._queue = []  # (operation, on_success, on_error)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(window)
+        self._timer.timeout.connect(self.flush)
+
+    def get(self, media_id, on_success, on_error=None):
+        self.add({'op': 'get', 'id': media_id}, on_success, on_error)
+
+    def create(self, data, on_success, on_error=None):
+        self.add({'op': 'create', 'data': data}, on_success, on_error)
+
+    def delete(self, media_id, on_success, on_error=None):
+        self.add({'op': 'delete', 'id': media_id}, on_success, on_error)
+
+    def add(self, operation, on_success, on_error=None):
+        """Queue an operation for the next batch"""
+        self._queue.append((operation, on_success, on_error))
+        if len(self._queue) >= MAX_BATCH_SIZE:
+            self.flush()
+        elif not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Send everything queued now, without waiting out the window"""
+        self._timer.stop()
+        queued, self._queue = self._queue, []
+        if not queued:
+            return
+
+        def delivered(results):
+            for (_, on_success, on_error), result in zip(queued, results):
+                if result.get('success'):
+                    on_success(result.get('data'))
+                elif on_error is not None:
+                    on_error(result.get('error', 'Unknown error'))
+
+        def failed(message):
+            for _, _, on_error in queued:
+                if on_error is not None:
+                    on_error(message)
+
+        self.dispatcher.request('POST', self.endpoint, delivered, failed,
+                                json={'operations': [operation for operation, _, _ in queued]})
+
+
+class EventListener(QObject):
+    """Follows a Server-Sent Events stream on a background thread
+
+    Each event is emitted as received(name, data) with its JSON data decoded,
+    and so reaches slots on the GUI thread. After a dropped connection the
+    listener reconnects, sending the id of the last event it saw so the
+    server can replay what was missed.
+    """
+
+    received = pyqtSignal(str, object)
+
+    def __init__(self, url, parent=None):
+        super().__init__(parent)
+        self.url = url
+        self.last_event_id = None
+        self.reconnect_delay = EVENT_RECONNECT_DELAY
+        self._stopping = threading.Event()
+        self._socket = None
+        self._thread = None
+
+    def start(self, last_event_id=None):
+        """Start listening, resuming after last_event_id if given; does nothing if already started"""
+        if self._thread is not None:
+            return
+        self.last_event_id = last_event_id
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='event-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop listening and wait briefly for the thread to finish"""
+        self._stopping.set()
+        sock = self._socket
+        if sock is not None:
+            try:
+                # Wakes the listener thread out of its blocking read
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(2)
+            self._thread = None
+
+    def _run(self):
+        url = urlsplit(self.url)
+        while not self._stopping.is_set():
+            connection = http.client.HTTPConnection(url.hostname, url.port, timeout=EVENT_READ_TIMEOUT)
+            try:
+                headers = {'Accept': 'text/event-stream'}
+                if self.last_event_id:
+                    headers['Last-Event-ID'] = self.last_event_id
+                connection.request('GET', url.path + (f'?{url.query}' if url.query else ''), headers=headers)
+                # Kept for stop(): the connection lets go of it once the response owns it
+                self._socket = connection.sock
+                if self._stopping.is_set():
+                    break
+                with connection.getresponse() as response:
+                    if response.status == 200:
+                        self._read(response)
+            except (OSError, http.client.HTTPException):
+                pass
+            finally:
+                self._socket = None
+                connection.close()
+            self._stopping.wait(self.reconnect_delay)
+
+    def _read(self, response):
+        """Dispatch events from the stream until it ends"""
+        name, data = 'message', []
+        while not self._stopping.is_set():
+            line = response.readline()
+            if not line:
+                return
+            line = line.decode('utf-8').rstrip('\r\n')
+            if not line:
+                if data:
+                    try:
+                        self.received.emit(name, json.loads('\n'.join(data)))
+                    except ValueError:
+                        pass
+                name, data = 'message', []
+                continue
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                name = value
+            elif field == 'data':
+                data.append(value)
+            elif field == 'id':
+                self.last_event_id = value
+            elif field == 'retry' and value.isdigit():
+                self.reconnect_delay = int(value) / 1000
@@ -3,81 +3,91 @@ Film Cinemax Backend API
 Flask REST API for film collection management
 """
 
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, Response, request, jsonify
+from functools import partial
 import os
 from datetime import datetime
+from media_store import get_repository
+from media_search import FullTextIndex
+from media_record import json_default
+from media_json import records_json
+from media_compress import CompressedResponses
 
 app = Flask(__name__)
 app.config['JSON_SORT_KEYS'] = False
+# Film records become dicts only when a response is serialized
+app.json.default = partial(json_default, fallback=app.json.default)
 
 JSON_FILE = 'films.json'
 
+repository = get_repository(JSON_FILE, os.environ.get('FILM_STORAGE', 'json'))
+search_index = repository.attach(FullTextIndex())
+
 def load_films():
-    """Load films from JSON file"""
-    if os.path.exists(JSON_FILE):
-        try:
-            with open(JSON_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    """Load films from the in-memory repository"""
+    return repository.records()
 
 def save_films(films):
     """Save films to JSON file"""
-    with open(JSON_FILE, 'w') as f:
-        json.dump(films, f, indent=2)
+    repository.replace_all(films)
 
 def get_next_id():
     """Get next available ID"""
-    films = load_films()
-    if not films:
-        return 1
-    return max(int(f['id']) for f in films) + 1
+    return repository.next_id()
+
+# Compressed listings, cached per (path and query, catalogue version, encoding)
+compressed = CompressedResponses(lambda: repository.version_info()[0])
 
 @app.route('/api/films', methods=['GET'])
+@compressed
 def get_films():
     """Get all films - API endpoint"""
-    films = load_films()
     category = request.args.get('category')
     search = request.args.get('search')
+    limit = request.args.get('limit', type=int)
     
-    if category and category != 'All':
-        films = [f for f in films if f['category'] == category]
+    if category == 'All':
+        category = None
     
     if search:
-        search_lower = search.lower()
-        films = [f for f in films if search_lower in f['name'].lower() or 
-                search_lower in f['director'].lower()]
+        # Ranked, multi-term AND search answered from the inverted index
+        with repository.reading():
+            films = search_index.search(
+                search, limit=limit,
+                predicate=(lambda f: f['category'] == category) if category else None)
+        return Response(records_json(films), mimetype='application/json')
+    
+    films = load_films()
+    if category:
+        films = [f for f in films if f['category'] == category]
+    if limit is not None:
+        films = films[:limit]
     
-    return jsonify(films)
+    return Response(records_json(films), mimetype='application/json')
 
 @app.route('/api/films', methods=['POST'])
 def add_film():
     """Add a new film"""
     data = request.json
-    films = load_films()
     
-    new_film = {
-        'id': str(get_next_id()),
+    year = int(data.get('year'))
+    
+    # The repository assigns the id under its write lock, so concurrent adds never collide
+    new_film = repository.create(lambda new_id: {
+        'id': new_id,
         'name': data.get('name'),
         'director': data.get('director'),
-        'year': int(data.get('year')),
+        'year': year,
         'category': data.get('category'),
         'created_at': datetime.now().isoformat()
-    }
-    
-    films.append(new_film)
-    save_films(films)
+    })
     
     return jsonify(new_film), 201
 
 @app.route('/api/films/<film_id>', methods=['DELETE'])
 def delete_film(film_id):
     """Delete a film"""
-    films = load_films()
-    films = [f for f in films if f['id'] != film_id]
-    save_films(films)
+    repository.delete(film_id)
     
     return jsonify({'status': 'success'}), 200
 
@@ -0,0 +1,320 @@
+"""
+Film Cinemax Async Server
+asyncio HTTP/1.1 front end for the media API
+
+Connections, keep-alive and request parsing live on the event loop, so an
+idle client costs a coroutine rather than a thread. Each request is handed
+to the unchanged Flask app (the same routes and JSON envelopes as
+backend.py) on a small thread pool, which is also where any file reads and
+writes happen. Request bodies reach the app as a stream read from the
+connection on demand, and anything over MAX_BODY_BYTES is refused with
+413. A response body that is an async iterable (such as the media_events
+stream) is consumed on the event loop instead, so a long-lived stream
+does not hold a pool thread while it waits.
+
+Usage: python media_async.py [port]
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+# Threads running request handlers (and the file I/O they do)
+WORKERS = 8
+
+# Seconds an idle keep-alive connection is kept open
+KEEPALIVE_TIMEOUT = 60
+
+# Largest request line plus headers accepted
+MAX_HEADER_BYTES = 64 * 1024
+
+# Largest request body accepted; bodies are streamed to the app, never held whole
+MAX_BODY_BYTES = 256 * 1024 * 1024
+
+# Bytes fetched from the connection per read of a request body
+BODY_READ_SIZE = 64 * 1024
+
+REASONS = {400: 'Bad Request', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class BadRequest(Exception):
+    """Raised when a request cannot be parsed"""
+    status = 400
+
+
+class PayloadTooLarge(BadRequest):
+    """Raised when a request body is longer than the server accepts"""
+    status = 413
+
+
+class RequestBody(io.RawIOBase):
+    """wsgi.input for one request, read from the connection as the app asks for it
+
+    Content-Length and chunked bodies are both decoded here. readinto() runs
+    on a pool thread and waits for the event loop to fetch the next bytes,
+    so a large upload (e.g. an NDJSON bulk import) is never buffered whole.
+    A body that is malformed or longer than max_bytes raises in the app and
+    is kept in error, so the server answers 400 or 413 instead of whatever
+    the app made of it.
+    """
+
+    def __init__(self, reader, headers, loop, max_bytes=MAX_BODY_BYTES):
+        self.reader = reader
+        self.loop = loop
+        self.max_bytes = max_bytes
+        self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        self.remaining = 0  # bytes left in the body, or in the current chunk
+        self.received = 0
+        self.error = None
+        if not self.chunked:
+            try:
+                self.remaining = int(headers.get('content-length', 0))
+            except ValueError:
+                raise BadRequest('Invalid Content-Length')
+            if self.remaining < 0:
+                raise BadRequest('Invalid Content-Length')
+            if self.remaining > max_bytes:
+                raise PayloadTooLarge('Request body too large')
+        self.done = not self.chunked and not self.remaining
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.error is not None:
+            raise self.error
+        data = asyncio.run_coroutine_threadsafe(self.read_async(len(buffer)), self.loop).result()
+        buffer[:len(data)] = data
+        return len(data)
+
+    async def read_async(self, size=BODY_READ_SIZE):
+        """Return up to size more body bytes, or b'' at the end (on the event loop)"""
+        try:
+            return await self._read(size)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            self.error = BadRequest('Incomplete or malformed body')
+        except BadRequest as e:
+            self.error = e
+        raise self.error
+
+    async def _read(self, size):
+        if self.done or size <= 0:
+            return b''
+        if self.chunked and not self.remaining:
+            size_line = await self.reader.readuntil(b'\r\n')
+            try:
+                self.remaining = int(size_line.split(b';', 1)[0], 16)
+            except ValueError:
+                raise BadRequest('Invalid chunk size')
+            if self.remaining < 0:
+                raise BadRequest('Invalid chunk size')
+            if not self.remaining:
+                # Skip any trailer headers up to the final blank line
+                while await self.reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+                self.done = True
+                return b''
+        data = await self.reader.read(min(size, self.remaining))
+        if not data:
+            raise BadRequest('Incomplete body')
+        self.remaining -= len(data)
+        self.received += len(data)
+        if self.received > self.max_bytes:
+            raise PayloadTooLarge('Request body too large')
+        if not self.remaining:
+            if not self.chunked:
+                self.done = True
+            elif await self.reader.readexactly(2) != b'\r\n':
+                raise BadRequest('Invalid chunk')
+        return data
+
+    async def drain(self):
+        """Discard whatever the app left unread, so the next request on the connection parses"""
+        while await self.read_async():
+            pass
+
+
+def build_environ(method, target, version, headers, body, server, peer):
+    """Build the WSGI environ for one parsed request, reading its body from the RequestBody body"""
+    path, _, query = target.partition('?')
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote(path, 'latin-1'),
+        'QUERY_STRING': query,
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': version,
+        'REMOTE_ADDR': str(peer[0]) if peer else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BufferedReader(body, BODY_READ_SIZE),
+        # A chunked body has no Content-Length; the stream itself ends at the last chunk
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        elif name != 'transfer-encoding':
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+def call_app(app, environ):
+    """Run the WSGI app (on a worker thread); returns (status, headers, body iterator)"""
+    started = []
+
+    def start_response(status, response_headers, exc_info=None):
+        started[:] = [status, response_headers]
+
+    body = app(environ, start_response)
+    return started[0], started[1], body
+
+
+class AsyncServer:
+    """Serves a WSGI app over asyncio streams with a bounded handler pool"""
+
+    def __init__(self, app, workers=WORKERS, max_body_bytes=MAX_BODY_BYTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-async')
+        self.connections = 0
+
+    async def start(self, host='127.0.0.1', port=5000, sock=None):
+        """Start listening (on sock if given, e.g. one inherited from a parent); returns the asyncio.Server"""
+        if sock is not None:
+            return await asyncio.start_server(self.handle, sock=sock, limit=MAX_HEADER_BYTES)
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until it closes or idles out"""
+        self.connections += 1
+        loop = asyncio.get_running_loop()
+        server = writer.get_extra_info('sockname')
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.send_error(writer, 413)
+                    return
+                try:
+                    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                    method, target, version = request_line.split(' ')
+                    headers = {}
+                    for line in filter(None, header_lines):
+                        name, _, value = line.partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    body = RequestBody(reader, headers, loop, self.max_body_bytes)
+                except (ValueError, BadRequest) as e:
+                    await self.send_error(writer, getattr(e, 'status', 400))
+                    return
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                environ = build_environ(method, target, version, headers, body, server, peer)
+                try:
+                    status, response_headers, chunks = await loop.run_in_executor(
+                        self.executor, call_app, self.app, environ)
+                except Exception:
+                    await self.send_error(writer, body.error.status if body.error else 500)
+                    return
+                try:
+                    if body.error is not None:
+                        # Whatever the app answered, the body it read was cut short or too long
+                        await self.send_error(writer, body.error.status)
+                        return
+                    await self.send_response(writer, method, version, status, response_headers,
+                                             chunks, keep_alive)
+                finally:
+                    if hasattr(chunks, 'close'):
+                        await loop.run_in_executor(self.executor, chunks.close)
+                if not keep_alive:
+                    return
+                try:
+                    await body.drain()
+                except BadRequest:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def send_response(self, writer, method, version, status, headers, chunks, keep_alive):
+        """Write the status, headers and body; streamed bodies go out chunked"""
+        loop = asyncio.get_running_loop()
+        names = {name.lower() for name, _ in headers}
+        bodyless = method == 'HEAD' or int(status[:3]) in (204, 304)
+        chunked = 'content-length' not in names and not bodyless and version == 'HTTP/1.1'
+        lines = [f'{version} {status}']
+        lines += [f'{name}: {value}' for name, value in headers]
+        if chunked:
+            lines.append('Transfer-Encoding: chunked')
+        if 'content-length' not in names and not chunked and not bodyless:
+            # An HTTP/1.0 peer learns where the body ends from the connection closing
+            keep_alive = False
+        lines.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if hasattr(chunks, '__aiter__') and not bodyless:
+            # Produced on the event loop; the head goes out before the first chunk is awaited
+            await writer.drain()
+            stream = chunks.__aiter__()
+            try:
+                async for chunk in stream:
+                    await self.send_chunk(writer, chunk, chunked)
+            finally:
+                await stream.aclose()
+        elif not bodyless:
+            iterator = iter(chunks)
+            while True:
+                # Streamed bodies are generated on the pool, one chunk at a time
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+                await self.send_chunk(writer, chunk, chunked)
+        if chunked:
+            writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def send_chunk(self, writer, chunk, chunked):
+        if chunk:
+            writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+            await writer.drain()
+
+    async def send_error(self, writer, code):
+        """Send a JSON error envelope and close the connection"""
+        body = b'{"success":false,"error":"%s"}' % REASONS[code].encode('ascii')
+        writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                     b'Connection: close\r\n\r\n%s' % (code, REASONS[code].encode('ascii'), len(body), body))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def serve(app, host='127.0.0.1', port=5000, workers=WORKERS, sock=None):
+    """Serve app until cancelled"""
+    server = await AsyncServer(app, workers).start(host, port, sock)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    from backend import app
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f'Serving the media API with asyncio on http://127.0.0.1:{port}')
+    try:
+        asyncio.run(serve(app, port=port))
+    except KeyboardInterrupt:
+        pass
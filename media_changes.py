@@ -0,0 +1,102 @@
+"""
+Film Cinemax Change Log
+Bounded in-memory record of catalogue changes, by version, for incremental sync
+"""
+
+import asyncio
+import threading
+from collections import deque
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeLog:
+    """The most recent catalogue changes as (version, op, value) entries
+
+    op is 'put' (value is the record) or 'delete' (value is the id). Only the
+    last max_entries changes are kept; oldest is the earliest version from
+    which every later change is still in the log, and latest the current one.
+
+    Threads can block in wait() and coroutines in wait_async() until the log
+    moves on, so change notifications need no polling.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = deque()
+        self.oldest = None
+        self.latest = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._waiters = set()  # (event loop, future) of waiting coroutines
+
+    def reset(self, version):
+        """Forget everything before version (e.g. after a full reload)"""
+        with self._lock:
+            self.entries.clear()
+            self.oldest = self.latest = version
+            self._wake()
+
+    def record(self, version, changes):
+        """Append the (op, value) changes that produced version"""
+        with self._lock:
+            for op, value in changes:
+                self.entries.append((version, op, value))
+            while len(self.entries) > self.max_entries:
+                # Changes at this version are now incomplete, so it becomes the oldest safe start
+                self.oldest = self.entries.popleft()[0]
+            self.latest = version
+            self._wake()
+
+    def since(self, version):
+        """Return (latest version, [(op, value)] changes after version)
+
+        The changes are None if a full resync is needed.
+        """
+        with self._lock:
+            if self.oldest is None or version < self.oldest or version > self.latest:
+                return self.latest, None
+            changes = []
+            # Walk back from the newest entry; the cost is proportional to the changes returned
+            for entry_version, op, value in reversed(self.entries):
+                if entry_version <= version:
+                    break
+                changes.append((op, value))
+            changes.reverse()
+            return self.latest, changes
+
+    def wait(self, version, timeout=None):
+        """Block until the log moves past version or timeout passes; returns the latest version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.latest != version, timeout)
+            return self.latest
+
+    async def wait_async(self, version, timeout=None):
+        """Like wait(), without holding a thread while waiting"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            if self.latest != version:
+                return self.latest
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+        return self.latest
+
+    def _wake(self):
+        # Called with the lock held, usually on the thread that made the change
+        self._changed.notify_all()
+        for loop, future in self._waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # that loop has closed
+        self._waiters.clear()
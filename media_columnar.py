@@ -0,0 +1,147 @@
+"""
+Film Cinemax Columnar Snapshot
+NumPy column arrays of the catalogue for vectorized reporting queries
+"""
+
+from media_index import normalize_id
+from media_query import numeric_value
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Stands in for a missing or non-numeric id/year/runtime in the integer columns
+MISSING = -1
+
+NUMERIC_COLUMNS = ('id', 'year', 'runtime')
+
+CODED_COLUMNS = ('category', 'director')
+
+
+class ColumnarSnapshot:
+    """The catalogue as arrays: int64 id/year/runtime and dictionary-encoded category/director"""
+
+    def __init__(self, records, version):
+        self.version = version
+        self.size = len(records)
+        self.columns = {}
+        self.dictionaries = {}
+
+        def number(value):
+            value = numeric_value(value)
+            return value if value is not None else MISSING
+
+        self.columns['id'] = np.fromiter(
+            (number(normalize_id(m.get('id'))) for m in records), dtype=np.int64, count=self.size)
+        self.columns['year'] = np.fromiter(
+            (number(m.get('year') or m.get('publication_date')) for m in records), dtype=np.int64, count=self.size)
+        self.columns['runtime'] = np.fromiter(
+            (number(m.get('runtime')) for m in records), dtype=np.int64, count=self.size)
+        for field, legacy in (('category', None), ('director', 'author')):
+            table = {}
+            codes = np.fromiter(
+                (table.setdefault(m.get(field) or (m.get(legacy) if legacy else None) or '', len(table))
+                 for m in records), dtype=np.int32, count=self.size)
+            self.columns[field] = codes
+            # code -> value, so results can be decoded with a single array index
+            self.dictionaries[field] = np.array(list(table), dtype=object)
+
+    def mask(self, category=None, director=None, year_min=None, year_max=None):
+        """Return a boolean array selecting the films that match the filters"""
+        selected = np.ones(self.size, dtype=bool)
+        for field, value in (('category', category), ('director', director)):
+            if value is not None:
+                value = str(value).casefold()
+                matching = [code for code, name in enumerate(self.dictionaries[field])
+                            if str(name).casefold() == value]
+                selected &= np.isin(self.columns[field], matching)
+        years = self.columns['year']
+        if year_min is not None:
+            selected &= years >= year_min
+        if year_max is not None:
+            selected &= (years <= year_max) & (years != MISSING)
+        return selected
+
+    def _numeric(self, field, selected):
+        if field not in NUMERIC_COLUMNS:
+            raise ValueError(f"field must be one of: {', '.join(NUMERIC_COLUMNS)}")
+        values = self.columns[field]
+        return values[selected & (values != MISSING)]
+
+    def histogram(self, field, bin_width, selected):
+        """Count films per [start, start + bin_width) bucket of a numeric column"""
+        if bin_width < 1:
+            raise ValueError('bin_width must be positive')
+        values = self._numeric(field, selected)
+        if not values.size:
+            return []
+        buckets = values // bin_width
+        first = int(buckets.min())
+        counts = np.bincount(buckets - first)
+        starts = (np.nonzero(counts)[0] + first) * bin_width
+        return [{'start': int(start), 'end': int(start + bin_width), 'count': int(count)}
+                for start, count in zip(starts, counts[counts > 0])]
+
+    def percentiles(self, field, points, selected, group_by=None):
+        """Return {percentile: value} overall, or per category/director with group_by"""
+        values = self._numeric(field, selected)
+        if group_by is None:
+            if not values.size:
+                return {}
+            return {str(p): float(v) for p, v in zip(points, np.percentile(values, points))}
+        if group_by not in CODED_COLUMNS:
+            raise ValueError(f"group_by must be one of: {', '.join(CODED_COLUMNS)}")
+        column = self.columns[field]
+        codes = self.columns[group_by][selected & (column != MISSING)]
+        # Sort by group, then value, so each group is one contiguous run
+        order = np.lexsort((values, codes))
+        codes, values = codes[order], values[order]
+        boundaries = np.flatnonzero(np.diff(codes)) + 1
+        result = {}
+        for group_codes, group_values in zip(np.split(codes, boundaries), np.split(values, boundaries)):
+            if group_values.size:
+                name = str(self.dictionaries[group_by][group_codes[0]])
+                result[name] = {str(p): float(v) for p, v in zip(points, np.percentile(group_values, points))}
+        return result
+
+    def top(self, field, n, selected):
+        """Top n categories/directors by film count, or top n films by a numeric column"""
+        if field in CODED_COLUMNS:
+            counts = np.bincount(self.columns[field][selected], minlength=len(self.dictionaries[field]))
+            n = min(n, int(np.count_nonzero(counts)))
+            best = np.argpartition(-counts, n - 1)[:n] if n else np.array([], dtype=np.int64)
+            best = best[np.argsort(-counts[best], kind='stable')]
+            return [{'value': str(self.dictionaries[field][code]), 'count': int(counts[code])} for code in best]
+        values = self.columns.get(field)
+        if field not in NUMERIC_COLUMNS:
+            raise ValueError(f"field must be one of: {', '.join(NUMERIC_COLUMNS + CODED_COLUMNS)}")
+        positions = np.flatnonzero(selected & (values != MISSING))
+        n = min(n, positions.size)
+        if not n:
+            return []
+        best = positions[np.argpartition(-values[positions], n - 1)[:n]]
+        best = best[np.argsort(-values[best], kind='stable')]
+        return [{'id': int(self.columns['id'][position]), field: int(values[position])} for position in best]
+
+
+class ColumnarView:
+    """Lazily rebuilt columnar snapshot of a repository; rebuilt only after the catalogue changes"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        self._snapshot = None
+
+    @property
+    def available(self):
+        return np is not None
+
+    def snapshot(self):
+        """Return a snapshot matching the repository's current version"""
+        if np is None:
+            raise RuntimeError('NumPy is not installed; analytics queries are unavailable')
+        with self.repository.reading():
+            version = self.repository.version
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = ColumnarSnapshot(self.repository.records(), version)
+            return self._snapshot
@@ -0,0 +1,113 @@
+"""
+Film Cinemax Response Compression
+gzip/deflate negotiation with compressed bodies cached per catalogue version
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, request
+
+ENCODINGS = ('gzip', 'deflate')
+
+# Bodies smaller than this are sent as they are; compressing them saves nothing
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESS_LEVEL = 6
+
+# zlib window bits selecting the gzip and zlib ("deflate") containers
+WBITS = {'gzip': 31, 'deflate': 15}
+
+
+def negotiate_encoding():
+    """Return the encoding the client prefers from ENCODINGS, or None for identity"""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def compress_body(data, encoding):
+    """Compress bytes with the given content encoding"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """Compress a streamed body chunk by chunk, never holding all of it"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, WBITS[encoding])
+    for chunk in chunks:
+        data = compressor.compress(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressedResponses:
+    """Decorator compressing a read endpoint's response, caching the compressed bytes
+
+    Entries are keyed by (path and query, catalogue version, encoding), so a
+    popular listing is compressed once per version rather than per request,
+    and a write makes every older entry unreachable. The least recently used
+    entries are dropped beyond max_entries.
+    """
+
+    def __init__(self, version_of, min_size=MIN_COMPRESS_SIZE, max_entries=128):
+        self.version_of = version_of
+        self.min_size = min_size
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = entry
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def cache_info(self):
+        with self._lock:
+            return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+    def __call__(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            encoding = negotiate_encoding()
+            if encoding is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                response.vary.add('Accept-Encoding')
+                return response
+            # Read the version first: a write during the view can only make the body newer
+            key = (request.full_path, self.version_of(), encoding)
+            entry = self._get(key)
+            if entry is not None:
+                body, mimetype = entry
+                response = Response(body, mimetype=mimetype)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or 'Content-Encoding' in response.headers:
+                    response.vary.add('Accept-Encoding')
+                    return response
+                if response.is_streamed:
+                    response.response = compress_stream(response.response, encoding)
+                else:
+                    data = response.get_data()
+                    if len(data) < self.min_size:
+                        response.vary.add('Accept-Encoding')
+                        return response
+                    body = compress_body(data, encoding)
+                    self._put(key, (body, response.mimetype))
+                    response.set_data(body)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+        return wrapper
@@ -0,0 +1,160 @@
+"""
+Film Cinemax Catalogue Events
+Server-Sent Events stream of catalogue changes, read from the change log
+
+Each event carries every change since the previous one:
+
+    id: <epoch>-<version>
+    event: changes
+    data: {"changes":[{"op":"put","record":{...}},{"op":"delete","id":7}],"version":12}
+
+A client that reconnects with Last-Event-ID gets exactly what it missed.
+If the log no longer reaches back that far, or the id comes from another
+server process, it gets a 'resync' event instead and should reload. Quiet
+streams carry a comment line every HEARTBEAT_INTERVAL seconds, so both ends
+notice a dead connection.
+
+Served by media_async.AsyncServer, a stream is iterated on the event loop
+(see EventStream.__aiter__), so an idle subscriber holds no thread. Threaded
+WSGI servers iterate it synchronously instead, one thread per subscriber.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from media_json import dumps, record_json
+
+# Seconds between heartbeats on a quiet stream
+HEARTBEAT_INTERVAL = 15
+
+# Milliseconds a client should wait before reconnecting (sent as the SSE retry field)
+RECONNECT_DELAY = 2000
+
+# Seconds between checks for changes made outside this process (e.g. by other workers)
+POLL_INTERVAL = 1.0
+
+HEARTBEAT = b': heartbeat\n\n'
+
+
+def change_json(op, value):
+    """Return one change as JSON bytes, reusing the record's cached fragment"""
+    if op == 'put':
+        return b'{"op":"put","record":' + record_json(value) + b'}'
+    return dumps({'op': 'delete', 'id': value})
+
+
+def format_event(event, event_id, data):
+    """Return one SSE message; data is JSON bytes (which never contain a newline)"""
+    return b'id: %s\nevent: %s\ndata: %s\n\n' % (event_id.encode('utf-8'), event.encode('ascii'), data)
+
+
+def parse_event_id(event_id):
+    """Split an '<epoch>-<version>' event id; returns (epoch, version) or (None, None)"""
+    epoch, _, version = (event_id or '').rpartition('-')
+    try:
+        return epoch, int(version)
+    except ValueError:
+        return None, None
+
+
+class EventStream:
+    """One subscriber's event stream, resuming after last_event_id if given"""
+
+    def __init__(self, events, last_event_id=None):
+        self.events = events
+        self.last_event_id = last_event_id
+        self.cursor = None
+
+    def _opening(self):
+        """The first message: what was missed since last_event_id, or where the stream starts"""
+        epoch = self.events.epoch()
+        head = b'retry: %d\n\n' % RECONNECT_DELAY
+        if not self.last_event_id:
+            self.cursor = self.events.log.latest
+            return head + format_event('ready', f'{epoch}-{self.cursor}', dumps({'version': self.cursor}))
+        resume_epoch, version = parse_event_id(self.last_event_id)
+        if resume_epoch != epoch:
+            self.cursor = self.events.log.latest
+            return head + self._resync(epoch)
+        return head + self._advance(epoch, version)
+
+    def _advance(self, epoch, version):
+        """The message for every change after version (empty if there are none)"""
+        self.cursor, changes = self.events.log.since(version)
+        if changes is None:
+            return self._resync(epoch)
+        if not changes:
+            return b''
+        data = (b'{"changes":[' + b','.join(change_json(op, value) for op, value in changes)
+                + b'],"version":%d}' % self.cursor)
+        return format_event('changes', f'{epoch}-{self.cursor}', data)
+
+    def _resync(self, epoch):
+        return format_event('resync', f'{epoch}-{self.cursor}', dumps({'version': self.cursor}))
+
+    def __iter__(self):
+        with self.events.subscribed():
+            yield self._opening()
+            while True:
+                latest = self.events.log.wait(self.cursor, HEARTBEAT_INTERVAL)
+                yield self._advance(self.events.epoch(), self.cursor) if latest != self.cursor else HEARTBEAT
+
+    async def __aiter__(self):
+        with self.events.subscribed():
+            yield self._opening()
+            while True:
+                latest = await self.events.log.wait_async(self.cursor, HEARTBEAT_INTERVAL)
+                yield self._advance(self.events.epoch(), self.cursor) if latest != self.cursor else HEARTBEAT
+
+
+class CatalogueEvents:
+    """Hands out event streams over a repository's change log
+
+    Changes made through this process reach the log directly. While anyone
+    is subscribed, one watcher thread also asks the repository for its
+    version every POLL_INTERVAL seconds, which picks up changes made by
+    other processes (and so records them in the log) however many
+    subscribers there are.
+    """
+
+    def __init__(self, repository, log, epoch, poll_interval=POLL_INTERVAL):
+        self.repository = repository
+        self.log = log
+        self.epoch = epoch  # callable returning this process's version epoch
+        self.poll_interval = poll_interval
+        self.subscribers = 0
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def stream(self, last_event_id=None):
+        """Return a new subscriber's EventStream (call from a request thread, not an event loop)"""
+        # Load or refresh the catalogue now, so the stream starts from the current version
+        self.repository.version_info()
+        return EventStream(self, last_event_id)
+
+    @contextmanager
+    def subscribed(self):
+        """Count one subscriber while the block runs"""
+        with self._lock:
+            self.subscribers += 1
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name='media-events', daemon=True)
+                self._watcher.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.subscribers -= 1
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self.subscribers:
+                    self._watcher = None
+                    return
+            try:
+                self.repository.version_info()
+            except Exception:
+                pass  # e.g. a damaged file, which the next request reports
+
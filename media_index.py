@@ -0,0 +1,181 @@
+"""
+Film Cinemax Media Indexes
+Secondary structures kept in step with the media repository
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+def normalize_id(media_id):
+    """Return the canonical form of an id: an int when numeric, otherwise a string"""
+    if isinstance(media_id, int) and not isinstance(media_id, bool):
+        return media_id
+    try:
+        return int(str(media_id).strip())
+    except ValueError:
+        return str(media_id)
+
+
+def record_key(media_id):
+    """Return the key used to identify a record (its canonical id)"""
+    return normalize_id(media_id)
+
+
+def id_sort_key(media_id):
+    """Order ids numerically, with any non-numeric ids after the numeric ones"""
+    media_id = normalize_id(media_id)
+    if isinstance(media_id, int):
+        return (0, media_id)
+    return (1, media_id)
+
+
+def fold(value):
+    """Casefold a field value for case-insensitive lookups"""
+    return str(value).casefold() if value is not None else ''
+
+
+class MediaIndex:
+    """Base class for indexes maintained incrementally by a MediaRepository
+
+    The repository calls rebuild() after a full (re)load and add()/remove()
+    for every record it inserts or deletes.
+    """
+
+    def rebuild(self, records):
+        raise NotImplementedError
+
+    def add(self, record):
+        raise NotImplementedError
+
+    def remove(self, record):
+        raise NotImplementedError
+
+    def state(self):
+        """Return a comparable snapshot of the index contents"""
+        raise NotImplementedError
+
+    def _fresh(self):
+        """Return an empty index of the same kind"""
+        return type(self)()
+
+    def check(self, records):
+        """Compare against an index freshly built from records; return a list of problems"""
+        fresh = self._fresh()
+        fresh.rebuild(records)
+        if self.state() != fresh.state():
+            return [f"{type(self).__name__} is out of date with the catalogue"]
+        return []
+
+
+class HashIndex(MediaIndex):
+    """id -> record, casefolded category -> ids and casefolded name -> ids"""
+
+    def __init__(self):
+        self.by_id = {}
+        self.by_category = {}
+        self.by_name = {}
+
+    def rebuild(self, records):
+        self.by_id = {}
+        self.by_category = {}
+        self.by_name = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        key = record_key(record.get('id'))
+        self.by_id[key] = record
+        # dicts keep insertion order, so the id sets stay in catalogue order
+        self.by_category.setdefault(fold(record.get('category')), {})[key] = None
+        self.by_name.setdefault(fold(record.get('name')), {})[key] = None
+
+    def remove(self, record):
+        key = record_key(record.get('id'))
+        self.by_id.pop(key, None)
+        for table, value in ((self.by_category, record.get('category')),
+                             (self.by_name, record.get('name'))):
+            ids = table.get(fold(value))
+            if ids is not None:
+                ids.pop(key, None)
+                if not ids:
+                    del table[fold(value)]
+
+    def get(self, media_id):
+        return self.by_id.get(record_key(media_id))
+
+    def find_category(self, category):
+        return [self.by_id[key] for key in self.by_category.get(fold(category), ())]
+
+    def find_name(self, name):
+        return [self.by_id[key] for key in self.by_name.get(fold(name), ())]
+
+    def state(self):
+        return (
+            {key: record for key, record in self.by_id.items()},
+            {value: set(ids) for value, ids in self.by_category.items()},
+            {value: set(ids) for value, ids in self.by_name.items()}
+        )
+
+    def check(self, records):
+        problems = []
+        keys = [record_key(m.get('id')) for m in records]
+        if len(set(keys)) != len(keys):
+            problems.append("Catalogue contains duplicate ids")
+        by_id, by_category, by_name = self.state()
+        fresh = HashIndex()
+        fresh.rebuild(records)
+        expected_id, expected_category, expected_name = fresh.state()
+        missing = expected_id.keys() - by_id.keys()
+        extra = by_id.keys() - expected_id.keys()
+        if missing:
+            problems.append(f"id index is missing {sorted(missing, key=id_sort_key)}")
+        if extra:
+            problems.append(f"id index has stale ids {sorted(extra, key=id_sort_key)}")
+        stale = [key for key in expected_id.keys() & by_id.keys() if expected_id[key] != by_id[key]]
+        if stale:
+            problems.append(f"id index has outdated records for {sorted(stale, key=id_sort_key)}")
+        if by_category != expected_category:
+            problems.append("category index does not match the catalogue")
+        if by_name != expected_name:
+            problems.append("name index does not match the catalogue")
+        return problems
+
+
+class SortedIndex(MediaIndex):
+    """Record keys kept sorted by sort_key(record), for keyset and range scans"""
+
+    def __init__(self, sort_key):
+        self.sort_key = sort_key
+        self.values = []
+        self.keys = []
+
+    def _fresh(self):
+        return SortedIndex(self.sort_key)
+
+    def rebuild(self, records):
+        pairs = sorted(((self.sort_key(record), record_key(record.get('id'))) for record in records),
+                       key=lambda pair: pair[0])
+        self.values = [value for value, _ in pairs]
+        self.keys = [key for _, key in pairs]
+
+    def add(self, record):
+        value = self.sort_key(record)
+        position = bisect_right(self.values, value)
+        self.values.insert(position, value)
+        self.keys.insert(position, record_key(record.get('id')))
+
+    def remove(self, record):
+        value = self.sort_key(record)
+        key = record_key(record.get('id'))
+        for position in range(bisect_left(self.values, value), bisect_right(self.values, value)):
+            if self.keys[position] == key:
+                del self.values[position]
+                del self.keys[position]
+                return
+
+    def position(self, value, after=False):
+        """Return the index of the first entry >= value (or > value when after is set)"""
+        return bisect_right(self.values, value) if after else bisect_left(self.values, value)
+
+    def state(self):
+        return sorted(zip(self.values, self.keys), key=lambda pair: (pair[0], id_sort_key(pair[1])))
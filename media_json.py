@@ -0,0 +1,49 @@
+"""
+Film Cinemax Media JSON
+Response bodies assembled from per-record JSON fragments
+"""
+
+import json
+from collections.abc import Mapping
+from media_record import Film, json_default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value):
+    """Encode value as compact UTF-8 JSON bytes with sorted keys (orjson when installed)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=json_default, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            # e.g. integers beyond 64 bits, which only the stdlib encoder handles
+            pass
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+                      default=json_default).encode('utf-8')
+
+
+def record_json(record):
+    """Return one record's JSON bytes, cached on the record when it is a Film"""
+    if isinstance(record, Film):
+        return record.json_bytes(dumps)
+    return dumps(record)
+
+
+def records_json(records):
+    """Return a JSON array of records by joining their fragments"""
+    return b'[' + b','.join(map(record_json, records)) + b']'
+
+
+def envelope(data, **fields):
+    """Return {**fields, 'data': data} as JSON bytes, reusing cached record fragments"""
+    if isinstance(data, (list, tuple)):
+        body = records_json(data)
+    elif isinstance(data, Mapping):
+        body = record_json(data)
+    else:
+        body = dumps(data)
+    head = dumps(fields)
+    return head[:-1] + (b',"data":' if fields else b'"data":') + body + b'}'
@@ -0,0 +1,215 @@
+"""
+Film Cinemax Pre-fork Launcher
+Serves the media API from several worker processes sharing one loaded catalogue
+
+The parent parses the catalogue and builds its indexes once, then forks the
+workers, which share those pages copy-on-write. Worker 0 is the writer: it
+alone commits changes, and the other workers forward every POST/DELETE to
+it over a private local socket. After each commit the writer announces the
+version and storage position it reached in shared memory. Readers compare
+it on every request and only look at storage once it has moved; they then
+read just the journal tail up to that position, even across a compaction,
+rather than re-parsing the whole file, and take the writer's version for
+the result. With the ETag epoch picked once by the parent, every worker
+labels the same catalogue the same way, so conditional requests, change
+feed versions and event ids are valid whichever worker a client reaches.
+
+Writes must go through the server while it runs: an edit made to the files
+directly is not announced on the counter.
+
+Usage: python media_prefork.py [workers] [port]
+"""
+
+import asyncio
+import gc
+import http.client
+import json
+import mmap
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from urllib.parse import quote
+from media_store import as_tuple
+
+# Headers that describe one hop and are not passed on when forwarding
+HOP_BY_HOP = {'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade', 'host'}
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds a reader waits for the writer to answer a forwarded request
+FORWARD_TIMEOUT = 30
+
+# Bytes of a request body read and sent on to the writer at a time
+FORWARD_BLOCK_SIZE = 64 * 1024
+
+
+def body_blocks(stream, length=None):
+    """Yield a request body from wsgi.input a block at a time, up to length bytes if given"""
+    while length is None or length > 0:
+        block = stream.read(FORWARD_BLOCK_SIZE if length is None else min(FORWARD_BLOCK_SIZE, length))
+        if not block:
+            return
+        if length is not None:
+            length -= len(block)
+        yield block
+
+
+class SharedCounter:
+    """The writer's last committed catalogue state, in anonymous shared memory; create it before forking
+
+    current() is a sequence number that moves on every notify(), cheap
+    enough to compare on each request. published() returns what the writer
+    announced with it: (sequence, version, modified_at, storage signature).
+    The sequence is odd while the writer is updating the rest (a seqlock),
+    so readers never see half of an announcement. Only the writer process
+    calls notify(), so no lock is needed.
+    """
+
+    SIZE = 4096
+    _HEADER = struct.Struct('=QQdI')
+
+    def __init__(self):
+        self._memory = mmap.mmap(-1, self.SIZE)
+
+    def current(self):
+        return struct.unpack_from('=Q', self._memory)[0]
+
+    def published(self):
+        """Return (sequence, version, modified_at, signature); signature is None until the first notify()"""
+        while True:
+            sequence, version, modified_at, length = self._HEADER.unpack_from(self._memory)
+            payload = self._memory[self._HEADER.size:self._HEADER.size + length]
+            if not sequence % 2 and self.current() == sequence:
+                signature = as_tuple(json.loads(payload)) if length else None
+                return sequence, version, modified_at, signature
+            time.sleep(0)
+
+    def notify(self, version=0, modified_at=0.0, signature=None):
+        """Announce a committed state (the writer's version and storage signature after the commit)"""
+        payload = json.dumps(signature).encode('utf-8') if signature is not None else b''
+        if self._HEADER.size + len(payload) > self.SIZE:
+            payload = b''  # readers then fall back to checking storage themselves
+        sequence = self.current()
+        struct.pack_into('=Q', self._memory, 0, sequence + 1)
+        self._HEADER.pack_into(self._memory, 0, sequence + 1, version, modified_at, len(payload))
+        self._memory[self._HEADER.size:self._HEADER.size + len(payload)] = payload
+        struct.pack_into('=Q', self._memory, 0, sequence + 2)
+
+class WriteForwarder:
+    """WSGI middleware that serves reads locally and sends everything else to the writer"""
+
+    def __init__(self, app, writer_address):
+        self.app = app
+        self.writer_address = writer_address
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        if method in READ_METHODS:
+            return self.app(environ, start_response)
+        headers = {key[5:].replace('_', '-').title(): value for key, value in environ.items()
+                   if key.startswith('HTTP_') and key[5:].replace('_', '-').lower() not in HOP_BY_HOP}
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        # The body is streamed on as it arrives: with its Content-Length if it
+        # came with one, otherwise (a chunked upload) chunked again
+        if environ.get('CONTENT_LENGTH'):
+            headers['Content-Length'] = environ['CONTENT_LENGTH']
+            body = body_blocks(environ['wsgi.input'], int(environ['CONTENT_LENGTH']))
+        else:
+            body = body_blocks(environ['wsgi.input'])
+        target = quote(environ['PATH_INFO'].encode('latin-1'), safe="/:@!$&'()*+,;=")
+        if environ.get('QUERY_STRING'):
+            target += '?' + environ['QUERY_STRING']
+        connection = http.client.HTTPConnection(*self.writer_address, timeout=FORWARD_TIMEOUT)
+        try:
+            connection.request(method, target, body=body, headers=headers,
+                               encode_chunked='Content-Length' not in headers)
+            response = connection.getresponse()
+            data = response.read()
+        except OSError:
+            data = b'{"success":false,"error":"Writer process unavailable"}'
+            start_response('503 Service Unavailable',
+                           [('Content-Type', 'application/json'), ('Content-Length', str(len(data)))])
+            return [data]
+        finally:
+            connection.close()
+        response_headers = [(name, value) for name, value in response.getheaders()
+                            if name.lower() not in HOP_BY_HOP and name.lower() != 'content-length']
+        response_headers.append(('Content-Length', str(len(data))))
+        start_response(f'{response.status} {response.reason}', response_headers)
+        return [data]
+
+
+def run_worker(number, backend, listener, writer_socket):
+    """Serve requests in a forked worker until terminated"""
+    from media_async import AsyncServer
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if number == 0:
+        app, sockets = backend.app, [listener, writer_socket]
+    else:
+        app, sockets = WriteForwarder(backend.app, writer_socket.getsockname()), [listener]
+        writer_socket.close()
+
+    async def serve():
+        server = AsyncServer(app)
+        servers = [await server.start(sock=sock) for sock in sockets]
+        await asyncio.gather(*(s.serve_forever() for s in servers))
+
+    asyncio.run(serve())
+
+
+def run(workers=4, host='127.0.0.1', port=5000):
+    """Load the catalogue, fork the workers and restart any that exit, until interrupted"""
+    # The journal lets readers apply just the changes made since they last looked
+    os.environ.setdefault('FILM_STORAGE', 'journal')
+    import backend
+    # Every worker starts from this state and then takes each version from the writer,
+    # so ETags, /api/media/changes versions and event ids hold across workers
+    backend.repository.watch(SharedCounter())
+    listener = socket.create_server((host, port), backlog=1024)
+    writer_socket = socket.create_server(('127.0.0.1', 0))
+    # Keep the loaded catalogue out of garbage collection passes so its pages stay shared
+    gc.freeze()
+
+    def spawn(number):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(number, backend, listener, writer_socket)
+            finally:
+                os._exit(1)
+        return pid
+
+    children = {spawn(number): number for number in range(workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f'Serving the media API on http://{host}:{port} with {workers} workers')
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        number = children.pop(pid, None)
+        if number is not None and not stopping:
+            print(f'Worker {number} exited; restarting it')
+            children[spawn(number)] = number
+
+
+if __name__ == '__main__':
+    run(workers=int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 4,
+        port=int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
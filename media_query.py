@@ -0,0 +1,162 @@
+"""
+Film Cinemax Media Query
+Range filtering and sorting over the catalogue, answered from sorted indexes
+"""
+
+import base64
+import json
+from media_index import SortedIndex, fold, id_sort_key
+
+SORT_FIELDS = ('id', 'name', 'year', 'runtime')
+
+RANGE_FIELDS = ('year', 'runtime')
+
+# Filters matching at most this many films are fetched and sorted directly;
+# larger ones are answered by walking the sort index in order
+MAX_SORTED_CANDIDATES = 10000
+
+# Bounds that sort before / after every id key at the same field value
+_LOWEST = ()
+_HIGHEST = (2,)
+
+
+def numeric_value(value):
+    """Return value as an int, or None if it is missing or not a number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+def range_value(record, field):
+    """Return a record's year or runtime as an int, reading a legacy 'publication_date' as the year"""
+    if field == 'year':
+        return numeric_value(record.get('year') or record.get('publication_date'))
+    return numeric_value(record.get(field))
+
+
+def numeric_key(value):
+    """Sort numbers by value, with missing or non-numeric values last"""
+    number = numeric_value(value)
+    return (0, number) if number is not None else (1, 0)
+
+
+def encode_cursor(key):
+    """Turn a sort key into an opaque cursor string"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor string back into a sort key; raises ValueError if it is malformed"""
+    def as_tuple(value):
+        return tuple(as_tuple(v) for v in value) if isinstance(value, list) else value
+    try:
+        return as_tuple(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii'))))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+
+class CatalogueQuery:
+    """Filters by category and year/runtime ranges, sorted by id, name, year or runtime
+
+    Sorted indexes on year, runtime and casefolded name are attached to the
+    repository; each entry's key ends with the id so the order is total and
+    a keyset cursor can resume exactly where a page ended.
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.indexes = {'id': repository.id_index}
+        for field in ('year', 'runtime'):
+            self.indexes[field] = repository.attach(SortedIndex(
+                lambda record, field=field: (numeric_key(range_value(record, field)), id_sort_key(record.get('id')))))
+        self.indexes['name'] = repository.attach(SortedIndex(
+            lambda record: (fold(record.get('name')), id_sort_key(record.get('id')))))
+
+    def _range_positions(self, field, low, high):
+        """Return the [start, end) positions of entries with low <= field <= high"""
+        index = self.indexes[field]
+        start = index.position(((0, low), _LOWEST)) if low is not None else 0
+        # Missing values sort last, so an open upper bound still stops before them
+        end = index.position(((0, high), _HIGHEST)) if high is not None else index.position(((1, 0), _LOWEST))
+        return start, end
+
+    def run(self, category=None, ranges=None, sort='id', descending=False, limit=None, cursor=None):
+        """Return (records, next_cursor) for one page of matching films
+
+        ranges maps 'year'/'runtime' to (low, high) bounds, either of which may be None.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+        bounds = {field: bound for field, bound in (ranges or {}).items()
+                  if bound[0] is not None or bound[1] is not None}
+        after = decode_cursor(cursor) if cursor is not None else None
+        folded_category = fold(category) if category is not None else None
+
+        def matches(record):
+            if folded_category is not None and fold(record.get('category')) != folded_category:
+                return False
+            for field, (low, high) in bounds.items():
+                value = range_value(record, field)
+                if value is None or (low is not None and value < low) or (high is not None and value > high):
+                    return False
+            return True
+
+        try:
+            page = self._collect(folded_category, bounds, matches, sort, descending, limit, after)
+        except TypeError:
+            # A cursor issued for a different sort order cannot be compared with these keys
+            raise ValueError('Invalid cursor')
+
+        next_cursor = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1][0])
+        return [record for _, record in page], next_cursor
+
+    def _collect(self, folded_category, bounds, matches, sort, descending, limit, after):
+        """Return up to limit + 1 (sort key, record) pairs after the cursor key"""
+        with self.repository.reading():
+            by_id = self.repository.hash_index.by_id
+            sort_index = self.indexes[sort]
+            sources = []
+            if folded_category is not None:
+                keys = self.repository.hash_index.by_category.get(folded_category, {})
+                sources.append((len(keys), lambda keys=keys: list(keys)))
+            positions = {}
+            for field, (low, high) in bounds.items():
+                start, end = positions[field] = self._range_positions(field, low, high)
+                index = self.indexes[field]
+                sources.append((end - start, lambda index=index, start=start, end=end: index.keys[start:end]))
+
+            if sources and min(sources, key=lambda source: source[0])[0] <= MAX_SORTED_CANDIDATES:
+                # Selective filter: fetch its few candidates and sort them
+                _, fetch = min(sources, key=lambda source: source[0])
+                candidates = [(sort_index.sort_key(by_id[key]), by_id[key]) for key in fetch()]
+                candidates = [pair for pair in candidates if matches(pair[1])]
+                if after is not None:
+                    candidates = [pair for pair in candidates
+                                  if (pair[0] < after if descending else pair[0] > after)]
+                candidates.sort(key=lambda pair: pair[0], reverse=descending)
+                page = candidates[:limit + 1] if limit is not None else candidates
+            else:
+                # Walk the sort index in order, skipping films that fail the filters
+                start, end = positions.get(sort, (0, len(sort_index.keys)))
+                if after is not None:
+                    if descending:
+                        end = min(end, sort_index.position(after))
+                    else:
+                        start = max(start, sort_index.position(after, after=True))
+                steps = range(end - 1, start - 1, -1) if descending else range(start, end)
+                page = []
+                for position in steps:
+                    record = by_id[sort_index.keys[position]]
+                    if matches(record):
+                        page.append((sort_index.values[position], record))
+                        if limit is not None and len(page) > limit:
+                            break
+        return page
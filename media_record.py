@@ -0,0 +1,133 @@
+"""
+Film Cinemax Media Record
+Compact, immutable film records for the in-memory catalogue
+"""
+
+import sys
+from collections.abc import Mapping
+from datetime import datetime
+
+FIELDS = ('id', 'name', 'director', 'year', 'category', 'runtime', 'description', 'created_at')
+
+# Legacy spellings share a slot with the current field name
+SLOT_OF = {**{field: field for field in FIELDS}, 'author': 'director', 'publication_date': 'year'}
+
+# Values repeated across many films, stored once per distinct string
+INTERNED = ('director', 'category')
+
+_MISSING = object()
+
+# One shared key tuple per distinct record layout, instead of one per record
+_layouts = {}
+
+
+def _layout(keys):
+    keys = tuple(keys)
+    return _layouts.setdefault(keys, keys)
+
+
+def _parse_timestamp(value):
+    """Return value as a datetime if it is an ISO timestamp that round-trips exactly"""
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        if parsed.isoformat() == value:
+            return parsed
+    return value
+
+
+class Film(Mapping):
+    """One catalogue entry, read like the dict it was built from
+
+    Known fields live in slots, category and director strings are interned
+    and created_at is held as a datetime. Keys keep the order and spelling
+    they were written with (including legacy 'author'/'publication_date'),
+    so to_dict() returns the original record. Fields the schema does not
+    know about go in extra.
+    """
+
+    __slots__ = FIELDS + ('_keys', 'extra', '_json')
+
+    def __init__(self, record):
+        set_slot = object.__setattr__
+        for field in FIELDS:
+            set_slot(self, field, None)
+        extra = None
+        for key, value in record.items():
+            slot = SLOT_OF.get(key)
+            if slot is None or (key != slot and slot in record and record[slot] != value):
+                # Unknown field, or a legacy spelling that disagrees with the current one
+                extra = extra or {}
+                extra[key] = value
+                continue
+            if slot in INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            elif slot == 'created_at':
+                value = _parse_timestamp(value)
+            set_slot(self, slot, value)
+        set_slot(self, '_keys', _layout(record))
+        set_slot(self, 'extra', extra)
+        set_slot(self, '_json', None)
+
+    @classmethod
+    def from_record(cls, record):
+        """Return record as a Film (unchanged if it already is one)"""
+        return record if isinstance(record, cls) else cls(record)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Film records are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Film records are immutable')
+
+    def get(self, key, default=None):
+        if key not in self._keys:
+            return default
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        value = getattr(self, SLOT_OF[key])
+        if key == 'created_at' and isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f'Film({self.to_dict()!r})'
+
+    def __reduce__(self):
+        return (type(self), (self.to_dict(),))
+
+    def json_bytes(self, encode):
+        """Return encode(self.to_dict()), computed on first use; a write replaces the Film, so it never goes stale"""
+        if self._json is None:
+            object.__setattr__(self, '_json', encode(self.to_dict()))
+        return self._json
+
+    def to_dict(self):
+        """Return the record as a plain dict, for serialization"""
+        return {key: self.get(key) for key in self._keys}
+
+
+def json_default(value, fallback=None):
+    """json.dumps default= hook that serializes Film records, deferring anything else to fallback"""
+    if isinstance(value, Film):
+        return value.to_dict()
+    if fallback is not None:
+        return fallback(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
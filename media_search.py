@@ -0,0 +1,253 @@
+"""
+Film Cinemax Media Search
+Inverted full-text index over film names, directors and descriptions
+"""
+
+import re
+from media_index import MediaIndex, record_key, fold
+
+WORD_RE = re.compile(r'\w+')
+
+
+def trigrams(text):
+    """Return the set of 3-character substrings of text"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def director_of(record):
+    """Return the director, falling back to the legacy 'author' field"""
+    return record.get('director') or record.get('author') or ''
+
+
+class FullTextIndex(MediaIndex):
+    """Inverted index answering ranked, multi-term AND searches
+
+    Name and director are indexed by trigrams so a term still matches
+    anywhere inside them, as the old substring search did. Every word of
+    name, director and description is indexed whole and by its first one
+    and two characters, which answers short terms. A search only touches
+    the posting lists of its terms, never the whole catalogue.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.order = {}
+        self.grams = {}
+        self.words = {}
+        self.prefixes = {}
+        self._counter = 0
+
+    def _postings(self, record):
+        """Return (grams, words, prefixes) for a record"""
+        name = fold(record.get('name'))
+        director = fold(director_of(record))
+        words = set()
+        for field in (name, director, fold(record.get('description'))):
+            words.update(WORD_RE.findall(field))
+        prefixes = {word[:n] for word in words for n in (1, 2) if len(word) > n}
+        return trigrams(name) | trigrams(director), words, prefixes
+
+    def rebuild(self, records):
+        self.docs = {}
+        self.order = {}
+        self.grams = {}
+        self.words = {}
+        self.prefixes = {}
+        self._counter = 0
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        key = record_key(record.get('id'))
+        self.docs[key] = record
+        self.order[key] = self._counter
+        self._counter += 1
+        for table, terms in zip((self.grams, self.words, self.prefixes), self._postings(record)):
+            for term in terms:
+                table.setdefault(term, set()).add(key)
+
+    def remove(self, record):
+        key = record_key(record.get('id'))
+        self.docs.pop(key, None)
+        self.order.pop(key, None)
+        for table, terms in zip((self.grams, self.words, self.prefixes), self._postings(record)):
+            for term in terms:
+                postings = table.get(term)
+                if postings is not None:
+                    postings.discard(key)
+                    if not postings:
+                        del table[term]
+
+    def state(self):
+        return (set(self.docs), self.grams, self.words, self.prefixes)
+
+    def _match(self, term):
+        """Return the keys of documents matching a single term"""
+        if len(term) < 3:
+            matches = set(self.prefixes.get(term, ()))
+            matches.update(self.words.get(term, ()))
+            return matches
+        postings = [self.grams.get(gram) for gram in trigrams(term)]
+        matches = set()
+        if all(postings):
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for other in postings[1:]:
+                candidates &= other
+            # Trigrams can match out of order, so confirm the substring
+            for key in candidates:
+                record = self.docs[key]
+                if term in fold(record.get('name')) or term in fold(director_of(record)):
+                    matches.add(key)
+        matches.update(self.words.get(term, ()))
+        return matches
+
+    def _score(self, record, terms, phrase):
+        name = fold(record.get('name'))
+        director = fold(director_of(record))
+        description = fold(record.get('description'))
+        score = 3 if phrase in name else 0
+        for term in terms:
+            if term in name:
+                score += 3 if name.startswith(term) else 2
+            if term in director:
+                score += 2
+            if term in description:
+                score += 1
+        return score
+
+    def search(self, query, limit=None, predicate=None):
+        """Return records matching every term of query, best matches first"""
+        phrase = fold(query).strip()
+        terms = list(dict.fromkeys(phrase.split()))
+        if not terms:
+            return []
+        matches = []
+        for term in terms:
+            keys = self._match(term)
+            if not keys:
+                return []
+            matches.append(keys)
+        matches.sort(key=len)
+        result = set(matches[0])
+        for keys in matches[1:]:
+            result &= keys
+        records = [self.docs[key] for key in result]
+        if predicate is not None:
+            records = [record for record in records if predicate(record)]
+        records.sort(key=lambda record: (-self._score(record, terms, phrase),
+                                         self.order[record_key(record.get('id'))]))
+        return records[:limit] if limit is not None else records
+
+
+def substring_distance(pattern, text, limit):
+    """Return the fewest edits turning pattern into some substring of text, or None if over limit
+
+    A Levenshtein table in which the match may start and end anywhere in
+    text; it stops as soon as a whole row exceeds limit.
+    """
+    if not pattern:
+        return 0
+    previous = [0] * (len(text) + 1)
+    for i, char in enumerate(pattern, 1):
+        current = [i]
+        for j, other in enumerate(text, 1):
+            current.append(min(previous[j - 1] + (char != other), previous[j] + 1, current[j - 1] + 1))
+        if min(current) > limit:
+            return None
+        previous = current
+    distance = min(previous)
+    return distance if distance <= limit else None
+
+
+class FuzzyNameIndex(MediaIndex):
+    """Trigram index over film names for typo-tolerant search
+
+    Each edit to a query changes at most three of its trigrams, so a name
+    within max_distance edits shares at least len(grams) - 3 * max_distance
+    of them. Only names meeting that bound are verified with
+    substring_distance(), and new candidates are only taken from the rarest
+    grams that any qualifying name must contain, so common trigrams such as
+    'the' never widen the search.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.names = {}
+        self.grams = {}
+        self.order = {}
+        self._counter = 0
+
+    def rebuild(self, records):
+        self.docs = {}
+        self.names = {}
+        self.grams = {}
+        self.order = {}
+        self._counter = 0
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        key = record_key(record.get('id'))
+        name = fold(record.get('name'))
+        self.docs[key] = record
+        self.names[key] = name
+        self.order[key] = self._counter
+        self._counter += 1
+        for gram in trigrams(name):
+            self.grams.setdefault(gram, set()).add(key)
+
+    def remove(self, record):
+        key = record_key(record.get('id'))
+        self.docs.pop(key, None)
+        self.order.pop(key, None)
+        for gram in trigrams(self.names.pop(key, fold(record.get('name')))):
+            postings = self.grams.get(gram)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self.grams[gram]
+
+    def state(self):
+        return (self.names, self.grams)
+
+    def allowed_distance(self, query, max_distance):
+        """Return the edit distance search() actually allows for query
+
+        Short queries tolerate fewer edits than asked for: searching at
+        distance d needs 3 * d + 1 distinct trigrams (about 3 * d + 3
+        characters), so every match still shares a trigram with the query
+        and the search never degrades into a scan of the whole catalogue.
+        """
+        grams = trigrams(' '.join(fold(query).split()))
+        return max(0, min(max_distance, (len(grams) - 1) // 3))
+
+    def search(self, query, max_distance=2, limit=10):
+        """Return [(record, distance)] for names within allowed_distance() edits of query, closest first"""
+        max_distance = self.allowed_distance(query, max_distance)
+        query = ' '.join(fold(query).split())
+        grams = sorted(trigrams(query), key=lambda gram: len(self.grams.get(gram, ())))
+        if not grams:
+            return []
+        needed = len(grams) - 3 * max_distance
+        # A name sharing `needed` grams must contain one of the rarest len - needed + 1
+        seeds = len(grams) - needed + 1
+        counts = {}
+        for gram in grams[:seeds]:
+            for key in self.grams.get(gram, ()):
+                counts[key] = counts.get(key, 0) + 1
+        for gram in grams[seeds:]:
+            postings = self.grams.get(gram, ())
+            for key in counts:
+                if key in postings:
+                    counts[key] += 1
+        matches = []
+        for key, count in counts.items():
+            if count < needed:
+                continue
+            name = self.names[key]
+            distance = substring_distance(query, name, max_distance)
+            if distance is not None:
+                matches.append((distance, abs(len(name) - len(query)), self.order[key], key))
+        matches.sort()
+        return [(self.docs[key], distance) for distance, _, _, key in matches[:limit]]
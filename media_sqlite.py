@@ -0,0 +1,208 @@
+"""
+Film Cinemax SQLite Storage
+SQLite storage engine for the media repository, with films.json as import/export format
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from media_store import read_json_file, write_json_file, file_signature
+
+COLUMNS = ['id', 'name', 'year', 'director', 'category', 'runtime', 'description', 'created_at']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    year,
+    director,
+    category TEXT NOT NULL,
+    runtime,
+    description,
+    created_at,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_media_category ON media(lower(category));
+CREATE INDEX IF NOT EXISTS idx_media_name ON media(lower(name));
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def normalize_legacy(record):
+    """Map legacy 'author'/'publication_date' fields onto 'director'/'year'"""
+    record = dict(record)
+    author = record.pop('author', None)
+    publication_date = record.pop('publication_date', None)
+    if not record.get('director') and author:
+        record['director'] = author
+    if not record.get('year') and publication_date:
+        try:
+            record['year'] = int(publication_date)
+        except (TypeError, ValueError):
+            record['year'] = publication_date
+    return record
+
+
+def record_to_row(record):
+    """Convert a record dict into a row tuple for the media table"""
+    row = [record.get(column) for column in COLUMNS]
+    extra = {k: v for k, v in record.items() if k not in COLUMNS}
+    row.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+    return row
+
+
+def row_to_record(row):
+    """Convert a media table row back into a record dict"""
+    record = {}
+    for column, value in zip(COLUMNS, row):
+        if value is not None:
+            record[column] = value
+    if row[len(COLUMNS)]:
+        record.update(json.loads(row[len(COLUMNS)]))
+    return record
+
+
+class SqliteStorage:
+    """Stores the catalogue in a local SQLite database in WAL mode
+
+    Lookups by id, category and name are answered by indexed queries, so the
+    repository does not need to hold the catalogue in memory to serve them.
+    """
+
+    queryable = True
+
+    def __init__(self, path, json_path=None):
+        self.path = path
+        self.json_path = json_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._connection()
+            conn.executescript(SCHEMA)
+            if json_path and self._meta('migrated_from') is None:
+                self._migrate(json_path)
+
+    def _connection(self):
+        """Return this thread's connection (sqlite3 connections are not shared)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key):
+        row = self._connection().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _migrate(self, json_path):
+        """One-shot import of an existing films.json"""
+        conn = self._connection()
+        with conn:
+            if conn.execute('SELECT count(*) FROM media').fetchone()[0] == 0:
+                self._insert(conn, read_json_file(json_path))
+            conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                         ('migrated_from', os.path.abspath(json_path)))
+
+    def _insert(self, conn, records):
+        """Insert records, normalizing legacy fields and numeric string ids"""
+        rows = []
+        for record in records:
+            record = normalize_legacy(record)
+            try:
+                record['id'] = int(record.get('id'))
+            except (TypeError, ValueError):
+                # Non-numeric ids get a fresh rowid
+                record.pop('id', None)
+            rows.append(record_to_row(record))
+        conn.executemany(
+            f'INSERT OR REPLACE INTO media ({", ".join(COLUMNS)}, extra) '
+            f'VALUES ({", ".join("?" * (len(COLUMNS) + 1))})', rows)
+
+    def _select(self, where='', params=()):
+        cursor = self._connection().execute(
+            f'SELECT {", ".join(COLUMNS)}, extra FROM media {where} ORDER BY id', params)
+        return [row_to_record(row) for row in cursor]
+
+    def signature(self):
+        return (file_signature(self.path), file_signature(self.path + '-wal'))
+
+    def load(self):
+        return self._select()
+
+    def read_ops_since(self, signature, until=None):
+        return None
+
+    def commit(self, ops, snapshot):
+        """Apply operations in a single transaction"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                for kind, value in ops:
+                    if kind == 'put':
+                        self._insert(conn, [value])
+                    else:
+                        conn.execute('DELETE FROM media WHERE id = ?', (str(value),))
+
+    def save(self, records):
+        """Replace the whole catalogue"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('DELETE FROM media')
+                self._insert(conn, records)
+
+    def max_id(self):
+        return self._connection().execute('SELECT coalesce(max(id), 0) FROM media').fetchone()[0]
+
+    def find_by_id(self, media_id):
+        records = self._select('WHERE id = ?', (media_id,))
+        return records[0] if records else None
+
+    def find_by_category(self, category):
+        return self._select('WHERE lower(category) = lower(?)', (category,))
+
+    def find_by_name(self, name):
+        return self._select('WHERE lower(name) = lower(?)', (name,))
+
+    def find_page(self, limit, cursor=None, category=None):
+        """Return (records, next_cursor) using a keyset scan on the primary key"""
+        clauses = ['id > ?']
+        params = [int(cursor) if cursor is not None else -1]
+        if category is not None:
+            clauses.append('lower(category) = lower(?)')
+            params.append(category)
+        rows = self._connection().execute(
+            f'SELECT {", ".join(COLUMNS)}, extra FROM media WHERE {" AND ".join(clauses)} '
+            f'ORDER BY id LIMIT ?', params + [limit + 1])
+        records = [row_to_record(row) for row in rows]
+        next_cursor = str(records[limit - 1]['id']) if len(records) > limit else None
+        return records[:limit], next_cursor
+
+    def import_json(self, json_path):
+        """Replace the catalogue with the contents of a JSON file"""
+        self.save(read_json_file(json_path))
+
+    def export_json(self, json_path):
+        """Write the catalogue out as a JSON file"""
+        write_json_file(json_path, self.load())
+
+
+if __name__ == '__main__':
+    # Usage: python media_sqlite.py import|export films.json films.db
+    if len(sys.argv) != 4 or sys.argv[1] not in ('import', 'export'):
+        print("Usage: python media_sqlite.py import|export <films.json> <films.db>")
+        sys.exit(1)
+    command, json_file, db_file = sys.argv[1:]
+    storage = SqliteStorage(db_file)
+    if command == 'import':
+        storage.import_json(json_file)
+    else:
+        storage.export_json(json_file)
+    print(f"{command.capitalize()}ed {len(storage.load())} media items")
@@ -0,0 +1,201 @@
+"""
+Film Cinemax Media Statistics
+Catalogue aggregates kept up to date as films are added and deleted
+"""
+
+from media_index import MediaIndex, fold
+from media_query import numeric_value, range_value
+
+GROUP_FIELDS = ('category', 'year', 'decade', 'director')
+
+FILTER_FIELDS = ('category', 'decade')
+
+
+def group_values(record):
+    """Return {group field: value} for the groups a record belongs to
+
+    Categories are casefolded, as in HashIndex, and directors are strings,
+    so every group key of a field compares with the others.
+    """
+    values = {}
+    if record.get('category'):
+        values['category'] = fold(record['category'])
+    year = range_value(record, 'year')
+    if year is not None:
+        values['year'] = year
+        values['decade'] = year // 10 * 10
+    director = record.get('director') or record.get('author')
+    if director:
+        values['director'] = str(director)
+    return values
+
+
+class GroupStats:
+    """Film count plus runtime total and per-runtime counts for one group
+
+    Runtimes are whole minutes with few distinct values, so adding or
+    removing a film is one counter update, and the median is found by
+    walking those distinct values in order when a summary is asked for.
+    """
+
+    __slots__ = ('count', 'runtime_total', 'runtime_count', 'runtimes')
+
+    def __init__(self):
+        self.count = 0
+        self.runtime_total = 0
+        self.runtime_count = 0
+        self.runtimes = {}  # runtime -> number of films with it
+
+    def add(self, runtime):
+        self.count += 1
+        if runtime is not None:
+            self.runtime_total += runtime
+            self.runtime_count += 1
+            self.runtimes[runtime] = self.runtimes.get(runtime, 0) + 1
+
+    def remove(self, runtime):
+        self.count -= 1
+        if runtime is not None:
+            self.runtime_total -= runtime
+            self.runtime_count -= 1
+            left = self.runtimes[runtime] - 1
+            if left:
+                self.runtimes[runtime] = left
+            else:
+                del self.runtimes[runtime]
+
+    def _nth_runtime(self, values, n):
+        """Return the n-th (0-based) runtime in sorted order from (runtime, count) pairs"""
+        for runtime, count in values:
+            if n < count:
+                return runtime
+            n -= count
+
+    def median(self):
+        values = sorted(self.runtimes.items())
+        middle = self.runtime_count // 2
+        if self.runtime_count % 2:
+            return self._nth_runtime(values, middle)
+        return (self._nth_runtime(values, middle - 1) + self._nth_runtime(values, middle)) / 2
+
+    def summary(self):
+        summary = {'count': self.count, 'average_runtime': None, 'median_runtime': None}
+        if self.runtime_count:
+            summary['average_runtime'] = round(self.runtime_total / self.runtime_count, 2)
+            summary['median_runtime'] = self.median()
+        return summary
+
+
+class StatsIndex(MediaIndex):
+    """Counts and runtime aggregates per category, year, decade and director
+
+    Every group is also kept per category and per decade, so a filtered
+    breakdown (e.g. directors within Drama) is read straight off the
+    counters. Adding or removing a film touches a fixed number of groups.
+    Categories are grouped case-insensitively, each shown in the first (in
+    sort order) of the spellings its films use.
+    """
+
+    def __init__(self):
+        self.total = GroupStats()
+        self.groups = {}
+        self.filtered = {}
+        self.spellings = {}  # casefolded category -> {category as written: film count}
+
+    def rebuild(self, records):
+        self.total = GroupStats()
+        self.groups = {field: {} for field in GROUP_FIELDS}
+        self.filtered = {field: {} for field in FILTER_FIELDS}
+        self.spellings = {}
+        for record in records:
+            self.add(record)
+
+    def _targets(self, values):
+        """Yield every GroupStats a record with these group_values() is counted in, creating missing ones"""
+        tables = [(self.groups, None)]
+        for field in FILTER_FIELDS:
+            if field in values:
+                tables.append((self.filtered[field].setdefault(values[field], {}), values[field]))
+        for groups, _ in tables:
+            for field, value in values.items():
+                yield groups.setdefault(field, {}).setdefault(value, GroupStats())
+        for field in FILTER_FIELDS:
+            if field in values:
+                yield self.filtered[field][values[field]].setdefault(None, GroupStats())
+
+    def add(self, record):
+        runtime = numeric_value(record.get('runtime'))
+        values = group_values(record)
+        if 'category' in values:
+            spellings = self.spellings.setdefault(values['category'], {})
+            spelling = str(record['category'])
+            spellings[spelling] = spellings.get(spelling, 0) + 1
+        self.total.add(runtime)
+        for stats in self._targets(values):
+            stats.add(runtime)
+
+    def remove(self, record):
+        runtime = numeric_value(record.get('runtime'))
+        values = group_values(record)
+        self.total.remove(runtime)
+        for stats in self._targets(values):
+            stats.remove(runtime)
+        if 'category' in values:
+            spellings = self.spellings[values['category']]
+            spelling = str(record['category'])
+            spellings[spelling] -= 1
+            if not spellings[spelling]:
+                del spellings[spelling]
+            if not spellings:
+                del self.spellings[values['category']]
+
+    def _label(self, field, value):
+        if field == 'category' and value in self.spellings:
+            return min(self.spellings[value])
+        return str(value)
+
+    def _slice(self, filters):
+        """Return (total, groups) for the films matching filters ({field: value})"""
+        if not filters:
+            return self.total, self.groups
+        if len(filters) > 1:
+            raise ValueError('Only one filter can be applied at a time')
+        (field, value), = filters.items()
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"filter must be one of: {', '.join(FILTER_FIELDS)}")
+        if field == 'category':
+            # Categories match case-insensitively, as elsewhere in the API
+            value = fold(value)
+        groups = self.filtered[field].get(value, {})
+        return groups.get(None, GroupStats()), groups
+
+    def summary(self, group_by=None, filters=None):
+        """Return the aggregates, optionally for one group field and/or one filter"""
+        total, groups = self._slice(filters)
+        if group_by is not None:
+            if group_by not in GROUP_FIELDS:
+                raise ValueError(f"group_by must be one of: {', '.join(GROUP_FIELDS)}")
+            return {
+                **total.summary(),
+                'group_by': group_by,
+                'groups': {self._label(group_by, value): stats.summary()
+                           for value, stats in sorted(groups.get(group_by, {}).items())
+                           if stats.count}
+            }
+
+        def counts(field):
+            return {self._label(field, value): stats.count
+                    for value, stats in sorted(groups.get(field, {}).items()) if stats.count}
+
+        return {
+            **total.summary(),
+            'by_category': counts('category'),
+            'by_year': counts('year'),
+            'by_decade': {f'{decade}s': count for decade, count in counts('decade').items()},
+            'runtime_by_director': {str(director): stats.summary()
+                                    for director, stats in sorted(groups.get('director', {}).items())
+                                    if stats.count}
+        }
+
+    def state(self):
+        return self.summary()
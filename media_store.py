@@ -0,0 +1,1070 @@
+"""
+Film Cinemax Media Store
+Process-wide in-memory catalogue shared by the API handlers
+"""
+
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from media_index import HashIndex, SortedIndex, record_key, id_sort_key, normalize_id, fold
+from media_record import Film, json_default
+
+
+class CatalogueError(Exception):
+    """Raised when a catalogue file exists but cannot be parsed"""
+
+
+def file_signature(path):
+    """Return (inode, size, mtime) of a file, or None if missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def as_tuple(value):
+    """Turn the lists of a JSON-decoded signature back into tuples"""
+    return tuple(as_tuple(v) for v in value) if isinstance(value, list) else value
+
+
+def read_json_file(path):
+    """Parse a JSON catalogue file; a missing file is an empty catalogue"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    except json.JSONDecodeError as e:
+        # Never mistake a damaged file for an empty catalogue: the next write would erase it
+        raise CatalogueError(f"{path} is not valid JSON: {e}")
+    if not isinstance(data, list):
+        raise CatalogueError(f"{path} does not contain a JSON list")
+    return data
+
+
+@contextmanager
+def atomic_file(path):
+    """Write to a temp file next to path; on success fsync it and rename it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except OSError:
+            os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    try:
+        # Make the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def write_json_file(path, records, before_rename=None):
+    """Write a JSON catalogue file atomically (temp file, fsync, rename over the original)
+
+    before_rename, if given, is called with the new file's signature (which
+    the rename keeps) just before it replaces the original.
+    """
+    with atomic_file(path) as f:
+        json.dump(records, f, indent=4, ensure_ascii=False, default=json_default)
+        if before_rename is not None:
+            f.flush()
+            st = os.fstat(f.fileno())
+            before_rename((st.st_ino, st.st_size, st.st_mtime_ns))
+
+
+def normalize_record(record):
+    """Return record with its id in canonical form (a copy only if it had to change)"""
+    media_id = record.get('id')
+    canonical = normalize_id(media_id)
+    if type(canonical) is type(media_id) and canonical == media_id:
+        return record
+    return dict(record, id=canonical)
+
+
+def database_changes(ops):
+    """Return ops committed straight to a database as the (op, value) pairs a ChangeLog keeps"""
+    return [('put', Film.from_record(normalize_record(value))) if kind == 'put'
+            else ('delete', normalize_id(value)) for kind, value in ops]
+
+
+def apply_op(records, op):
+    """Apply a ('put', record) or ('delete', id) operation to a key -> record dict"""
+    kind, value = op
+    if kind == 'put':
+        records[record_key(value.get('id'))] = value
+    elif kind == 'delete':
+        records.pop(record_key(value), None)
+
+
+class JsonFileStorage:
+    """Stores the catalogue as a single JSON file rewritten on every change"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def signature(self):
+        return file_signature(self.path)
+
+    def load(self):
+        return read_json_file(self.path)
+
+    def read_ops_since(self, signature, until=None):
+        """Return operations written since signature (up to signature until), or None if a full reload is needed"""
+        return None
+
+    def commit(self, ops, snapshot):
+        """Persist a change; the whole catalogue from snapshot() is rewritten"""
+        write_json_file(self.path, snapshot())
+
+    def save(self, records):
+        """Replace the whole catalogue"""
+        write_json_file(self.path, list(records))
+
+
+# Compaction records kept in <path>.journal.compaction
+COMPACTIONS_KEPT = 4
+
+
+class JournalStorage:
+    """Stores the catalogue as a JSON snapshot plus an append-only journal
+
+    Each create/delete appends one compact line to <path>.journal and fsyncs
+    it. Once the journal passes max_bytes or max_records it is rotated to
+    <path>.journal.compacting and a background thread writes a fresh
+    snapshot. Loading replays both journals on top of the snapshot; replay
+    is idempotent, so a crash at any point of a compaction is safe.
+
+    Each compaction is described in <path>.journal.compaction: the snapshot
+    it started from, the rotated journal's inode and final size, and the
+    snapshot it wrote. The rotated journal is kept as <path>.journal.previous
+    until the next compaction. A process tailing the files (even another
+    one, as under media_prefork) uses both to carry on tailing across the
+    compaction instead of re-reading the whole catalogue.
+    """
+
+    def __init__(self, path, max_bytes=8 * 1024 * 1024, max_records=10000):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compacting_path = path + '.journal.compacting'
+        self.compaction_path = path + '.journal.compaction'
+        self.previous_path = path + '.journal.previous'
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self._journal = None
+        self._journal_records = 0
+        self._compactor = None
+        # (inode, offset) of the journal up to which the last load or tail read
+        # complete lines; inode is None if there was no journal
+        self._read_to = None
+        # Snapshot signature the catalogue last read is equivalent to, if not the file's
+        self._read_snapshot = None
+
+    def signature(self):
+        return (file_signature(self.path), file_signature(self.journal_path))
+
+    def _read_journal(self, path, offset=0, until=None):
+        """Return (ops, end offset, inode) for the complete lines of a journal file (before offset until)"""
+        ops = []
+        try:
+            with open(path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                f.seek(offset)
+                data = f.read() if until is None else f.read(max(0, until - offset))
+        except OSError:
+            return ops, offset, None
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn or corrupt line from a crashed writer
+                continue
+            if entry.get('op') == 'put':
+                ops.append(('put', entry['record']))
+            elif entry.get('op') == 'delete':
+                ops.append(('delete', entry['id']))
+        return ops, offset + end, inode
+
+    def load(self):
+        self.wait_for_compaction()
+        self._read_snapshot = file_signature(self.path)
+        records = {}
+        for record in read_json_file(self.path):
+            records[record_key(record.get('id'))] = record
+        self._read_to = (None, 0)
+        for path in (self.compacting_path, self.journal_path):
+            ops, end, inode = self._read_journal(path)
+            for op in ops:
+                apply_op(records, op)
+            if inode is not None:
+                # Tails go on from the newest journal read (the rotated one, if no other exists yet)
+                self._read_to = (inode, end)
+        self._journal_records = len(ops)
+        return list(records.values())
+
+    def read_ops_since(self, signature, until=None):
+        """Tail the journal from signature, across our own compactions, up to signature until if given
+
+        Returns None when a full reload is needed.
+        """
+        if signature is None:
+            return None
+        snapshot, journal = signature
+        current_snapshot, current_journal = self.signature()
+        current_inode = current_journal[0] if current_journal is not None else None
+        # Snapshots holding exactly the catalogue we have (older ones may not be replaced yet)
+        equivalent = {snapshot}
+        ops = []
+        compactions = None
+        # Journal up to which the catalogue is read, once the rotated ones are finished
+        read_to = None
+        # Whether our journal may be the one after the rotated one
+        later = True
+        while current_snapshot not in equivalent or (journal is not None and journal[0] != current_inode):
+            if compactions is None:
+                compactions = self._compactions()
+            compaction = next((c for c in compactions if c['previous'] == snapshot), None)
+            if compaction is None or compaction['journal'] is None:
+                return None
+            rotated, final = compaction['journal']
+            if journal is None or journal[0] == rotated:
+                # Finish the rotated journal, from wherever the compaction keeps it
+                start = journal[1] if journal is not None else 0
+                if start < final:
+                    for path in (self.compacting_path, self.previous_path):
+                        rest, end, inode = self._read_journal(path, start, final)
+                        if inode == rotated:
+                            break
+                    if inode != rotated or end != final:
+                        return None
+                    ops.extend(rest)
+                journal = None
+                read_to = (rotated, final)
+            elif later:
+                # Read after the rotation, so the rotated journal was read then
+                later = False
+            else:
+                return None
+            if compaction['snapshot'] is None:
+                # Still compacting: the old snapshot plus the next journal is the catalogue
+                if current_snapshot not in equivalent:
+                    return None
+                break
+            # The new snapshot holds the rotated journal
+            snapshot = compaction['snapshot']
+            equivalent.add(snapshot)
+            read_to = None
+        self._read_snapshot = snapshot
+        if current_journal is None:
+            self._read_to = read_to or (None, 0)
+            return ops
+        start = journal[1] if journal is not None else 0
+        if start > current_journal[1]:
+            return None
+        end = None
+        if until is not None and until[1] is not None and until[1][0] == current_inode:
+            end = until[1][1]
+        more, end, inode = self._read_journal(self.journal_path, start, end)
+        if inode != current_inode:
+            # Rotated between the stat and the read
+            return None
+        self._journal_records += len(more)
+        self._read_to = (inode, end)
+        return ops + more
+
+    def _compactions(self):
+        """Return the most recent compaction records, oldest first"""
+        try:
+            with open(self.compaction_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [{field: as_tuple(record.get(field)) for field in ('previous', 'journal', 'snapshot')}
+                for record in records]
+
+    def _write_compaction(self, record):
+        """Add a compaction record, or complete the latest one"""
+        records = self._compactions()
+        if records and records[-1]['previous'] == record['previous']:
+            records[-1] = record
+        else:
+            records.append(record)
+        with atomic_file(self.compaction_path) as f:
+            json.dump(records[-COMPACTIONS_KEPT:], f)
+
+    def settled_signature(self, signature):
+        """Return signature as of where the last load or tail stopped reading
+
+        A line still being appended is left for the next tail, lines
+        appended after signature() was taken are not read twice, and a
+        snapshot rewritten by a compaction we have read past is taken as ours.
+        """
+        snapshot, journal = signature
+        if self._read_snapshot is not None:
+            snapshot = self._read_snapshot
+        if self._read_to is None:
+            return (snapshot, journal)
+        inode, offset = self._read_to
+        if inode is None:
+            return (snapshot, None)
+        if journal is not None and journal[:2] == (inode, offset):
+            return (snapshot, journal)
+        return (snapshot, (inode, offset, None))
+
+    def _open_journal(self):
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'ab')
+        return self._journal
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def commit(self, ops, snapshot):
+        """Append operations to the journal; O(size of the operations)"""
+        lines = []
+        for kind, value in ops:
+            if kind == 'put':
+                entry = {'op': 'put', 'record': value}
+            else:
+                entry = {'op': 'delete', 'id': value}
+            lines.append(json.dumps(entry, separators=(',', ':'), ensure_ascii=False, default=json_default))
+        journal = self._open_journal()
+        journal.write(('\n'.join(lines) + '\n').encode('utf-8'))
+        journal.flush()
+        os.fsync(journal.fileno())
+        self._journal_records += len(ops)
+        self._read_to = (os.fstat(journal.fileno()).st_ino, journal.tell())
+        self._read_snapshot = None
+        if self._needs_compaction():
+            self._start_compaction(snapshot())
+
+    def _needs_compaction(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return False
+        if self._journal_records >= self.max_records:
+            return True
+        return self._journal is not None and self._journal.tell() >= self.max_bytes
+
+    def _start_compaction(self, records):
+        """Rotate the journal and write a new snapshot in the background"""
+        self._close_journal()
+        record = {'previous': file_signature(self.path), 'journal': None, 'snapshot': None}
+        if os.path.exists(self.compacting_path):
+            # Leftover from an interrupted compaction: fold it in, not over it
+            # (readers cannot tail across that, so the record names no journal)
+            with open(self.journal_path, 'rb') as src, open(self.compacting_path, 'ab') as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            self._write_compaction(record)
+            os.remove(self.journal_path)
+        else:
+            rotated = file_signature(self.journal_path)
+            record['journal'] = rotated[:2] if rotated is not None else None
+            self._write_compaction(record)
+            os.replace(self.journal_path, self.compacting_path)
+        self._journal_records = 0
+        self._compactor = threading.Thread(
+            target=self._write_snapshot, args=(records, record), daemon=True)
+        self._compactor.start()
+
+    def _write_snapshot(self, records, record):
+        try:
+            # Name the new snapshot before it appears, so no tail ever finds it unexplained
+            write_json_file(self.path, records,
+                            lambda snapshot: self._write_compaction(dict(record, snapshot=snapshot)))
+            # Keep the rotated journal for tails that have not finished it yet
+            os.replace(self.compacting_path, self.previous_path)
+        except Exception as e:
+            print(f"Error compacting media journal: {e}")
+
+    def wait_for_compaction(self):
+        """Block until a running background compaction has finished"""
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def save(self, records):
+        """Replace the whole catalogue with a new snapshot and empty journal"""
+        self.wait_for_compaction()
+        self._close_journal()
+        write_json_file(self.path, list(records))
+        for path in (self.compacting_path, self.journal_path, self.compaction_path, self.previous_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._journal_records = 0
+        self._read_to = self._read_snapshot = None
+
+
+STORAGE_TYPES = {
+    'json': JsonFileStorage,
+    'journal': JournalStorage
+}
+
+
+def create_storage(path, mode='json'):
+    """Create the storage backend for a catalogue file"""
+    if mode == 'sqlite':
+        # films.json stays the import/export format next to films.db
+        from media_sqlite import SqliteStorage
+        return SqliteStorage(os.path.splitext(path)[0] + '.db', json_path=path)
+    try:
+        return STORAGE_TYPES[mode](path)
+    except KeyError:
+        raise ValueError(f"Unknown storage mode: {mode}")
+
+
+class IdAllocator:
+    """Hands out integer ids from a sequence persisted next to the catalogue
+
+    Ids are reserved from disk a block at a time, so most allocations are a
+    counter increment with no I/O. After a crash the unused rest of the last
+    block is skipped, never handed out twice.
+    """
+
+    def __init__(self, path, block_size=100):
+        self.path = path
+        self.block_size = block_size
+        self._next = None
+        self._reserved = 0
+
+    def _load(self):
+        if self._next is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._next = int(f.read().strip())
+            except (OSError, ValueError):
+                self._next = 1
+            self._reserved = self._next
+
+    def peek(self):
+        """Return the id the next allocation will hand out"""
+        self._load()
+        return self._next
+
+    def advance_past(self, largest):
+        """Make sure no id up to largest is handed out (e.g. after outside edits)"""
+        self._load()
+        if largest >= self._next:
+            self._next = largest + 1
+
+    def allocate(self, count=1):
+        """Reserve count consecutive ids and return the first"""
+        self._load()
+        first = self._next
+        self._next += count
+        if self._next > self._reserved:
+            # Bulk inserts reserve their whole range plus a fresh block in one write
+            self._reserved = self._next + self.block_size
+            with atomic_file(self.path) as f:
+                f.write(str(self._reserved))
+        return first
+
+
+class PendingCommit:
+    """Operations waiting in a CommitQueue, with the means to undo and acknowledge them"""
+
+    def __init__(self, ops, undo):
+        self.ops = ops
+        self.undo = undo
+        self.done = threading.Event()
+        self.error = None
+        # The version (and its time) the operations produced in memory, if already applied
+        self.version = None
+        self.modified_at = None
+
+
+class CommitQueue:
+    """Single writer thread that persists queued changes in group commits
+
+    Whatever is queued within `window` seconds of the first pending change
+    (up to max_batch changes) is handed to persist() as one batch, so N
+    concurrent writers cost one storage commit rather than N.
+    """
+
+    def __init__(self, persist, window=0.002, max_batch=1000):
+        self.persist = persist
+        self.window = window
+        self.max_batch = max_batch
+        self.commits = 0
+        self.changes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def put(self, ops, undo):
+        """Queue operations for the writer and return their PendingCommit"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='media-writer', daemon=True)
+                self._thread.start()
+        entry = PendingCommit(ops, undo)
+        self._queue.put(entry)
+        return entry
+
+    def wait(self, entry):
+        """Block until the entry's batch is durable; re-raise its commit error"""
+        entry.done.wait()
+        if entry.error is not None:
+            raise entry.error
+
+    def join(self):
+        """Block until every queued change has been committed"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.persist(batch)
+            except Exception as e:
+                print(f"Error committing media changes: {e}")
+                for entry in batch:
+                    entry.error = e
+            self.commits += 1
+            self.changes += len(batch)
+            for entry in batch:
+                entry.done.set()
+                self._queue.task_done()
+
+
+class MediaRepository:
+    """In-memory copy of a catalogue, reloaded only when its storage changes
+
+    With group_commit set, writes are applied in memory at once and then made
+    durable by a single writer thread (see CommitQueue); each writer call
+    returns only after its batch has been committed.
+    """
+
+    def __init__(self, storage, group_commit=False):
+        if isinstance(storage, str):
+            storage = JsonFileStorage(storage)
+        self.storage = storage
+        self.path = storage.path
+        self._lock = threading.RLock()
+        self._records = None
+        self._list = None
+        self._signature = None
+        self.commit_queue = CommitQueue(self._persist) if group_commit else None
+        self._pending = 0
+        self.id_allocator = IdAllocator(self.path + '.seq')
+        self.hash_index = HashIndex()
+        self.id_index = SortedIndex(lambda record: id_sort_key(record.get('id')))
+        # Each category's films in id order, so a category page is a keyset scan too
+        self.category_index = SortedIndex(
+            lambda record: (fold(record.get('category')), id_sort_key(record.get('id'))))
+        self._indexes = [self.hash_index, self.id_index, self.category_index]
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        # Bumped on every change to the catalogue, whether written here or elsewhere
+        self.version = 0
+        self.modified_at = time.time()
+        # Optional cross-process signal (current()/published()/notify(), see
+        # media_prefork.SharedCounter) announcing committed writes; when set,
+        # storage is only checked after it moves, and the writer's version is used
+        self.change_signal = None
+        self._signal_seen = None
+        # Optional media_changes.ChangeLog of every change, see keep_change_log()
+        self.change_log = None
+
+    def _bump_version(self, changes=None, version=None, modified_at=None):
+        """Start a new version (or move to the given one); changes lists its (op, value) pairs when known"""
+        self.version = version if version is not None and version > self.version else self.version + 1
+        self.modified_at = modified_at if modified_at is not None else time.time()
+        if self.change_log is not None:
+            if changes is None:
+                # What changed is unknown, so clients older than this must resync
+                self.change_log.reset(self.version)
+            else:
+                self.change_log.record(self.version, changes)
+
+    def version_info(self):
+        """Return (version, modified_at) after picking up any outside change"""
+        with self._lock:
+            if self._records is None and getattr(self.storage, 'queryable', False):
+                # Lookups go straight to the database, so only watch its files;
+                # while our own commits are in flight, _persist moves the version
+                signal = self.change_signal
+                if signal is not None:
+                    if signal.current() != self._signal_seen and not self._pending:
+                        self._signal_seen, version, modified_at, _ = signal.published()
+                        if version > self.version:
+                            self._bump_version(None, version, modified_at)
+                    return self.version, self.modified_at
+                signature = self.storage.signature()
+                if signature != self._signature and not self._pending:
+                    self._bump_version()
+                    self._signature = signature
+            else:
+                self._ensure_loaded()
+            return self.version, self.modified_at
+
+    def keep_change_log(self, log):
+        """Record every change from the current version on in log; returns the log"""
+        with self._lock:
+            log.reset(self.version)
+            self.change_log = log
+            return log
+
+    def changes_since(self, version):
+        """Return (current version, [(op, value)] changes after version)
+
+        The changes are None when the change log cannot cover them (none is
+        kept, the version is too old, or it is from before a full reload).
+        """
+        with self._lock:
+            current, _ = self.version_info()
+            if self.change_log is None:
+                return current, None
+            return self.change_log.since(version)
+
+    def attach(self, index):
+        """Register a MediaIndex to be kept in step with the catalogue"""
+        with self._lock:
+            self._indexes.append(index)
+            if self._records is not None:
+                index.rebuild(self._records.values())
+            return index
+
+    def _load_all(self, records, version=None, modified_at=None):
+        """Replace the in-memory catalogue and rebuild every index"""
+        self._records = {}
+        for record in records:
+            record = Film.from_record(normalize_record(record))
+            self._records[record_key(record.get('id'))] = record
+        for index in self._indexes:
+            index.rebuild(self._records.values())
+        self._list = None
+        self._bump_version(None, version, modified_at)
+
+    def _apply(self, ops, version=None, modified_at=None):
+        """Apply operations to memory and indexes; return the operations that undo them
+
+        If anything raises (e.g. an index rejecting a record), memory and
+        indexes are put back as they were before ops and the error re-raised.
+        """
+        undo = []
+        changes = []
+        # Index calls made so far, as (reversing call, record)
+        done = []
+        index = None
+        try:
+            for kind, value in ops:
+                if kind == 'put':
+                    value = Film.from_record(normalize_record(value))
+                key = record_key(value.get('id') if kind == 'put' else value)
+                previous = self._records.get(key)
+                if previous is not None:
+                    undo.append(('put', previous))
+                    for index in self._indexes:
+                        index.remove(previous)
+                        done.append((index.add, previous))
+                    index = None
+                else:
+                    undo.append(('delete', key))
+                if kind == 'put':
+                    self._records[key] = value
+                    for index in self._indexes:
+                        index.add(value)
+                        done.append((index.remove, value))
+                    index = None
+                    changes.append(('put', value))
+                elif previous is not None:
+                    del self._records[key]
+                    changes.append(('delete', key))
+        except Exception:
+            for op in reversed(undo):
+                apply_op(self._records, op)
+            for reverse, record in reversed(done):
+                reverse(record)
+            if index is not None:
+                # The index that raised may be left half updated
+                index.rebuild(self._records.values())
+            self._list = None
+            raise
+        self._list = None
+        if ops:
+            self._bump_version(changes, version, modified_at)
+        undo.reverse()
+        return undo
+
+    def _ensure_loaded(self):
+        """Reload from storage if it changed outside this repository"""
+        if self._records is not None and self._pending:
+            # Queued writes are newer than storage; it is ours until they land
+            self.hits += 1
+            return
+        signal = self.change_signal
+        if signal is None:
+            self._refresh()
+            return
+        if self._records is not None and signal.current() == self._signal_seen:
+            self.hits += 1
+            return
+        published = signal.published()
+        if published[3] is None:
+            # Nothing announced yet: check storage as usual, and again next time
+            self._refresh()
+            return
+        # Read storage up to what was announced (so a write landing meanwhile is caught
+        # next time) and take the writer's version for it, so every process agrees
+        self._refresh(published)
+        self._signal_seen = published[0]
+
+    def watch(self, signal):
+        """Use signal to learn of (and announce) committed writes, starting from the current state"""
+        with self._lock:
+            self._ensure_loaded()
+            self.change_signal = signal
+            self._publish()
+            self._signal_seen = signal.current()
+
+    def _publish(self, version=None, modified_at=None, signature=None):
+        """Tell sibling processes that a write has been committed, and what state it left"""
+        if self.change_signal is not None:
+            self.change_signal.notify(
+                self.version if version is None else version,
+                self.modified_at if modified_at is None else modified_at,
+                self._signature if signature is None else signature)
+
+    def _settled_signature(self, signature=None):
+        """Return the storage signature as of what was last read or written (see JournalStorage)"""
+        if signature is None:
+            signature = self.storage.signature()
+        settle = getattr(self.storage, 'settled_signature', None)
+        return settle(signature) if settle is not None else signature
+
+    def _refresh(self, published=None):
+        """Pick up changes in storage, incrementally where the storage allows
+
+        published is a change signal's (sequence, version, modified_at,
+        signature): storage is then read no further than that signature and
+        the catalogue takes that version.
+        """
+        version = modified_at = until = None
+        if published is not None:
+            _, version, modified_at, until = published
+        signature = self.storage.signature()
+        if self._records is not None and signature == self._signature:
+            self.hits += 1
+            self._relabel(version, modified_at)
+            return
+        ops = None
+        if self._records is None:
+            self.misses += 1
+        else:
+            ops = self.storage.read_ops_since(self._signature, until)
+            if ops:
+                self.reloads += 1
+            elif ops is not None:
+                # The files changed but the catalogue did not
+                self.hits += 1
+            else:
+                self.reloads += 1
+        if ops is None:
+            records = self.storage.load()
+            self._load_all(records, version, modified_at)
+            if any(normalize_record(record) is not record for record in records):
+                # One-time migration: store every id in its canonical (integer) form
+                self.storage.save(list(self._records.values()))
+                signature = self.storage.signature()
+        else:
+            self._apply(ops, version, modified_at)
+            self._relabel(version, modified_at)
+        self._signature = self._settled_signature(signature)
+
+    def _relabel(self, version, modified_at):
+        """Move to a version announced by the writer whose changes are already in memory"""
+        if version is not None and version > self.version:
+            self._bump_version([], version, modified_at)
+
+    def records(self):
+        """Return the current catalogue; the list must be treated as read-only"""
+        with self._lock:
+            self._ensure_loaded()
+            if self._list is None:
+                self._list = list(self._records.values())
+            return self._list
+
+    @contextmanager
+    def reading(self):
+        """Refresh the catalogue and hold it steady while attached indexes are read"""
+        with self._lock:
+            self._ensure_loaded()
+            yield self
+
+    def get(self, media_id):
+        """Return the record with this id (in any form, e.g. 5 or '5'), or None"""
+        if getattr(self.storage, 'queryable', False):
+            return self.storage.find_by_id(normalize_id(media_id))
+        with self._lock:
+            self._ensure_loaded()
+            return self.hash_index.get(media_id)
+
+    def by_category(self, category):
+        """Return records in a category (case-insensitive)"""
+        if getattr(self.storage, 'queryable', False):
+            return self.storage.find_by_category(category)
+        with self._lock:
+            self._ensure_loaded()
+            return self.hash_index.find_category(category)
+
+    def by_name(self, name):
+        """Return records with exactly this name (case-insensitive)"""
+        if getattr(self.storage, 'queryable', False):
+            return self.storage.find_by_name(name)
+        with self._lock:
+            self._ensure_loaded()
+            return self.hash_index.find_name(name)
+
+    def page(self, limit, cursor=None, category=None):
+        """Return (records, next_cursor) for up to limit records with ids after cursor"""
+        if getattr(self.storage, 'queryable', False):
+            return self.storage.find_page(limit, cursor, category)
+        with self._lock:
+            self._ensure_loaded()
+            if category is None:
+                start = 0
+                if cursor is not None:
+                    start = self.id_index.position(id_sort_key(cursor), after=True)
+                keys = self.id_index.keys[start:start + limit + 1]
+                records = [self.hash_index.by_id[key] for key in keys]
+            else:
+                category = fold(category)
+                index = self.category_index
+                if cursor is None:
+                    start = index.position((category,))
+                else:
+                    start = index.position((category, id_sort_key(cursor)), after=True)
+                end = min(start + limit + 1, index.position((category, (2,))))
+                records = [self.hash_index.by_id[key] for key in index.keys[start:end]]
+        next_cursor = str(records[limit - 1].get('id')) if len(records) > limit else None
+        return records[:limit], next_cursor
+
+    def check_indexes(self):
+        """Verify every index against the raw catalogue from storage; return a list of problems"""
+        with self._lock:
+            self._ensure_loaded()
+            records = self.storage.load()
+            problems = []
+            if len(records) != len(self._records):
+                problems.append("In-memory catalogue size differs from storage")
+            for index in self._indexes:
+                problems.extend(index.check(records))
+            return problems
+
+    def _snapshot(self):
+        """Return the catalogue as a new list, for storages that write it whole"""
+        with self._lock:
+            return list(self._records.values()) if self._records is not None else []
+
+    def _commit(self, ops):
+        """Apply operations in memory and persist them, rolling back on failure"""
+        if self._records is None and getattr(self.storage, 'queryable', False):
+            # Nothing cached to keep in step; the database applies the change
+            self.storage.commit(ops, self._snapshot)
+            self._bump_version(database_changes(ops))
+            self._signature = self._settled_signature()
+            self._publish()
+            return True
+        self._ensure_loaded()
+        undo = self._apply(ops)
+        try:
+            self.storage.commit(ops, self._snapshot)
+        except Exception:
+            self._apply(undo)
+            raise
+        self._signature = self._settled_signature()
+        self._publish()
+        return True
+
+    def _write(self, make_ops):
+        """Apply the (ops, result) returned by make_ops() under the lock and make them durable"""
+        with self._lock:
+            ops, result = make_ops()
+            if not ops:
+                return result
+            if self.commit_queue is None:
+                self._commit(ops)
+                return result
+            if self._records is None and getattr(self.storage, 'queryable', False):
+                # Reads go to the database, so the version moves once the commit lands (see _persist)
+                undo = None
+            else:
+                self._ensure_loaded()
+                undo = self._apply(ops)
+            self._pending += 1
+            entry = self.commit_queue.put(ops, undo)
+            if undo is not None:
+                entry.version, entry.modified_at = self.version, self.modified_at
+        self.commit_queue.wait(entry)
+        return result
+
+    def _persist(self, entries):
+        """Commit a batch of queued changes to storage at once (writer thread)"""
+        ops = [op for entry in entries for op in entry.ops]
+        try:
+            self.storage.commit(ops, self._snapshot)
+        except Exception:
+            with self._lock:
+                for entry in reversed(entries):
+                    if entry.undo is not None and self._records is not None:
+                        self._apply(entry.undo)
+                self._finish_pending(len(entries))
+            raise
+        with self._lock:
+            database_ops = [op for entry in entries if entry.undo is None for op in entry.ops]
+            if database_ops:
+                self._bump_version(database_changes(database_ops))
+                version, modified_at = self.version, self.modified_at
+            else:
+                # Later writes may already be applied in memory; announce the state this batch left
+                version, modified_at = entries[-1].version, entries[-1].modified_at
+            signature = self._settled_signature()
+            self._finish_pending(len(entries))
+            self._publish(version, modified_at, signature)
+
+    def _finish_pending(self, count):
+        self._pending -= count
+        if not self._pending:
+            self._signature = self._settled_signature()
+
+    def _sync_allocator(self):
+        """Keep the id sequence ahead of every id already in the catalogue (O(log n))"""
+        if self._records is None and getattr(self.storage, 'queryable', False):
+            largest = self.storage.max_id()
+        else:
+            self._ensure_loaded()
+            # Numeric ids sort first; the last of them is the largest
+            position = self.id_index.position((1, ''))
+            largest = self.id_index.values[position - 1][1] if position else 0
+        self.id_allocator.advance_past(largest)
+
+    def next_id(self):
+        """Return the id the next create() will use"""
+        with self._lock:
+            self._sync_allocator()
+            return self.id_allocator.peek()
+
+    def replace_all(self, records):
+        """Replace the whole catalogue and persist it"""
+        if self.commit_queue is not None:
+            self.commit_queue.join()
+        with self._lock:
+            records = [Film.from_record(normalize_record(record)) for record in records]
+            self.storage.save(records)
+            self._load_all(records)
+            self._signature = self._settled_signature()
+            self._publish()
+            return True
+
+    def add(self, record):
+        """Add a record and persist it"""
+        return self._write(lambda: ([('put', record)], True))
+
+    def create(self, build):
+        """Add build(new_id) under the next free id; returns the new record"""
+        return self.create_many([build])[0]
+
+    def create_many(self, builders):
+        """Add build(new_id) for each builder, with consecutive ids, in one commit"""
+        return self.change_many(builders)[0]
+
+    def change_many(self, builders=(), delete_ids=()):
+        """Add build(new_id) for each builder and remove each of delete_ids, all in one commit
+
+        Returns (created records, removed records), where a removed entry is
+        None if that id was not in the catalogue (or came earlier in delete_ids).
+        """
+        def make_ops():
+            removed, seen = [], set()
+            for media_id in delete_ids:
+                key = record_key(media_id)
+                removed.append(None if key in seen else self.get(key))
+                seen.add(key)
+            records = []
+            if builders:
+                self._sync_allocator()
+                # One reservation covers the whole block of ids
+                first_id = self.id_allocator.allocate(len(builders))
+                records = [build(first_id + i) for i, build in enumerate(builders)]
+            ops = [('put', record) for record in records]
+            ops += [('delete', record['id']) for record in removed if record is not None]
+            return ops, (records, removed)
+        return self._write(make_ops)
+
+    def delete(self, media_id):
+        """Remove the record with this id"""
+        return self._write(lambda: ([('delete', media_id)], True))
+
+    def invalidate(self):
+        """Drop the cached catalogue so the next read reloads it"""
+        with self._lock:
+            self._records = None
+            self._list = None
+            self._signature = None
+
+    def cache_info(self):
+        """Return cache counters for monitoring"""
+        with self._lock:
+            return {
+                'path': self.path,
+                'storage': type(self.storage).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'reloads': self.reloads,
+                'version': self.version,
+                'pending_writes': self._pending,
+                'group_commits': self.commit_queue.commits if self.commit_queue else None,
+                'loaded': self._records is not None,
+                'count': len(self._records) if self._records is not None else 0
+            }
+
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(path, mode='json'):
+    """Return the process-wide repository for a catalogue file"""
+    key = os.path.abspath(path)
+    with _repositories_lock:
+        repository = _repositories.get(key)
+        if repository is None:
+            repository = MediaRepository(create_storage(path, mode), group_commit=True)
+            _repositories[key] = repository
+        return repository
@@ -0,0 +1,106 @@
+"""
+Film Cinemax Media Suggest
+Sorted prefix index over film names and directors, for search-as-you-type
+"""
+
+from bisect import bisect_left, insort
+from media_index import MediaIndex, record_key, fold
+from media_search import director_of, WORD_RE
+
+SUGGEST_FIELDS = ('name', 'director')
+
+
+def field_value(record, field):
+    return director_of(record) if field == 'director' else record.get('name') or ''
+
+
+def word_suffixes(text):
+    """Return text from the start of each of its words after the first"""
+    return {text[match.start():] for match in WORD_RE.finditer(text) if match.start() > 0}
+
+
+class PrefixIndex(MediaIndex):
+    """Distinct casefolded names and directors, sorted so a prefix is one bisect away
+
+    starts holds (text, field) for every distinct value, and words holds
+    (suffix, field, text) for each later word of it, so 'godf' also finds
+    'The Godfather'. suggest() bisects to the prefix and reads forward, which
+    costs O(log n + k) however large the catalogue is.
+    """
+
+    def __init__(self):
+        self.entries = {}  # (field, text) -> [display value, set of record keys]
+        self.starts = []
+        self.words = []
+
+    def rebuild(self, records):
+        self.entries = {}
+        for record in records:
+            key = record_key(record.get('id'))
+            for field in SUGGEST_FIELDS:
+                value = field_value(record, field)
+                text = fold(value).strip()
+                if text:
+                    self.entries.setdefault((field, text), [str(value).strip(), set()])[1].add(key)
+        self.starts = sorted((text, field) for field, text in self.entries)
+        self.words = sorted((suffix, field, text) for field, text in self.entries
+                            for suffix in word_suffixes(text))
+
+    def add(self, record):
+        key = record_key(record.get('id'))
+        for field in SUGGEST_FIELDS:
+            value = field_value(record, field)
+            text = fold(value).strip()
+            if not text:
+                continue
+            entry = self.entries.get((field, text))
+            if entry is None:
+                entry = self.entries[(field, text)] = [str(value).strip(), set()]
+                insort(self.starts, (text, field))
+                for suffix in word_suffixes(text):
+                    insort(self.words, (suffix, field, text))
+            entry[1].add(key)
+
+    def remove(self, record):
+        key = record_key(record.get('id'))
+        for field in SUGGEST_FIELDS:
+            text = fold(field_value(record, field)).strip()
+            entry = self.entries.get((field, text))
+            if entry is None:
+                continue
+            entry[1].discard(key)
+            if entry[1]:
+                continue
+            del self.entries[(field, text)]
+            del self.starts[bisect_left(self.starts, (text, field))]
+            for suffix in word_suffixes(text):
+                del self.words[bisect_left(self.words, (suffix, field, text))]
+
+    def state(self):
+        return ({entry: keys for entry, (_, keys) in self.entries.items()}, self.starts, self.words)
+
+    def suggest(self, prefix, limit=10):
+        """Return up to limit {'text', 'field', 'count'} values starting with prefix
+
+        Values that start with the prefix come first, then those with a later
+        word that does, each group in alphabetical order.
+        """
+        prefix = fold(prefix).strip()
+        if not prefix or limit < 1:
+            return []
+        found = []
+        seen = set()
+        for entries, text_at in ((self.starts, 0), (self.words, 2)):
+            position = bisect_left(entries, (prefix,))
+            while len(found) < limit and position < len(entries):
+                entry = entries[position]
+                if not entry[0].startswith(prefix):
+                    break
+                position += 1
+                field, text = entry[1], entry[text_at]
+                if (field, text) in seen:
+                    continue
+                seen.add((field, text))
+                display, keys = self.entries[(field, text)]
+                found.append({'text': display, 'field': field, 'count': len(keys)})
+        return found
@@ -5,16 +5,48 @@ Tests Flask REST API endpoints for Film Cinemax
 """
 
 import unittest
+import gzip
 import json
+import zlib
+import asyncio
+import threading
+import os
+import shutil
+import tempfile
+import requests
+import backend
 from backend import app
+from media_async import AsyncServer, MAX_BODY_BYTES
+from media_prefork import WriteForwarder
+from media_store import create_storage, IdAllocator
+
+def use_catalogue_copy(test):
+    """Point the backend's repository at a temporary copy of films.json until test ends"""
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, os.path.basename(backend.DATA_FILE))
+    shutil.copy(backend.DATA_FILE, path)
+    repository = backend.repository
+
+    def point_at(storage, path, id_allocator):
+        if repository.commit_queue is not None:
+            repository.commit_queue.join()
+        with repository._lock:
+            repository.storage, repository.path, repository.id_allocator = storage, path, id_allocator
+            repository.invalidate()
+
+    original = (repository.storage, repository.path, repository.id_allocator)
+    point_at(create_storage(path, backend.STORAGE_MODE), path, IdAllocator(path + '.seq'))
+    test.addCleanup(shutil.rmtree, tmpdir)
+    test.addCleanup(point_at, *original)
 
 class TestFilmsBackendAPI(unittest.TestCase):
     """Test Film Cinemax backend API endpoints"""
     
     def setUp(self):
-        """Set up test client"""
+        """Set up test client on a temporary copy of the catalogue"""
         app.config['TESTING'] = True
         self.client = app.test_client()
+        use_catalogue_copy(self)
     
     def test_get_all_films(self):
         """Test GET /api/films - Retrieve all films"""
@@ -31,6 +63,226 @@ class TestFilmsBackendAPI(unittest.TestCase):
         data = response.json
         self.assertIn('data', data)
     
+    def test_paginate_films(self):
+        """Test GET /api/media?limit=&cursor= - Keyset pagination"""
+        first = self.client.get('/api/media?limit=2').json
+        self.assertEqual(len(first['data']), 2)
+        self.assertIsNotNone(first['next_cursor'])
+        second = self.client.get(f"/api/media?limit=2&cursor={first['next_cursor']}").json
+        first_ids = {str(m['id']) for m in first['data']}
+        self.assertFalse(first_ids & {str(m['id']) for m in second['data']})
+        response = self.client.get('/api/media?limit=zero')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_stream_films(self):
+        """Test GET /api/media?stream=1 - Streamed listing matches the buffered one"""
+        response = self.client.get('/api/media?stream=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), self.client.get('/api/media').json)
+    
+    def test_conditional_get(self):
+        """Test If-None-Match - Unchanged catalogue answers 304"""
+        response = self.client.get('/api/media/category/Drama')
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        cached = self.client.get('/api/media/category/Drama', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b'')
+        other = self.client.get('/api/media/category/Crime', headers={'If-None-Match': etag})
+        self.assertEqual(other.status_code, 200)
+    
+    def test_bulk_import_and_export(self):
+        """Test POST /api/media/bulk and GET /api/media/export - NDJSON round trip"""
+        body = '\n'.join([
+            json.dumps({'name': 'Bulk Film One', 'category': 'Drama'}),
+            'not json',
+            json.dumps({'name': 'Bulk Film Two'}),
+            json.dumps({'name': 'Bulk Film Three', 'category': 'Action'})
+        ])
+        response = self.client.post('/api/media/bulk?batch_size=1', data=body,
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        data = response.json
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([e['line'] for e in data['errors']], [2, 3])
+        for batch_size in ('abc', '0'):
+            response = self.client.post(f'/api/media/bulk?batch_size={batch_size}', data=body,
+                                        content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/media/bulk', data=b'not gzip at all',
+                                    content_type='application/x-ndjson', headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+        
+        export = self.client.get('/api/media/export')
+        lines = [json.loads(line) for line in export.data.decode('utf-8').splitlines()]
+        self.assertEqual(len(lines), self.client.get('/api/media').json['count'])
+        for film in lines:
+            if film['name'].startswith('Bulk Film'):
+                self.client.delete(f"/api/media/{film['id']}")
+    
+    def test_filter_and_sort_films(self):
+        """Test GET /api/media?year_min=&runtime_min=&sort= - Server-side filtering and sorting"""
+        data = self.client.get('/api/media?category=Sci-Fi&runtime_min=150&sort=year:desc').json
+        years = [m['year'] for m in data['data']]
+        self.assertEqual(years, sorted(years, reverse=True))
+        for film in data['data']:
+            self.assertEqual(film['category'], 'Sci-Fi')
+            self.assertGreaterEqual(film['runtime'], 150)
+        
+        pages = []
+        url = '/api/media?year_min=1990&year_max=2010&sort=runtime:desc&limit=3'
+        while url:
+            page = self.client.get(url).json
+            pages.extend(page['data'])
+            url = f"/api/media?year_min=1990&year_max=2010&sort=runtime:desc&limit=3&cursor={page['next_cursor']}" if page['next_cursor'] else None
+        expected = self.client.get('/api/media?year_min=1990&year_max=2010&sort=runtime:desc').json['data']
+        self.assertEqual(pages, expected)
+        self.assertTrue(all(1990 <= m['year'] <= 2010 for m in expected))
+        self.assertEqual(self.client.get('/api/media?sort=rating').status_code, 400)
+    
+    def test_media_stats(self):
+        """Test GET /api/media/stats - Aggregates follow creates and deletes"""
+        before = self.client.get('/api/media/stats').json['data']
+        created = self.client.post('/api/media', json={
+            'name': 'Stats Film', 'director': 'Stats Director', 'year': 1955,
+            'category': 'Drama', 'runtime': 100
+        }).json['data']
+        after = self.client.get('/api/media/stats').json['data']
+        self.assertEqual(after['count'], before['count'] + 1)
+        self.assertEqual(after['by_category']['Drama'], before['by_category'].get('Drama', 0) + 1)
+        self.assertEqual(after['by_decade']['1950s'], before['by_decade'].get('1950s', 0) + 1)
+        self.assertEqual(after['runtime_by_director']['Stats Director']['median_runtime'], 100)
+        
+        grouped = self.client.get('/api/media/stats?group_by=director&decade=1950').json['data']
+        self.assertEqual(grouped['groups']['Stats Director']['count'], 1)
+        self.client.delete(f"/api/media/{created['id']}")
+        self.assertEqual(self.client.get('/api/media/stats').json['data'], before)
+    
+    def test_media_analytics(self):
+        """Test GET /api/media/analytics - Vectorized queries follow creates and deletes"""
+        created = self.client.post('/api/media', json={
+            'name': 'Analytics Film', 'director': 'Analytics Director', 'year': 1901,
+            'category': 'Analytics', 'runtime': 999
+        }).json['data']
+        top = self.client.get('/api/media/analytics/top?field=runtime&n=1').json['data']
+        self.assertEqual(top, [{'id': created['id'], 'runtime': 999}])
+        histogram = self.client.get('/api/media/analytics/histogram?field=year&year_max=1909').json['data']
+        self.assertEqual(histogram, [{'start': 1900, 'end': 1910, 'count': 1}])
+        percentiles = self.client.get(
+            '/api/media/analytics/percentiles?p=50&group_by=director&category=analytics').json['data']
+        self.assertEqual(percentiles, {'Analytics Director': {'50.0': 999.0}})
+        self.assertEqual(self.client.get('/api/media/analytics/top?n=0').status_code, 400)
+        self.client.delete(f"/api/media/{created['id']}")
+        top = self.client.get('/api/media/analytics/top?field=category&n=50').json['data']
+        self.assertNotIn('Analytics', [group['value'] for group in top])
+    
+    def test_media_changes(self):
+        """Test GET /api/media/changes - Deltas since a listing's version, or a resync signal"""
+        listing = self.client.get('/api/media?limit=1').json
+        since, epoch = listing['version'], listing['epoch']
+        created = self.client.post('/api/media', json={
+            'name': 'Changes Film', 'director': 'Changes Director', 'year': 2001, 'category': 'Drama'
+        }).json['data']
+        self.client.delete(f"/api/media/{created['id']}")
+        changes = self.client.get(f'/api/media/changes?since={since}&epoch={epoch}').json['data']
+        self.assertFalse(changes['resync'])
+        self.assertEqual(changes['version'], since + 2)
+        self.assertEqual(changes['changes'], [{'op': 'put', 'record': created},
+                                              {'op': 'delete', 'id': created['id']}])
+        latest = self.client.get(f"/api/media/changes?since={changes['version']}").json['data']
+        self.assertEqual(latest['changes'], [])
+        self.assertTrue(self.client.get(f'/api/media/changes?since={since}&epoch=other').json['data']['resync'])
+        self.assertTrue(self.client.get(f'/api/media/changes?since={since + 100}').json['data']['resync'])
+        self.assertEqual(self.client.get('/api/media/changes').status_code, 400)
+    
+    def test_suggest(self):
+        """Test GET /api/media/suggest - Prefix suggestions follow creates and deletes"""
+        response = self.client.get('/api/media/suggest?prefix=zzsuggest')
+        self.assertEqual((response.status_code, response.json['data']), (200, []))
+        created = self.client.post('/api/media', json={
+            'name': 'Zzsuggest Film', 'director': 'Suggest Director', 'category': 'Drama'
+        }).json['data']
+        data = self.client.get('/api/media/suggest?prefix=ZZSUG').json['data']
+        self.assertEqual(data, [{'text': 'Zzsuggest Film', 'field': 'name', 'count': 1}])
+        self.client.delete(f"/api/media/{created['id']}")
+        self.assertEqual(self.client.get('/api/media/suggest?prefix=zzsug').json['data'], [])
+        self.assertEqual(len(self.client.get('/api/media/suggest?prefix=t&limit=2').json['data']), 2)
+        self.assertEqual(self.client.get('/api/media/suggest?prefix=t&limit=0').status_code, 400)
+    
+    def test_suggest_non_string_values(self):
+        """Test POST /api/media with numeric name and director - Suggested as text, indexes intact"""
+        response = self.client.post('/api/media', json={'name': 4321, 'director': 987, 'category': 'Drama'})
+        self.assertEqual(response.status_code, 201)
+        data = self.client.get('/api/media/suggest?prefix=432').json['data']
+        self.assertEqual(data, [{'text': '4321', 'field': 'name', 'count': 1}])
+        data = self.client.get('/api/media/suggest?prefix=98').json['data']
+        self.assertEqual(data, [{'text': '987', 'field': 'director', 'count': 1}])
+        self.assertEqual(backend.repository.check_indexes(), [])
+    
+    def test_fuzzy_search(self):
+        """Test GET /api/media/search?fuzzy=1 - Misspelt names match, closest first"""
+        self.assertEqual(self.client.get('/api/media/search?name=Inceptoin').json['count'], 0)
+        response = self.client.get('/api/media/search?name=Inceptoin&fuzzy=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['data'][0]['name'], 'Inception')
+        self.assertEqual(response.json['distances'][0], 2)
+        self.assertEqual(response.json['max_distance'], 2)
+        response = self.client.get('/api/media/search?name=Matirx&fuzzy=1&max_distance=4')
+        self.assertEqual(response.json['max_distance'], 1)
+        self.assertEqual(sorted(response.json['distances']), response.json['distances'])
+        created = self.client.post('/api/media', json={
+            'name': 'Zzfuzzy Picture', 'director': 'Fuzzy Director', 'category': 'Drama'
+        }).json['data']
+        data = self.client.get('/api/media/search?name=zzfuzy picture&fuzzy=1&limit=1').json['data']
+        self.assertEqual([media['id'] for media in data], [created['id']])
+        self.client.delete(f"/api/media/{created['id']}")
+        self.assertEqual(self.client.get('/api/media/search?name=zzfuzy picture&fuzzy=1').json['data'], [])
+        response = self.client.get('/api/media/search?name=Inceptoin&fuzzy=1&max_distance=1')
+        self.assertEqual(response.json['data'], [])
+        self.assertEqual(self.client.get('/api/media/search?name=x&fuzzy=1&max_distance=-1').status_code, 400)
+        self.assertEqual(self.client.get('/api/media/search?name=x&fuzzy=1&limit=abc').status_code, 400)
+    
+    def test_batch_operations(self):
+        """Test POST /api/media/batch - Writes commit together and every operation gets a result"""
+        version = self.client.get('/api/media?limit=1').json['version']
+        response = self.client.post('/api/media/batch', json={'operations': [
+            {'op': 'create', 'data': {'name': 'Batch Film', 'category': 'Drama'}},
+            {'op': 'create', 'data': {'name': 'No Category'}},
+            {'op': 'get', 'id': 1},
+            {'op': 'delete', 'id': 999999},
+            {'op': 'rename', 'id': 1}
+        ]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json['data']
+        self.assertEqual([result['status'] for result in results], [201, 400, 200, 404, 400])
+        self.assertEqual(results[2]['data']['id'], 1)
+        created = results[0]['data']
+        results = self.client.post('/api/media/batch', json={'operations': [
+            {'op': 'delete', 'id': created['id']}, {'op': 'get', 'id': created['id']}
+        ]}).json['data']
+        self.assertEqual((results[0]['data'], results[1]['status']), (created, 404))
+        # One commit per batch with writes
+        self.assertEqual(self.client.get('/api/media?limit=1').json['version'], version + 2)
+        self.assertEqual(self.client.post('/api/media/batch', json={'operations': {}}).status_code, 400)
+    
+    def test_compressed_responses(self):
+        """Test gzip negotiation, the compressed body cache and the size threshold"""
+        headers = {'Accept-Encoding': 'gzip'}
+        response = self.client.get('/api/media', headers=headers)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.data)), self.client.get('/api/media').json)
+        hits = self.client.get('/api/media/cache').json['data']['compressed_responses']['hits']
+        self.client.get('/api/media', headers=headers)
+        self.assertEqual(self.client.get('/api/media/cache').json['data']['compressed_responses']['hits'], hits + 1)
+        self.assertNotEqual(response.headers['ETag'], self.client.get('/api/media').headers['ETag'])
+        
+        tiny = self.client.get('/api/media/search?name=No Such Film', headers=headers)
+        self.assertNotIn('Content-Encoding', tiny.headers)
+        export = self.client.get('/api/media/export', headers={'Accept-Encoding': 'deflate'})
+        self.assertEqual(export.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(export.data), self.client.get('/api/media/export').data)
+    
     def test_add_film(self):
         """Test POST /api/films - Add a new film"""
         new_film = {
@@ -44,6 +296,155 @@ class TestFilmsBackendAPI(unittest.TestCase):
         data = response.json
         self.assertTrue(data['success'])
 
+class TestAsyncServer(unittest.TestCase):
+    """Test the asyncio front end serves the same routes and envelopes"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start the asyncio server on a free port in a background thread"""
+        cls.loop = asyncio.new_event_loop()
+        cls.async_server = AsyncServer(app, workers=2)
+        cls.server = cls.loop.run_until_complete(cls.async_server.start(port=0))
+        cls.base_url = f"http://127.0.0.1:{cls.server.sockets[0].getsockname()[1]}/api"
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the server, any connections still open (e.g. event streams) and its event loop"""
+        async def shutdown():
+            cls.server.close()
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(shutdown(), cls.loop).result()
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.loop.close()
+
+    def setUp(self):
+        """Use a keep-alive session and the Flask test client side by side, on a copy of the catalogue"""
+        self.session = requests.Session()
+        self.client = app.test_client()
+        use_catalogue_copy(self)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_same_envelopes(self):
+        """Test that GET responses match the threaded app, including streamed ones"""
+        for path in ('/media', '/media/1', '/media/category/Drama', '/media?stream=1', '/media/stats'):
+            response = self.session.get(self.base_url + path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), self.client.get('/api' + path).json)
+        self.assertEqual(self.session.get(self.base_url + '/media/999999').status_code, 404)
+
+    def test_writes_and_conditional_get(self):
+        """Test POST/DELETE bodies and 304 responses over a reused connection"""
+        created = self.session.post(self.base_url + '/media', json={
+            'name': 'Async Film', 'director': 'Async Director', 'year': 2020, 'category': 'Drama'
+        })
+        self.assertEqual(created.status_code, 201)
+        url = f"{self.base_url}/media/{created.json()['data']['id']}"
+        etag = self.session.get(url).headers['ETag']
+        self.assertEqual(self.session.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.session.delete(url).status_code, 200)
+
+    def test_streamed_request_bodies(self):
+        """Test chunked and Content-Length uploads, and 413 for bodies over the limit"""
+        lines = (json.dumps({'name': f'Chunked Film {n}', 'category': 'Drama'}).encode() + b'\n' for n in range(3))
+        response = self.session.post(self.base_url + '/media/bulk', data=lines,
+                                     headers={'Content-Type': 'application/x-ndjson'})
+        self.assertEqual((response.status_code, response.json()['created']), (201, 3))
+        # The connection stays usable after a streamed body
+        self.assertEqual(self.session.get(self.base_url + '/media/1').status_code, 200)
+        for film in self.client.get('/api/media').json['data']:
+            if film['name'].startswith('Chunked Film'):
+                self.client.delete(f"/api/media/{film['id']}")
+        self.async_server.max_body_bytes = 100
+        try:
+            body = b'{"name": "%s", "category": "Drama"}' % (b'x' * 200)
+            self.assertEqual(self.session.post(self.base_url + '/media', data=body).status_code, 413)
+            response = requests.post(self.base_url + '/media/bulk', data=iter([body, body]))
+            self.assertEqual(response.status_code, 413)
+        finally:
+            self.async_server.max_body_bytes = MAX_BODY_BYTES
+
+    def read_events(self, response):
+        """Yield (id, event, data) for each message on a Server-Sent Events stream"""
+        message = {}
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line:
+                if 'data' in message:
+                    yield message.get('id'), message.get('event'), json.loads(message['data'])
+                message = {}
+            elif not line.startswith(':'):
+                field, _, value = line.partition(': ')
+                message[field] = value
+
+    def test_event_stream(self):
+        """Test that changes are pushed to subscribers and replayed after Last-Event-ID"""
+        url = self.base_url + '/media/events'
+        with requests.get(url, stream=True, timeout=10) as response:
+            self.assertEqual(response.headers['Content-Type'], 'text/event-stream; charset=utf-8')
+            events = self.read_events(response)
+            ready_id, event, data = next(events)
+            self.assertEqual(event, 'ready')
+            created = self.session.post(self.base_url + '/media', json={
+                'name': 'Event Film', 'director': 'Event Director', 'year': 2020, 'category': 'Drama'
+            }).json()['data']
+            _, event, data = next(events)
+            self.assertEqual((event, data['changes']), ('changes', [{'op': 'put', 'record': created}]))
+        self.session.delete(f"{self.base_url}/media/{created['id']}")
+        with requests.get(url, stream=True, timeout=10, headers={'Last-Event-ID': ready_id}) as response:
+            _, event, data = next(self.read_events(response))
+            self.assertEqual([change['op'] for change in data['changes']], ['put', 'delete'])
+        with requests.get(url, stream=True, timeout=10, headers={'Last-Event-ID': 'other-1'}) as response:
+            self.assertEqual(next(self.read_events(response))[1], 'resync')
+
+class TestWriteForwarder(unittest.TestCase):
+    """Test that a media_prefork reader worker forwards writes, bodies included, to the writer"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Serve the app as the writer, and a WriteForwarder in front of it as a reader"""
+        cls.loop = asyncio.new_event_loop()
+        writer = cls.loop.run_until_complete(AsyncServer(app, workers=2).start(port=0))
+        forwarder = WriteForwarder(app, writer.sockets[0].getsockname()[:2])
+        reader = cls.loop.run_until_complete(AsyncServer(forwarder, workers=2).start(port=0))
+        cls.servers = [writer, reader]
+        cls.base_url = f"http://127.0.0.1:{reader.sockets[0].getsockname()[1]}/api"
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop both servers and the event loop"""
+        for server in cls.servers:
+            cls.loop.call_soon_threadsafe(server.close)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.loop.close()
+
+    def setUp(self):
+        use_catalogue_copy(self)
+
+    def catalogue_count(self):
+        return requests.get(self.base_url + '/media').json()['count']
+
+    def test_forwarded_bodies(self):
+        """Test chunked and Content-Length uploads through a reader reach the writer whole"""
+        count = self.catalogue_count()
+        lines = (json.dumps({'name': f'Forwarded Film {n}', 'category': 'Drama'}).encode() + b'\n' for n in range(3))
+        response = requests.post(self.base_url + '/media/bulk', data=lines,
+                                 headers={'Content-Type': 'application/x-ndjson'})
+        self.assertEqual((response.status_code, response.json()['created']), (201, 3))
+        response = requests.post(self.base_url + '/media', json={'name': 'Forwarded Film', 'category': 'Drama'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(requests.delete(f"{self.base_url}/media/{response.json()['data']['id']}").status_code, 200)
+        self.assertEqual(self.catalogue_count(), count + 3)
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("TEST 1: BACKEND API TESTS")
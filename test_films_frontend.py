@@ -6,8 +6,11 @@ Tests PyQt6 GUI and backend connection for Film Cinemax
 
 import unittest
 import sys
+import threading
+import time
 import requests
 from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QModelIndex, Qt
 
 class TestFilmsFrontendIntegration(unittest.TestCase):
     """Test Film Cinemax frontend integration"""
@@ -42,6 +45,208 @@ class TestFilmsFrontendIntegration(unittest.TestCase):
         except requests.exceptions.ConnectionError:
             self.fail("Cannot connect to backend on localhost:5000")
 
+class TestRequestDispatcher(unittest.TestCase):
+    """Test the client's thread pool request dispatcher"""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Serve the backend on a free port and create the QApplication"""
+        from werkzeug.serving import make_server
+        from backend import app
+        cls.qapp = QApplication.instance() or QApplication(sys.argv)
+        cls.server = make_server('127.0.0.1', 0, app, threaded=True)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/api"
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+    
+    def setUp(self):
+        """Work on a temporary copy of the catalogue"""
+        from test_films_backend import use_catalogue_copy
+        use_catalogue_copy(self)
+    
+    def wait_for(self, dispatcher):
+        """Process events until every request has been delivered"""
+        deadline = time.monotonic() + 10
+        while dispatcher._tasks and time.monotonic() < deadline:
+            self.qapp.processEvents()
+            time.sleep(0.01)
+        self.qapp.processEvents()
+    
+    def test_results_delivered_through_signals(self):
+        """Test that results and errors arrive on the GUI thread"""
+        from client_network import RequestDispatcher
+        dispatcher = RequestDispatcher(self.base_url)
+        results, errors = [], []
+        dispatcher.request('GET', '/media/1', results.append)
+        dispatcher.request('GET', '/media/999999', results.append, errors.append)
+        self.wait_for(dispatcher)
+        self.assertEqual([film['id'] for film in results], [1])
+        self.assertEqual(errors, ['Server error: 404'])
+    
+    def test_etag_cache_is_bounded(self):
+        """Test that cached GET responses are evicted least recently used first, and suggestions skip the cache"""
+        from client_network import ETagCache, RequestDispatcher
+        cache = ETagCache(max_entries=2)
+        cache['a'], cache['b'] = ('"a"', 1), ('"b"', 2)
+        cache.get('a')
+        cache['c'] = ('"c"', 3)
+        self.assertEqual(list(cache), ['a', 'c'])
+        dispatcher = RequestDispatcher(self.base_url)
+        results = []
+        dispatcher.request('GET', '/media/suggest?prefix=th', results.append, conditional=False)
+        dispatcher.request('GET', '/media/1', results.append)
+        self.wait_for(dispatcher)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(list(dispatcher.etag_cache), [self.base_url + '/media/1'])
+    
+    def test_superseded_requests_are_dropped(self):
+        """Test that only the newest request on a channel is delivered"""
+        from client_network import RequestDispatcher
+        dispatcher = RequestDispatcher(self.base_url, max_threads=1)
+        delivered = []
+        for category in ('Drama', 'Crime', 'Action'):
+            dispatcher.request('GET', f'/media/category/{category}',
+                               lambda films, category=category: delivered.append(category),
+                               channel='listing')
+        self.wait_for(dispatcher)
+        self.assertEqual(delivered, ['Action'])
+    
+    def test_batched_operations(self):
+        """Test that operations queued together go out as one batch request over a pooled session"""
+        from client_network import RequestBatcher, RequestDispatcher
+        dispatcher = RequestDispatcher(self.base_url)
+        batcher = RequestBatcher(dispatcher)
+        sent, results, errors = [], [], []
+        request = dispatcher.request
+        dispatcher.request = lambda *args, **kwargs: sent.append(args[1]) or request(*args, **kwargs)
+        batcher.create({'name': 'Batched Film', 'category': 'Drama'}, results.append, errors.append)
+        batcher.get(1, results.append, errors.append)
+        batcher.get(999999, results.append, errors.append)
+        self.wait_until(lambda: len(results) + len(errors) == 3)
+        self.assertEqual(sent, ['/media/batch'])
+        self.assertEqual([film['name'] for film in results][0], 'Batched Film')
+        self.assertEqual(results[1]['id'], 1)
+        self.assertEqual(errors, ['Media not found'])
+        batcher.delete(results[0]['id'], results.append, errors.append)
+        batcher.flush()
+        self.wait_until(lambda: len(results) == 3)
+        self.assertEqual(len(sent), 2)
+        self.assertIn('http://', dispatcher.session.adapters)
+    
+    def wait_until(self, condition):
+        """Process events until condition() holds"""
+        deadline = time.monotonic() + 10
+        while not condition() and time.monotonic() < deadline:
+            self.qapp.processEvents()
+            time.sleep(0.01)
+        self.assertTrue(condition())
+    
+    def test_event_listener(self):
+        """Test that pushed changes arrive as signals and a restarted listener replays missed ones"""
+        from client_network import EventListener
+        listener = EventListener(self.base_url + '/media/events')
+        events = []
+        listener.received.connect(lambda name, data: events.append((name, data)))
+        listener.start()
+        try:
+            self.wait_until(lambda: events)
+            self.assertEqual(events[0][0], 'ready')
+            created = requests.post(self.base_url + '/media', json={
+                'name': 'Listener Film', 'director': 'Listener Director', 'year': 2020, 'category': 'Drama'
+            }).json()['data']
+            self.wait_until(lambda: len(events) == 2)
+            self.assertEqual(events[1], ('changes', {'changes': [{'op': 'put', 'record': created}],
+                                                     'version': events[0][1]['version'] + 1}))
+            listener.stop()
+            requests.delete(f"{self.base_url}/media/{created['id']}")
+            listener.start(listener.last_event_id)
+            self.wait_until(lambda: len(events) == 3)
+            self.assertEqual(events[2][1]['changes'], [{'op': 'delete', 'id': created['id']}])
+        finally:
+            listener.stop()
+
+class TestFilmTableModel(unittest.TestCase):
+    """Test the virtualized film table model and its proxy"""
+    
+    FILMS = [
+        {'id': 1, 'name': 'Heat', 'director': 'Michael Mann', 'year': 1995, 'category': 'Crime', 'runtime': 170},
+        {'id': 2, 'name': 'alien', 'author': 'Ridley Scott', 'publication_date': '1979',
+         'category': 'Sci-Fi', 'runtime': 117},
+        {'id': 3, 'name': 'Dune', 'director': 'Denis Villeneuve', 'year': 2021, 'category': 'Sci-Fi'}
+    ]
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.qapp = QApplication.instance() or QApplication(sys.argv)
+    
+    def setUp(self):
+        from client_models import FilmTableModel, FilmProxyModel
+        self.model = FilmTableModel()
+        self.proxy = FilmProxyModel()
+        self.proxy.setSourceModel(self.model)
+    
+    def column(self, column):
+        return [self.proxy.index(row, column).data() for row in range(self.proxy.rowCount())]
+    
+    def test_rows_and_legacy_fields(self):
+        """Test that rows render from the film dicts, including legacy fields"""
+        from client_models import FilmRole
+        self.model.set_films(self.FILMS)
+        self.assertEqual(self.model.rowCount(), 3)
+        self.assertEqual(self.model.index(1, 1).data(), 'Ridley Scott')
+        self.assertEqual(self.model.index(1, 2).data(), '1979')
+        self.assertEqual(self.model.index(2, 0).data(FilmRole), self.FILMS[2])
+    
+    def test_sort_and_filter_through_proxy(self):
+        """Test sorting by year, runtime and name and filtering by category"""
+        from client_models import RuntimeRole, SortRole
+        self.model.set_films(self.FILMS)
+        self.proxy.sort(2, Qt.SortOrder.DescendingOrder)
+        self.assertEqual(self.column(2), ['2021', '1995', '1979'])
+        self.proxy.setSortRole(RuntimeRole)
+        self.proxy.sort(0, Qt.SortOrder.DescendingOrder)
+        self.assertEqual(self.column(0), ['Heat', 'alien', 'Dune'])
+        self.proxy.setSortRole(SortRole)
+        self.proxy.sort(0, Qt.SortOrder.AscendingOrder)
+        self.assertEqual(self.column(0), ['alien', 'Dune', 'Heat'])
+        self.proxy.set_category('sci-fi')
+        self.assertEqual(self.column(0), ['alien', 'Dune'])
+    
+    def test_lazy_pages(self):
+        """Test that fetchMore asks for the next page once and appends it"""
+        requested = []
+        self.model.fetch_page = requested.append
+        self.model.set_films(self.FILMS[:2], next_cursor='page-2')
+        self.assertTrue(self.proxy.canFetchMore(QModelIndex()))
+        self.proxy.fetchMore(QModelIndex())
+        self.proxy.fetchMore(QModelIndex())
+        self.assertEqual(requested, ['page-2'])
+        self.model.append_films(self.FILMS[2:], next_cursor=None)
+        self.assertEqual(self.proxy.rowCount(), 3)
+        self.assertFalse(self.model.canFetchMore())
+    
+    def test_apply_changes(self):
+        """Test that change deltas update, add and remove rows in place"""
+        self.model.set_films(self.FILMS[:2], next_cursor='page-2')
+        self.model.apply_changes([
+            {'op': 'put', 'record': dict(self.FILMS[0], name='Heat (1995)')},
+            {'op': 'put', 'record': self.FILMS[2]},
+            {'op': 'delete', 'id': 2},
+            {'op': 'put', 'record': {'id': 4, 'name': 'Temp'}},
+            {'op': 'delete', 'id': 4}
+        ])
+        self.assertEqual(self.column(0), ['Heat (1995)', 'Dune'])
+        # A page overlapping the rows a delta already added does not duplicate them
+        self.model.append_films(self.FILMS[2:], next_cursor=None)
+        self.assertEqual(self.column(0), ['Heat (1995)', 'Dune'])
+        self.model.apply_changes([{'op': 'put', 'record': self.FILMS[2]}],
+                                 keep=lambda film: film['category'] == 'Crime')
+        self.assertEqual(self.column(0), ['Heat (1995)'])
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("TEST 3: FRONTEND INTEGRATION TESTS")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test Films Search - Test 5
+Tests the full-text search index for Film Cinemax
+"""
+
+import unittest
+from media_search import FullTextIndex, FuzzyNameIndex
+from media_suggest import PrefixIndex
+
+SAMPLE_FILMS = [
+    {'id': '1', 'name': 'The Dark Knight', 'director': 'Christopher Nolan', 'category': 'Action',
+     'description': 'Batman faces the Joker in Gotham.'},
+    {'id': '2', 'name': 'Inception', 'director': 'Christopher Nolan', 'category': 'Sci-Fi',
+     'description': 'A thief enters dreams to plant an idea.'},
+    {'id': '3', 'name': 'Knight and Day', 'director': 'James Mangold', 'category': 'Action',
+     'description': 'A spy drags a woman into his missions.'}
+]
+
+class TestFullTextIndex(unittest.TestCase):
+    """Test Film Cinemax full-text index"""
+
+    def setUp(self):
+        """Build an index over the sample films"""
+        self.index = FullTextIndex()
+        self.index.rebuild(SAMPLE_FILMS)
+
+    def test_substring_search(self):
+        """Test that terms still match inside names and directors"""
+        self.assertEqual([f['id'] for f in self.index.search('olan')], ['1', '2'])
+        self.assertEqual([f['id'] for f in self.index.search('ncep')], ['2'])
+
+    def test_ranked_and_search(self):
+        """Test multi-term AND queries, ranking and limits"""
+        self.assertEqual([f['id'] for f in self.index.search('knight')], ['3', '1'])
+        self.assertEqual([f['id'] for f in self.index.search('knight nolan')], ['1'])
+        self.assertEqual([f['id'] for f in self.index.search('dreams nolan')], ['2'])
+        self.assertEqual(len(self.index.search('knight', limit=1)), 1)
+        self.assertEqual(self.index.search('knight zebra'), [])
+
+    def test_incremental_updates(self):
+        """Test that added and removed films are reflected in results"""
+        self.index.add({'id': '4', 'name': 'Tenet', 'director': 'Christopher Nolan', 'category': 'Sci-Fi'})
+        self.index.remove(SAMPLE_FILMS[1])
+        self.assertEqual([f['id'] for f in self.index.search('nolan')], ['1', '4'])
+        self.assertEqual(self.index.check(SAMPLE_FILMS[:1] + SAMPLE_FILMS[2:] + [
+            {'id': '4', 'name': 'Tenet', 'director': 'Christopher Nolan', 'category': 'Sci-Fi'}]), [])
+
+class TestPrefixIndex(unittest.TestCase):
+    """Test Film Cinemax autocomplete prefix index"""
+
+    def setUp(self):
+        """Build an index over the sample films"""
+        self.index = PrefixIndex()
+        self.index.rebuild(SAMPLE_FILMS)
+
+    def texts(self, prefix, limit=10):
+        return [(s['text'], s['field'], s['count']) for s in self.index.suggest(prefix, limit)]
+
+    def test_suggestions(self):
+        """Test leading matches first, then later-word matches, distinct and case-insensitive"""
+        self.assertEqual(self.texts('KNI'), [('Knight and Day', 'name', 1), ('The Dark Knight', 'name', 1)])
+        self.assertEqual(self.texts('chris'), [('Christopher Nolan', 'director', 2)])
+        self.assertEqual(self.texts('nol'), [('Christopher Nolan', 'director', 2)])
+        self.assertEqual(self.texts('k', limit=1), [('Knight and Day', 'name', 1)])
+        self.assertEqual(self.texts(' '), [])
+        self.assertEqual(self.texts('zebra'), [])
+
+    def test_incremental_updates(self):
+        """Test that added and removed films are reflected in suggestions"""
+        tenet = {'id': '4', 'name': 'Tenet', 'director': 'Christopher Nolan', 'category': 'Sci-Fi'}
+        self.index.add(tenet)
+        self.index.remove(SAMPLE_FILMS[2])
+        self.assertEqual(self.texts('t'), [('Tenet', 'name', 1), ('The Dark Knight', 'name', 1)])
+        self.assertEqual(self.texts('christopher'), [('Christopher Nolan', 'director', 3)])
+        self.assertEqual(self.texts('mangold'), [])
+        self.assertEqual(self.index.check(SAMPLE_FILMS[:2] + [tenet]), [])
+
+class TestFuzzyNameIndex(unittest.TestCase):
+    """Test Film Cinemax typo-tolerant name index"""
+
+    def setUp(self):
+        """Build an index over the sample films"""
+        self.index = FuzzyNameIndex()
+        self.index.rebuild(SAMPLE_FILMS)
+
+    def names(self, query, max_distance=2, limit=10):
+        return [(record['name'], distance) for record, distance in self.index.search(query, max_distance, limit)]
+
+    def test_ranked_matches(self):
+        """Test that misspelt names match, closest first, within the allowed distance"""
+        self.assertEqual(self.names('inceptoin'), [('Inception', 2)])
+        self.assertEqual(self.names('INCEPTION'), [('Inception', 0)])
+        self.assertEqual(self.names('dark knigt'), [('The Dark Knight', 1)])
+        self.assertEqual(self.names('knight'), [('Knight and Day', 0), ('The Dark Knight', 0)])
+        self.assertEqual(self.names('knight', limit=1), [('Knight and Day', 0)])
+        self.assertEqual(self.names('inceptoin', max_distance=1), [])
+        self.assertEqual(self.names('zebra crossing'), [])
+        self.assertEqual(self.names(' '), [])
+
+    def test_short_queries(self):
+        """Test that short queries tolerate fewer edits, so they never match everything"""
+        self.assertEqual(self.names('knx'), [])
+        self.assertEqual(self.names('ncepti', max_distance=4), [('Inception', 0)])
+        self.assertEqual(self.index.allowed_distance('ncepti', 4), 1)
+        self.assertEqual(self.index.allowed_distance('inceptoin', 4), 2)
+        self.assertEqual(self.index.allowed_distance('inceptoin', 1), 1)
+
+    def test_incremental_updates(self):
+        """Test that added and removed films are reflected in fuzzy matches"""
+        tenet = {'id': '4', 'name': 'Tenet', 'director': 'Christopher Nolan', 'category': 'Sci-Fi'}
+        self.index.add(tenet)
+        self.index.remove(SAMPLE_FILMS[1])
+        self.assertEqual(self.names('tenett'), [('Tenet', 1)])
+        self.assertEqual(self.names('inception'), [])
+        self.assertEqual(self.index.check([SAMPLE_FILMS[0], SAMPLE_FILMS[2], tenet]), [])
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("TEST 5: SEARCH INDEX TESTS")
+    print("="*60 + "\n")
+    unittest.main(verbosity=2)
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+Test Films Store - Test 4
+Tests the in-memory media repository for Film Cinemax
+"""
+
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from media_store import MediaRepository, JournalStorage, CatalogueError, IdAllocator
+from media_sqlite import SqliteStorage
+from media_record import Film
+from media_changes import ChangeLog
+import media_json
+from media_prefork import SharedCounter
+from media_query import CatalogueQuery
+from media_stats import StatsIndex
+from media_index import HashIndex
+
+SAMPLE_FILMS = [
+    {'id': '1', 'name': 'The Godfather', 'director': 'Francis Ford Coppola', 'year': 1972, 'category': 'Crime'},
+    {'id': '2', 'name': 'Inception', 'director': 'Christopher Nolan', 'year': 2010, 'category': 'Sci-Fi'}
+]
+
+class TestMediaRepository(unittest.TestCase):
+    """Test Film Cinemax media repository"""
+
+    def setUp(self):
+        """Create a temporary catalogue file"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'films.json')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(SAMPLE_FILMS, f)
+        self.repository = MediaRepository(self.path)
+
+    def tearDown(self):
+        """Remove the temporary catalogue"""
+        shutil.rmtree(self.tmpdir)
+
+    def test_cached_reads(self):
+        """Test that repeated reads are served from memory"""
+        self.assertEqual(len(self.repository.records()), 2)
+        self.repository.records()
+        info = self.repository.cache_info()
+        self.assertEqual(info['misses'], 1)
+        self.assertEqual(info['hits'], 1)
+        self.assertEqual(info['reloads'], 0)
+
+    def test_reload_on_file_change(self):
+        """Test that an external write to the file triggers a reload"""
+        self.repository.records()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(SAMPLE_FILMS[:1], f)
+        os.utime(self.path, ns=(1, 1))
+        self.assertEqual(len(self.repository.records()), 1)
+        self.assertEqual(self.repository.cache_info()['reloads'], 1)
+
+    def test_writes_do_not_reload(self):
+        """Test that writes through the repository keep the cache valid"""
+        self.repository.add({'id': '3', 'name': 'Heat', 'category': 'Crime'})
+        self.repository.delete(1)
+        names = [m['name'] for m in self.repository.records()]
+        self.assertEqual(names, ['Inception', 'Heat'])
+        self.assertEqual(self.repository.cache_info()['reloads'], 0)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_legacy_year_ranges(self):
+        """Test that a legacy publication_date counts as the year in range queries, sorting and stats"""
+        query = CatalogueQuery(self.repository)
+        stats = self.repository.attach(StatsIndex())
+        self.repository.add({'id': '3', 'name': 'Heat', 'publication_date': 1995, 'category': 'Crime'})
+        found, _ = query.run(ranges={'year': (1990, 2000)})
+        self.assertEqual([m['id'] for m in found], [3])
+        found, _ = query.run(sort='year')
+        self.assertEqual([m['id'] for m in found], [1, 3, 2])
+        self.assertEqual(stats.summary()['by_year'], {'1972': 1, '1995': 1, '2010': 1})
+
+    def test_stats_medians(self):
+        """Test that runtime medians follow adds and removes, including repeated runtimes"""
+        stats = self.repository.attach(StatsIndex())
+        for film_id, runtime in ((3, 100), (4, 100), (5, 130), (6, 90)):
+            self.repository.add({'id': film_id, 'name': f'Film {film_id}', 'category': 'Crime', 'runtime': runtime})
+        self.assertEqual(stats.summary()['median_runtime'], 100)
+        self.repository.delete(4)
+        self.assertEqual(stats.summary()['median_runtime'], 100)
+        self.repository.delete(3)
+        self.assertEqual(stats.summary()['median_runtime'], 110)
+        self.assertEqual(stats.summary(filters={'category': 'crime'})['average_runtime'], 110)
+        self.assertEqual(self.repository.check_indexes(), [])
+
+    def test_stats_mixed_values(self):
+        """Test that stats group categories case-insensitively and take non-string categories and directors"""
+        stats = self.repository.attach(StatsIndex())
+        self.repository.add({'id': 3, 'name': 'Heat', 'category': 'crime', 'director': 1995})
+        self.repository.add({'id': 4, 'name': 'Five', 'category': 5})
+        self.repository.add({'id': 5, 'name': 'Listed', 'category': ['Drama', 'Crime']})
+        summary = stats.summary()
+        self.assertEqual(summary['by_category'], {"['Drama', 'Crime']": 1, '5': 1, 'Crime': 2, 'Sci-Fi': 1})
+        self.assertEqual(summary['runtime_by_director']['1995']['count'], 1)
+        self.assertEqual(stats.summary(filters={'category': 'CRIME'})['count'], 2)
+        self.assertEqual(list(stats.summary('category', filters={'category': 5})['groups']), ['5'])
+        self.repository.delete(1)
+        self.assertEqual(stats.summary()['by_category']['crime'], 1)
+        self.assertEqual(self.repository.check_indexes(), [])
+
+    def test_hash_indexes(self):
+        """Test id/category/name lookups stay correct across writes"""
+        self.repository.add({'id': '3', 'name': 'Heat', 'category': 'crime'})
+        self.assertEqual([m['id'] for m in self.repository.by_category('CRIME')], [1, 3])
+        self.assertEqual(self.repository.by_name('inception')[0]['id'], 2)
+        self.repository.delete('1')
+        self.assertEqual([m['id'] for m in self.repository.by_category('Crime')], [3])
+        self.assertIsNone(self.repository.get(1))
+        self.assertEqual(self.repository.get('2')['name'], 'Inception')
+        self.assertEqual(self.repository.check_indexes(), [])
+
+    def test_category_pages(self):
+        """Test that category pages follow the id order across cursors, case-insensitively"""
+        for film_id, category in ((12, 'crime'), (4, 'Drama'), ('x', 'Crime'), (3, 'CRIME'), (20, 'Sci-Fi')):
+            self.repository.add({'id': film_id, 'name': f'Film {film_id}', 'category': category})
+        ids, cursor = [], None
+        while True:
+            records, cursor = self.repository.page(2, cursor, 'crime')
+            ids.extend(m['id'] for m in records)
+            if cursor is None:
+                break
+        self.assertEqual(ids, [1, 3, 12, 'x'])
+        self.assertEqual(self.repository.page(10, '3', 'Crime'), (self.repository.page(10, None, 'Crime')[0][2:], None))
+        self.assertEqual(self.repository.page(5, None, 'Western'), ([], None))
+        self.repository.delete(3)
+        self.assertEqual([m['id'] for m in self.repository.page(2, '1', 'CRIME')[0]], [12, 'x'])
+        self.assertEqual(self.repository.check_indexes(), [])
+
+    def test_index_consistency_check(self):
+        """Test that the consistency check reports a damaged index"""
+        self.repository.records()
+        self.repository.hash_index.by_category.clear()
+        self.assertIn("category index does not match the catalogue", self.repository.check_indexes())
+
+    def test_group_commit(self):
+        """Test that concurrent writers share commits and none are lost"""
+        repository = MediaRepository(self.path, group_commit=True)
+        repository.commit_queue.window = 0.05
+        threads = [threading.Thread(target=repository.create,
+                                    args=(lambda new_id: {'id': new_id, 'name': f'Film {new_id}', 'category': 'Drama'},))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(repository.commit_queue.commits, 20)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            ids = [m['id'] for m in json.load(f)]
+        self.assertEqual(len(ids), 22)
+        self.assertEqual(len(set(map(str, ids))), 22)
+
+    def test_id_normalization(self):
+        """Test the one-time rewrite of string ids to integers"""
+        self.assertEqual([m['id'] for m in self.repository.records()], [1, 2])
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual([m['id'] for m in json.load(f)], [1, 2])
+        self.assertEqual(self.repository.get('2')['name'], 'Inception')
+
+    def test_change_log(self):
+        """Test that the bounded change log serves recent deltas and asks for a resync after that"""
+        log = self.repository.keep_change_log(ChangeLog(max_entries=2))
+        self.repository.records()
+        start = self.repository.version
+        created = self.repository.create(lambda new_id: {'id': new_id, 'name': 'Heat'})
+        self.repository.delete(1)
+        version, changes = self.repository.changes_since(start)
+        self.assertEqual(changes, [('put', created), ('delete', 1)])
+        self.repository.delete(2)
+        self.assertIsNone(self.repository.changes_since(start)[1])
+        self.assertEqual(self.repository.changes_since(version)[1], [('delete', 2)])
+        self.repository.replace_all([])
+        self.assertIsNone(self.repository.changes_since(version + 1)[1])
+        self.assertEqual(log.oldest, self.repository.version)
+    
+    def test_change_log_waits(self):
+        """Test that threads and coroutines waiting on the change log wake when it moves"""
+        log = ChangeLog()
+        log.reset(1)
+        self.assertEqual(log.wait(1, timeout=0.01), 1)
+        threading.Timer(0.05, log.record, (2, [('delete', 5)])).start()
+        self.assertEqual(log.wait(1, timeout=5), 2)
+        
+        async def wait_for_change():
+            # The change is recorded on another thread, as a request handler would
+            threading.Timer(0.05, log.record, (3, [('delete', 6)])).start()
+            return await log.wait_async(2, timeout=5)
+        self.assertEqual(asyncio.run(wait_for_change()), 3)
+        self.assertEqual(asyncio.run(log.wait_async(3, timeout=0.01)), 3)
+        self.assertFalse(log._waiters)
+    
+    def test_change_many(self):
+        """Test that creates and deletes made together land in one commit"""
+        self.repository.records()
+        version = self.repository.version
+        created, removed = self.repository.change_many(
+            [lambda new_id: {'id': new_id, 'name': 'Heat'}], [1, '1', 99])
+        self.assertEqual(self.repository.version, version + 1)
+        self.assertEqual(created, [{'id': 3, 'name': 'Heat'}])
+        self.assertEqual([record and record['id'] for record in removed], [1, None, None])
+        self.assertEqual([m['id'] for m in self.repository.records()], [2, 3])
+        self.assertEqual(self.repository.change_many([], [99]), ([], [None]))
+        self.assertEqual(self.repository.version, version + 1)
+    
+    def test_index_failure_rolls_back(self):
+        """Test that an index raising partway through a write leaves memory and every index unchanged"""
+        class FailingIndex(HashIndex):
+            def add(self, record):
+                super().add(record)
+                if record.get('name') == 'Boom':
+                    raise ValueError('rejected')
+
+        self.repository.attach(FailingIndex())
+        stats = self.repository.attach(StatsIndex())
+        before = (self.repository.records(), self.repository.version, stats.summary())
+        with self.assertRaises(ValueError):
+            self.repository.change_many([lambda new_id: {'id': new_id, 'name': 'Heat', 'category': 'Crime'},
+                                         lambda new_id: {'id': new_id, 'name': 'Boom', 'category': 'Crime'}], [2])
+        with self.assertRaises(ValueError):
+            self.repository.add({'id': 1, 'name': 'Boom', 'category': 'Drama'})
+        self.assertEqual((self.repository.records(), self.repository.version, stats.summary()), before)
+        self.assertEqual(self.repository.get(1)['name'], 'The Godfather')
+        self.assertEqual(self.repository.check_indexes(), [])
+    
+    def test_id_allocator(self):
+        """Test that ids come from a persisted sequence, reserved a block at a time"""
+        self.assertEqual(self.repository.next_id(), 3)
+        films = self.repository.create_many([
+            lambda new_id: {'id': new_id, 'name': 'Heat', 'category': 'Crime'},
+            lambda new_id: {'id': new_id, 'name': 'Alien', 'category': 'Sci-Fi'}
+        ])
+        self.assertEqual([m['id'] for m in films], [3, 4])
+        self.repository.delete(4)
+        # Ids are never reused, even across restarts
+        reopened = MediaRepository(self.path)
+        self.assertGreater(reopened.create(lambda new_id: {'id': new_id, 'name': 'Up', 'category': 'Animation'})['id'], 4)
+
+        allocator = IdAllocator(os.path.join(self.tmpdir, 'ids.seq'), block_size=10)
+        self.assertEqual(allocator.allocate(25), 1)
+        self.assertEqual(allocator.allocate(), 26)
+        with open(allocator.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '36')
+
+    def test_damaged_file_is_not_empty(self):
+        """Test that a truncated catalogue raises instead of reading as empty"""
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('[{"id": "1", "na')
+        with self.assertRaises(CatalogueError):
+            self.repository.records()
+
+class TestFilmRecord(unittest.TestCase):
+    """Test Film Cinemax compact film records"""
+
+    def test_round_trip(self):
+        """Test that a Film reads and serializes like the dict it came from"""
+        record = {'id': 3, 'name': 'Pulp Fiction', 'author': 'Quentin Tarantino',
+                  'publication_date': '1994', 'created_at': '2024-05-01T12:30:00.250000', 'rating': 9}
+        film = Film(record)
+        self.assertEqual(film, record)
+        self.assertEqual(list(film), list(record))
+        self.assertEqual(film.get('author'), 'Quentin Tarantino')
+        self.assertEqual(film.director, 'Quentin Tarantino')
+        self.assertEqual(film.created_at.year, 2024)
+        self.assertIsNone(film.get('category'))
+        self.assertEqual(json.loads(json.dumps(film.to_dict())), record)
+
+    def test_immutable_and_interned(self):
+        """Test that Films cannot be changed and share repeated strings"""
+        first = Film({'id': 1, 'director': ''.join(['Christopher ', 'Nolan'])})
+        second = Film({'id': 2, 'director': ''.join(['Christopher ', 'Nolan'])})
+        self.assertIs(first.director, second.director)
+        with self.assertRaises(AttributeError):
+            first.name = 'Tenet'
+        with self.assertRaises(TypeError):
+            first['name'] = 'Tenet'
+
+    def test_cached_json_fragments(self):
+        """Test that each Film is encoded once and envelopes join the fragments"""
+        films = [Film(film) for film in SAMPLE_FILMS]
+        fragment = media_json.record_json(films[0])
+        self.assertIs(media_json.record_json(films[0]), fragment)
+        body = json.loads(media_json.envelope(films, success=True, count=2))
+        self.assertEqual(body, {'success': True, 'count': 2, 'data': SAMPLE_FILMS})
+        encoder = media_json.orjson
+        media_json.orjson = None
+        try:
+            self.assertEqual(json.loads(media_json.record_json(Film(SAMPLE_FILMS[1]))), SAMPLE_FILMS[1])
+        finally:
+            media_json.orjson = encoder
+
+    def test_repository_holds_films(self):
+        """Test that the repository stores Films but writes plain JSON"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'films.json')
+            repository = MediaRepository(path)
+            repository.add({'id': 1, 'name': 'Heat', 'category': 'Crime'})
+            self.assertIsInstance(repository.get(1), Film)
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), [{'id': 1, 'name': 'Heat', 'category': 'Crime'}])
+        finally:
+            shutil.rmtree(tmpdir)
+
+class TestJournalStorage(unittest.TestCase):
+    """Test the append-only journal storage mode"""
+
+    def setUp(self):
+        """Create a temporary catalogue snapshot"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'films.json')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(SAMPLE_FILMS, f)
+
+    def tearDown(self):
+        """Remove the temporary catalogue"""
+        shutil.rmtree(self.tmpdir)
+
+    def test_writes_append_to_journal(self):
+        """Test that writes leave the snapshot untouched and replay on startup"""
+        repository = MediaRepository(JournalStorage(self.path))
+        repository.add({'id': '3', 'name': 'Heat', 'category': 'Crime'})
+        repository.delete('1')
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 2)
+        with open(self.path + '.journal', 'r', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+        reopened = MediaRepository(JournalStorage(self.path))
+        self.assertEqual([m['id'] for m in reopened.records()], [2, 3])
+
+    def test_torn_journal_lines(self):
+        """Test that a reader tailing the journal never skips or repeats a line still being written"""
+        writer = MediaRepository(JournalStorage(self.path))
+        reader = MediaRepository(JournalStorage(self.path))
+        writer.add({'id': 3, 'name': 'Heat', 'category': 'Crime'})
+        self.assertEqual([m['id'] for m in reader.records()], [1, 2, 3])
+        log = reader.keep_change_log(ChangeLog())
+        line = b'{"op":"put","record":{"id":4,"name":"Alien","category":"Sci-Fi"}}\n'
+        with open(self.path + '.journal', 'ab') as f:
+            f.write(line[:20])
+        self.assertEqual([m['id'] for m in reader.records()], [1, 2, 3])
+        with open(self.path + '.journal', 'ab') as f:
+            f.write(line[20:])
+        self.assertEqual([m['id'] for m in reader.records()], [1, 2, 3, 4])
+        # Each change is picked up exactly once
+        self.assertEqual([op for op, _ in log.since(log.oldest)[1]], ['put'])
+        # A line appended between the reader's stat and its read is applied once, not again next time
+        writer.add({'id': 5, 'name': 'Ran', 'category': 'Drama'})
+        signature, stat = reader.storage.signature(), reader.storage.signature
+        writer.add({'id': 6, 'name': 'Ikiru', 'category': 'Drama'})
+        reader.storage.signature = lambda: signature
+        self.assertEqual([m['id'] for m in reader.records()], [1, 2, 3, 4, 5, 6])
+        reader.storage.signature = stat
+        self.assertEqual(len(reader.records()), 6)
+        self.assertEqual([op for op, _ in log.since(log.oldest)[1]], ['put'] * 3)
+        self.assertEqual(reader.cache_info()['reloads'], 2)
+
+    def test_compaction(self):
+        """Test that the journal is folded into the snapshot past its threshold"""
+        storage = JournalStorage(self.path, max_records=2)
+        repository = MediaRepository(storage)
+        repository.add({'id': '3', 'name': 'Heat', 'category': 'Crime'})
+        repository.add({'id': '4', 'name': 'Alien', 'category': 'Sci-Fi'})
+        storage.wait_for_compaction()
+        self.assertFalse(os.path.exists(self.path + '.journal.compacting'))
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), 4)
+        self.assertEqual(len(repository.records()), 4)
+        self.assertEqual(repository.cache_info()['reloads'], 0)
+
+    def test_tailing_across_compaction(self):
+        """Test that another process keeps tailing through the writer's compactions, on the writer's versions"""
+        counter = SharedCounter()
+        writer = MediaRepository(JournalStorage(self.path, max_records=2))
+        reader = MediaRepository(JournalStorage(self.path))
+        writer.watch(counter)
+        reader.change_signal = counter
+        reader.records()
+        loads = []
+        load = reader.storage.load
+        reader.storage.load = lambda: loads.append(1) or load()
+        for film_id in range(3, 9):
+            writer.add({'id': film_id, 'name': f'Film {film_id}', 'category': 'Drama'})
+            if film_id % 3 == 0:
+                writer.storage.wait_for_compaction()
+            self.assertEqual([m['id'] for m in reader.records()], list(range(1, film_id + 1)))
+            self.assertEqual(reader.version_info(), writer.version_info())
+        writer.storage.wait_for_compaction()
+        self.assertTrue(os.path.exists(self.path + '.journal.previous'))
+        self.assertEqual(loads, [])
+
+    def test_change_feed_across_processes(self):
+        """Test that a reader sharing the writer's signal serves the writer's change feed versions"""
+        counter = SharedCounter()
+        writer = MediaRepository(JournalStorage(self.path, max_records=2))
+        reader = MediaRepository(JournalStorage(self.path))
+        writer.keep_change_log(ChangeLog())
+        reader.keep_change_log(ChangeLog())
+        writer.watch(counter)
+        reader.change_signal = counter
+        reader.records()
+        start, _ = writer.version_info()
+        writer.add({'id': 3, 'name': 'Heat', 'category': 'Crime'})
+        middle, _ = writer.version_info()
+        writer.storage.wait_for_compaction()
+        self.assertEqual(reader.changes_since(start), writer.changes_since(start))
+        writer.delete(1)
+        self.assertEqual(reader.changes_since(middle), writer.changes_since(middle))
+        self.assertEqual(reader.changes_since(middle)[1], [('delete', 1)])
+        writer.storage.wait_for_compaction()
+
+    def test_change_signal(self):
+        """Test that a reader only checks storage after the writer's signal moves"""
+        counter = SharedCounter()
+        writer = MediaRepository(JournalStorage(self.path))
+        reader = MediaRepository(JournalStorage(self.path))
+        writer.watch(counter)
+        reader.change_signal = counter
+        reader.records()
+        checks = []
+        signature = reader.storage.signature
+        reader.storage.signature = lambda: checks.append(1) or signature()
+        reader.records()
+        self.assertEqual(checks, [])
+        sequence = counter.current()
+        writer.add({'id': '3', 'name': 'Heat', 'category': 'Crime'})
+        self.assertNotEqual(counter.current(), sequence)
+        self.assertEqual([m['id'] for m in reader.records()], [1, 2, 3])
+        self.assertEqual(reader.version_info(), writer.version_info())
+        self.assertTrue(checks)
+        checked = len(checks)
+        reader.records()
+        self.assertEqual(len(checks), checked)
+
+class TestSqliteStorage(unittest.TestCase):
+    """Test the SQLite storage engine"""
+
+    def setUp(self):
+        """Create a temporary films.json with a legacy row"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.tmpdir, 'films.json')
+        legacy = {'id': 3, 'name': 'Pulp Fiction', 'publication_date': '1994',
+                  'author': 'Quentin Tarantino', 'category': 'Film'}
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(SAMPLE_FILMS + [legacy], f)
+        self.storage = SqliteStorage(os.path.join(self.tmpdir, 'films.db'), json_path=self.json_path)
+
+    def tearDown(self):
+        """Remove the temporary database"""
+        shutil.rmtree(self.tmpdir)
+
+    def test_migration(self):
+        """Test the one-shot import including legacy author/publication_date rows"""
+        film = self.storage.find_by_id(3)
+        self.assertEqual(film['director'], 'Quentin Tarantino')
+        self.assertEqual(film['year'], 1994)
+        self.assertNotIn('author', film)
+        self.assertEqual(len(self.storage.load()), 3)
+
+    def test_indexed_queries(self):
+        """Test category and name lookups through the repository"""
+        repository = MediaRepository(self.storage)
+        self.assertEqual([m['id'] for m in repository.by_category('sci-fi')], [2])
+        self.assertEqual(repository.by_name('THE GODFATHER')[0]['director'], 'Francis Ford Coppola')
+        repository.delete(2)
+        self.assertEqual(repository.by_category('Sci-Fi'), [])
+        plan = self.storage._connection().execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM media WHERE lower(category) = lower('Crime')").fetchall()
+        self.assertIn('idx_media_category', str(plan))
+
+    def test_group_commit_version(self):
+        """Test that a queued database write moves the version only once its rows are readable"""
+        repository = MediaRepository(self.storage, group_commit=True)
+        version, _ = repository.version_info()
+        committing, release = threading.Event(), threading.Event()
+        commit = self.storage.commit
+
+        def slow_commit(ops, snapshot):
+            committing.set()
+            release.wait(5)
+            commit(ops, snapshot)
+        self.storage.commit = slow_commit
+        writer = threading.Thread(target=repository.add, args=({'id': 4, 'name': 'Heat', 'category': 'Crime'},))
+        writer.start()
+        committing.wait(5)
+        self.assertEqual((repository.version_info()[0], repository.get(4)), (version, None))
+        release.set()
+        writer.join()
+        self.assertEqual(repository.version_info()[0], version + 1)
+        self.assertEqual(repository.get(4)['name'], 'Heat')
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("TEST 4: MEDIA STORE TESTS")
+    print("="*60 + "\n")
+    unittest.main(verbosity=2)